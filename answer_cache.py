@@ -0,0 +1,228 @@
+import copy
+import logging
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_TRAILING_PUNCT_PATTERN = re.compile(r'[\s?!.。？！~]+$')
+
+
+def normalize_query(query: str) -> str:
+    """정확 일치 캐시 키용 질의 정규화 (공백/대소문자/끝 문장부호 무시)"""
+    normalized = _WHITESPACE_PATTERN.sub(' ', query.strip().lower())
+    return _TRAILING_PUNCT_PATTERN.sub('', normalized)
+
+
+@dataclass
+class CacheEntry:
+    """캐시된 답변과 유사도 검색용 질의 임베딩"""
+    result: Dict
+    created_at: float
+    embedding: Optional[np.ndarray] = None
+
+
+class AnswerCache:
+    """
+    정규화 문자열 정확 일치 → 임베딩 유사도 순으로 조회하는 답변 캐시 (TTL/LRU 제거).
+    db_path를 주면 답변을 SQLite 파일에도 기록하고, 조회 전에 다른 워커 프로세스가 추가한 항목을 가져옴.
+    답변은 만들 때의 인덱스 버전(index_version)과 함께 저장하고 같은 버전의 답변만 사용함
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 86400,
+                 similarity_threshold: float = 0.92, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # 0 이하이면 유사도 조회를 사용하지 않고 정확 일치만 사용
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.db_path = db_path
+        # 현재 검색 인덱스 지문 (다른 지문으로 저장된 답변은 재구축 전 인덱스로 만든 것이므로 버림)
+        self.index_version: Optional[str] = None
+        # 메모리로 가져온 마지막 SQLite 행 번호
+        self._synced_row = 0
+        self._last_db_sweep = 0.0
+        if self.db_path:
+            self._init_db()
+
+    def _init_db(self):
+        """공유 답변 캐시용 SQLite 테이블 초기화"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query_key TEXT NOT NULL UNIQUE,
+                    result TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at REAL NOT NULL,
+                    index_version TEXT
+                )
+            ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(answer_cache)')}
+            if 'index_version' not in columns:
+                conn.execute('ALTER TABLE answer_cache ADD COLUMN index_version TEXT')
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold > 0
+
+    def get_exact(self, query: str) -> Optional[Dict]:
+        """정규화된 질의 문자열이 같은 캐시 항목 조회"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.db_path:
+                self._sync_from_db()
+                entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return copy.deepcopy(entry.result)
+
+    def get_similar(self, embedding: Sequence[float]) -> Optional[Dict]:
+        """코사인 유사도가 임계값 이상인 가장 가까운 과거 질의의 답변 조회"""
+        if not self.semantic_enabled:
+            return None
+        query_vec = self._normalize_vector(embedding)
+        now = time.time()
+        with self._lock:
+            if self.db_path:
+                self._sync_from_db()
+            keys, vectors = [], []
+            for key, entry in self._entries.items():
+                if entry.embedding is not None and now - entry.created_at <= self.ttl_seconds:
+                    keys.append(key)
+                    vectors.append(entry.embedding)
+            if not vectors:
+                return None
+            similarities = np.stack(vectors) @ query_vec
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return copy.deepcopy(self._entries[keys[best]].result)
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, query: str, result: Dict, embedding: Optional[Sequence[float]] = None):
+        vector = self._normalize_vector(embedding) if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            key = normalize_query(query)
+            self._store(key, CacheEntry(result=copy.deepcopy(result), created_at=now, embedding=vector))
+            if self.db_path:
+                self._save(key, result, vector, now)
+
+    def set_index_version(self, version: str):
+        """
+        현재 인덱스 지문 설정. 지문이 바뀌었으면 메모리 항목을 비우고,
+        공유 파일에서는 다른 지문으로 저장된 항목을 삭제 (재시작 전에 재구축된 인덱스의 답변 포함)
+        """
+        with self._lock:
+            if version == self.index_version:
+                return
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self.index_version = version
+            if self.db_path:
+                try:
+                    with sqlite3.connect(self.db_path) as conn:
+                        deleted = conn.execute('DELETE FROM answer_cache WHERE index_version IS NOT ?', (version,)).rowcount
+                    if deleted:
+                        logger.info(f"이전 인덱스로 만든 공유 답변 캐시 {deleted}건 삭제")
+                except sqlite3.Error as e:
+                    logger.error(f"공유 답변 캐시 인덱스 버전 정리 실패: {e}")
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+            if self.db_path:
+                try:
+                    with sqlite3.connect(self.db_path) as conn:
+                        conn.execute('DELETE FROM answer_cache')
+                except sqlite3.Error as e:
+                    logger.error(f"공유 답변 캐시 비우기 실패: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "shared": bool(self.db_path),
+            }
+
+    def _store(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _sync_from_db(self):
+        """다른 워커가 마지막 동기화 이후 기록한 (만료되지 않은) 항목을 메모리로 가져옴"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    'SELECT row_id, query_key, result, embedding, created_at FROM answer_cache '
+                    'WHERE row_id > ? AND created_at >= ? AND index_version IS ? ORDER BY row_id',
+                    (self._synced_row, time.time() - self.ttl_seconds, self.index_version)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"공유 답변 캐시 동기화 실패: {e}")
+            return
+        for row_id, key, result, embedding, created_at in rows:
+            vector = np.frombuffer(embedding, dtype=np.float32).copy() if embedding is not None else None
+            self._store(key, CacheEntry(result=json.loads(result), created_at=created_at, embedding=vector))
+            self._synced_row = max(self._synced_row, row_id)
+
+    def _save(self, key: str, result: Dict, vector: Optional[np.ndarray], now: float):
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO answer_cache (query_key, result, embedding, created_at, index_version) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, json.dumps(result, ensure_ascii=False),
+                     vector.astype(np.float32).tobytes() if vector is not None else None, now, self.index_version)
+                )
+                # 만료/초과 항목은 1분에 한 번만 정리
+                if now - self._last_db_sweep > 60:
+                    self._last_db_sweep = now
+                    conn.execute('DELETE FROM answer_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+                    conn.execute('DELETE FROM answer_cache WHERE row_id NOT IN '
+                                 '(SELECT row_id FROM answer_cache ORDER BY row_id DESC LIMIT ?)', (self.max_entries,))
+        except sqlite3.Error as e:
+            logger.error(f"공유 답변 캐시 저장 실패: {e}")
+
+    @staticmethod
+    def _normalize_vector(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from answer_cache import normalize_query
+from scheduler import PRIORITY_BATCH
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchItem:
+    """일괄 처리 입력 한 줄 (index: 입력 순서, id: 호출자가 붙인 식별자)"""
+    index: int
+    id: Any
+    query: str
+
+
+def parse_batch_lines(lines: Iterable[str]) -> Tuple[List[BatchItem], List[Dict]]:
+    """
+    JSONL 입력을 파싱해 (처리할 항목, 잘못된 줄의 오류 결과)를 반환.
+    각 줄은 {"id": ..., "query": "..."} 형식이며, requests.jsonl 형식({"request_id", "body"})도 허용
+    """
+    items, errors = [], []
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            item_id = record.get("id", record.get("request_id", index))
+            query = record.get("query") or record.get("body") or ""
+        except (json.JSONDecodeError, AttributeError) as e:
+            errors.append({"index": index, "id": None, "success": False, "error": f"잘못된 JSON 형식: {e}"})
+            continue
+        if not str(query).strip():
+            errors.append({"index": index, "id": item_id, "success": False, "error": "쿼리가 비어있습니다."})
+            continue
+        items.append(BatchItem(index=index, id=item_id, query=str(query)))
+    return items, errors
+
+
+async def run_batch(agent, items: List[BatchItem], concurrency: int = 8, priority: int = PRIORITY_BATCH,
+                    embed_chunk_size: int = 256) -> AsyncIterator[Tuple[BatchItem, Dict, bool]]:
+    """
+    일괄 질의 처리. 같은 질문은 한 번만 처리하고, 처리 순서보다 한 구간 앞서 질의 임베딩을 배치로 계산하며
+    낮은 우선순위로 동시에 최대 concurrency건씩 처리해 끝나는 순서대로 (항목, 결과, 중복 여부)를 내보냄
+    """
+    if concurrency < 1:
+        raise ValueError(f"동시 처리 수는 1 이상이어야 합니다: {concurrency}")
+    groups: "OrderedDict[str, List[BatchItem]]" = OrderedDict()
+    for item in items:
+        groups.setdefault(normalize_query(item.query), []).append(item)
+    group_list = list(groups.values())
+    logger.info(f"일괄 처리 시작: {len(items)}건 (중복 제외 {len(groups)}건, 동시 처리 {concurrency}건)")
+
+    # 미리 계산한 임베딩이 쓰이기 전에 임베딩 LRU 캐시에서 밀려나지 않도록
+    # 처리 중인 질의(최대 concurrency건) + 현재 구간 + 다음 구간이 캐시에 들어가는 크기로 나눠 계산
+    window = max(1, min(embed_chunk_size, (agent.db_manager.embedding_cache_size - concurrency) // 2))
+    prefetches: Dict[int, asyncio.Task] = {}
+
+    async def embed_window(start: int):
+        # 답변 캐시 유사도 조회/검색에 쓰일 질의 임베딩을 한 번에 계산해 임베딩 캐시에 적재
+        try:
+            await agent.db_manager.run_in_executor(agent.db_manager.embed,
+                                                   [group[0].query for group in group_list[start:start + window]])
+        except Exception as e:
+            logger.warning(f"일괄 임베딩 사전 계산 실패 - 개별 처리로 진행: {e}")
+
+    def prefetch(start: int) -> Optional[asyncio.Task]:
+        if start < len(group_list) and start not in prefetches:
+            prefetches[start] = asyncio.create_task(embed_window(start))
+        return prefetches.get(start)
+
+    positions = iter(range(len(group_list)))
+    finished: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        # 모든 작업자가 같은 순서의 위치를 나눠 가져가므로 구간 단위로 앞에서부터 처리됨
+        try:
+            for position in positions:
+                start = position - position % window
+                if position == start:
+                    prefetch(start + window)
+                await prefetch(start)
+                group = group_list[position]
+                # 일괄 질의는 서로 독립적이므로 세션 없이 처리 (이전 대화 없음 → 답변 캐시 사용 가능)
+                finished.put_nowait((group, await agent.process_query(group[0].query, None, priority=priority)))
+        except Exception as e:
+            finished.put_nowait(e)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(group_list)))]
+    try:
+        for _ in range(len(group_list)):
+            done = await finished.get()
+            if isinstance(done, Exception):
+                raise done
+            group, result = done
+            for position, item in enumerate(group):
+                yield item, result, position > 0
+    finally:
+        # 클라이언트 연결이 끊겨 중단되면 남은 작업 취소
+        for task in workers + list(prefetches.values()):
+            task.cancel()
@@ -0,0 +1 @@
+"""로컬 Gemini 스텁과 합성 ChromaDB로 API 지연 시간/처리량을 재는 벤치마크 (python -m benchmarks.load_test)"""
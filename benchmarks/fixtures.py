@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+from typing import Any, Dict, List
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+
+# 벤치마크 컬렉션 메타데이터에 기록하는 임베딩 모델 이름 (서버의 일치 확인을 통과하도록 같은 값을 사용)
+HASH_EMBEDDING_MODEL = "harbor-bench-hash"
+# 픽스처 생성 설정이 바뀌면 다시 만들도록 DB 폴더에 함께 저장
+_FIXTURE_INFO_FILE = "bench_fixture.json"
+
+_LAWS = ["항만법", "선박입항및출항등에관한법률", "위험물선박운송및저장규칙", "항만운송사업법", "해사안전법"]
+_TOPICS = ["항만시설 사용 허가", "위험물 하역", "선박 입항 신고", "항만시설 사용료", "컨테이너 적재", "화물 보관",
+           "안전관리자 배치", "선박 출항 허가", "정박지 지정", "예선 사용", "도선 의무", "항만운송사업 등록"]
+_MANUALS = ["컨테이너 하역 작업 안전매뉴얼", "위험물 취급 실무 가이드", "항만 비상대응 절차서", "선석 배정 업무 매뉴얼"]
+_STEPS = ["안전모와 안전화를 착용한다", "신호수를 배치한다", "작업 구역을 통제한다", "관제실에 작업 개시를 보고한다",
+          "하역 장비 점검표를 확인한다", "위험물 목록을 대조한다", "소화 설비 위치를 확인한다", "작업 일지를 작성한다"]
+
+
+@register_embedding_function
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    글자 2-gram 해시로 만드는 결정적 임베딩 (모델 다운로드 없이 같은 입력이면 항상 같은 벡터).
+    검색 품질이 아니라 서버 경로의 지연 시간을 재기 위한 것이므로 계산 비용이 작고 일정함
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for i in range(len(text) - 1):
+                vector[int.from_bytes(hashlib.blake2b(text[i:i + 2].encode("utf-8"), digest_size=4).digest(), "little") % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            embeddings.append(vector / norm if norm else vector)
+        return embeddings
+
+    @staticmethod
+    def name() -> str:
+        return "harbor_bench_hash"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "HashEmbeddingFunction":
+        return HashEmbeddingFunction(dim=config.get("dim", 384))
+
+
+def _legal_chunks(size: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """노트북이 만드는 것과 같은 메타데이터 형식의 법률 조문 청크"""
+    chunks = []
+    article = 0
+    while len(chunks) < size:
+        law = _LAWS[(article // 60) % len(_LAWS)]
+        article += 1
+        number = (article - 1) % 60 + 1
+        chapter = (number - 1) // 10 + 1
+        topic = rng.choice(_TOPICS)
+        source_file = f"{law}.pdf"
+        chunk_id = f"{source_file}_{article:05d}"
+        body = (f"제{number}조({topic}) ① {topic}에 관하여 필요한 사항은 해양수산부령으로 정한다. "
+                f"② {rng.choice(_TOPICS)}을 하려는 자는 관리청의 허가를 받아야 한다. "
+                f"③ 제{max(1, number - 1)}조에 따른 {topic}의 기준은 대통령령으로 정한다.")
+        # 일부 조문은 긴 조문을 나눈 하위 청크로 만들어 문맥 확장 경로도 거치게 함
+        parts = 3 if article % 7 == 0 else 1
+        for sub_index in range(1, parts + 1):
+            is_sub = parts > 1
+            cid = f"{chunk_id}_sub_{sub_index}" if is_sub else chunk_id
+            title = f"article:{number} {topic}" + (" (부분)" if is_sub else "")
+            chunks.append({
+                "id": cid,
+                "document": f"[{title}]\n{body}" + (f" 세부 사항 {sub_index}: {rng.choice(_STEPS)}." if is_sub else ""),
+                "metadata": {
+                    "source_file": source_file, "chunk_id": cid, "article_title": title,
+                    "structure_type": "article", "structure_number": str(number), "level": 3,
+                    "hierarchy_path": json.dumps([f"chapter:{chapter}", f"article:{number}"], ensure_ascii=False),
+                    "parent_ref": f"chapter:{chapter}", "is_sub_chunk": is_sub, "sub_index": sub_index if is_sub else 0,
+                    "parent_chunk_id": chunk_id if is_sub else "", "chunk_index": len(chunks),
+                    "effective_date": 1735657200, "publication_date": 1704034800, "amendment_info": "",
+                },
+            })
+    return chunks[:size]
+
+
+def _manual_chunks(size: int, rng: random.Random) -> List[Dict[str, Any]]:
+    chunks = []
+    for i in range(size):
+        manual = _MANUALS[i % len(_MANUALS)]
+        topic = rng.choice(_TOPICS)
+        steps = " ".join(f"{n}. {step}." for n, step in enumerate(rng.sample(_STEPS, 4), start=1))
+        cid = f"{manual}.pptx_{i:05d}"
+        chunks.append({
+            "id": cid,
+            "document": f"[{manual} - {topic}]\n{topic} 작업 절차: {steps}",
+            "metadata": {
+                "source_file": f"{manual}.pptx", "chunk_id": cid, "article_title": f"{manual} - {topic}",
+                "structure_type": "preamble", "structure_number": "0", "level": 0, "hierarchy_path": "[]",
+                "is_sub_chunk": False, "sub_index": 0, "parent_chunk_id": "", "chunk_index": i,
+            },
+        })
+    return chunks
+
+
+def build_synthetic_db(db_path: str, legal_size: int = 2000, manual_size: int = 500, seed: int = 42,
+                       rebuild: bool = False) -> Dict[str, Any]:
+    """
+    legal_docs/legal_manuals 컬렉션을 가진 합성 ChromaDB 생성.
+    같은 설정으로 이미 만든 DB가 있으면 재사용 (rebuild=True면 다시 생성)
+    """
+    import chromadb
+
+    info = {"legal_size": legal_size, "manual_size": manual_size, "seed": seed, "embedding_model": HASH_EMBEDDING_MODEL}
+    info_path = os.path.join(db_path, _FIXTURE_INFO_FILE)
+    if not rebuild and os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            if json.load(f) == info:
+                return info
+    shutil.rmtree(db_path, ignore_errors=True)
+
+    rng = random.Random(seed)
+    embedding_function = HashEmbeddingFunction()
+    client = chromadb.PersistentClient(path=db_path)
+    for name, chunks in (("legal_docs", _legal_chunks(legal_size, rng)), ("legal_manuals", _manual_chunks(manual_size, rng))):
+        collection = client.create_collection(
+            name, embedding_function=embedding_function,
+            metadata={"hnsw:space": "cosine", "embedding_model": HASH_EMBEDDING_MODEL},
+        )
+        for start in range(0, len(chunks), 500):
+            batch = chunks[start:start + 500]
+            collection.add(ids=[c["id"] for c in batch], documents=[c["document"] for c in batch],
+                           metadatas=[c["metadata"] for c in batch])
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return info
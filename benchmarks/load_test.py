@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+/query 부하 테스트 (실제 Gemini 호출 없음).
+합성 ChromaDB와 Gemini 스텁으로 main:app을 프로세스 안에서(ASGITransport) 실행하고,
+동시 요청 수를 늘려 가며 지연 시간 분위수/처리량/단계별 시간/메모리를 측정해 JSON으로 저장.
+
+    python -m benchmarks.load_test --levels 1,4,16 --requests 100 -o bench.json
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.fixtures import HASH_EMBEDDING_MODEL, HashEmbeddingFunction, build_synthetic_db
+from benchmarks.stub_gemini import DEFAULT_RESPONSES_PATH, StubSettings, install, load_scenarios
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+_SERVER_TIMING_PATTERN = re.compile(r'([\w-]+);dur=([\d.]+)')
+# 기준선과 비교하는 지표 (값이 클수록 나쁨)
+_COMPARED_LATENCIES = ("p50", "p95", "p99")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """선형 보간 분위수 (values가 비어 있으면 0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+
+def rss_mb() -> float:
+    """현재 프로세스 상주 메모리(MB). /proc이 없으면 최대 상주 메모리로 대신함"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_queries(responses_path: str, count: int, unique: bool) -> List[str]:
+    """시나리오 질문을 번갈아 사용. unique면 번호를 붙여 검색/답변 캐시에 걸리지 않게 함"""
+    pool = [q for scenario in load_scenarios(responses_path) for q in scenario["queries"]]
+    return [f"{pool[i % len(pool)]} (요청 {i})" if unique else pool[i % len(pool)] for i in range(count)]
+
+
+async def _send(client, query: str, stream: bool) -> Dict:
+    started = time.perf_counter()
+    headers = {"X-Debug-Timing": "1"}
+    first_byte = None
+    if stream:
+        async with client.stream("POST", "/query/stream", json={"query": query}, headers=headers) as response:
+            body = []
+            async for chunk in response.aiter_text():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                body.append(chunk)
+            status, timing, text = response.status_code, response.headers.get("server-timing", ""), "".join(body)
+        ok = status == 200 and "event: error" not in text
+    else:
+        response = await client.post("/query", json={"query": query}, headers=headers)
+        status, timing = response.status_code, response.headers.get("server-timing", "")
+        ok = status == 200 and response.json().get("success", False)
+    return {
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "first_byte_ms": first_byte * 1000 if first_byte is not None else None,
+        "ok": ok,
+        "status": status,
+        "stages": {name: float(ms) for name, ms in _SERVER_TIMING_PATTERN.findall(timing)},
+    }
+
+
+async def run_level(client, queries: List[str], concurrency: int, stream: bool) -> Dict:
+    """동시 요청 concurrency개를 유지하며(닫힌 루프) queries를 모두 보내고 결과를 집계"""
+    pending = iter(queries)
+    results: List[Dict] = []
+
+    async def worker():
+        for query in pending:
+            results.append(await _send(client, query, stream))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies = [r["latency_ms"] for r in results if r["ok"]]
+    stages: Dict[str, List[float]] = {}
+    for r in results:
+        for name, ms in r["stages"].items():
+            stages.setdefault(name, []).append(ms)
+    level = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r["ok"]),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": _summary(latencies),
+        "stages_ms": {name: _summary(values) for name, values in sorted(stages.items())},
+        "rss_mb": round(rss_mb(), 1),
+    }
+    first_bytes = [r["first_byte_ms"] for r in results if r["ok"] and r["first_byte_ms"] is not None]
+    if first_bytes:
+        level["first_byte_ms"] = _summary(first_bytes)
+    return level
+
+
+def compare_with_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """동시 요청 수가 같은 단계끼리 지연 분위수/처리량/오류를 비교해 허용 범위를 넘은 항목 목록을 반환"""
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        c = level["concurrency"]
+        for key in _COMPARED_LATENCIES:
+            current, previous = level["latency_ms"][key], base["latency_ms"][key]
+            if previous and current > previous * (1 + tolerance):
+                regressions.append(f"동시 {c}: 지연 {key} {previous:.1f}ms → {current:.1f}ms (+{(current / previous - 1) * 100:.0f}%)")
+        if base["throughput_rps"] and level["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"동시 {c}: 처리량 {base['throughput_rps']:.1f} → {level['throughput_rps']:.1f} req/s")
+        if level["errors"] > base["errors"]:
+            regressions.append(f"동시 {c}: 오류 {base['errors']} → {level['errors']}건")
+    return regressions
+
+
+async def wait_until_ready(client, timeout: float, interval: float = 0.05) -> Dict:
+    """/readyz가 200을 반환하거나 초기화가 실패할 때까지 확인하고 마지막 준비 상태를 반환"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        response = await client.get("/readyz")
+        snapshot = response.json()
+        if response.status_code == 200 or snapshot.get("error") or time.perf_counter() >= deadline:
+            return snapshot
+        await asyncio.sleep(interval)
+
+
+def configure_environment(args) -> Dict[str, str]:
+    """기준선과 같은 조건이 되도록 서버 설정 고정 (--env로 개별 변경)"""
+    env = {
+        "GEMINI_API_KEY": "benchmark",
+        "CHROMA_DB_PATH": args.db_path,
+        "ANONYMIZED_TELEMETRY": "False",
+        # 스텁은 실제 한도가 없으므로 스케줄러 한도가 측정값을 좌우하지 않도록 크게 설정
+        "GEMINI_RPM": str(args.rpm),
+        "GEMINI_TPM": "100000000",
+        "GEMINI_MAX_CONCURRENCY": str(args.gemini_concurrency),
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "SHARED_STATE_DB_PATH": "",
+        "ANSWER_CACHE_DB_PATH": "",
+        "RATE_LIMIT_DB_PATH": "",
+        "SESSION_DB_PATH": "",
+        "RERANKER_MODEL": "",
+        "VERBOSE_API_CALLS": "false",
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    os.environ.update(env)
+    return env
+
+
+async def run_benchmark(args) -> Dict:
+    # 픽스처 생성과 서버가 같은 Chroma 설정(텔레메트리 등)으로 같은 경로를 열도록 환경 변수를 먼저 설정
+    env = configure_environment(args)
+    build_started = time.perf_counter()
+    fixture = build_synthetic_db(args.db_path, legal_size=args.legal_size, manual_size=args.manual_size,
+                                 seed=args.seed, rebuild=args.rebuild_fixture)
+    fixture_seconds = time.perf_counter() - build_started
+
+    settings = StubSettings(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                            rate_limit_ratio=args.rate_limit_ratio, seed=args.seed)
+    stub = install(settings, args.responses)
+
+    import httpx
+    import main
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    # 임베딩 모델 대신 결정적 해시 임베딩 사용 (모델 다운로드/로드 시간 제외)
+    main._shared_models = {
+        "embedding_backend": "benchmark",
+        "embedding_model": HASH_EMBEDDING_MODEL,
+        "embedding_function": HashEmbeddingFunction(),
+        "reranker": None,
+    }
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = rss_mb()
+    startup_started = time.perf_counter()
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "mode": "stream" if args.stream else "query",
+            "requests_per_level": args.requests,
+            "unique_queries": not args.repeat_queries,
+            "fixture": {**fixture, "build_seconds": round(fixture_seconds, 2)},
+            "stub": {"latency_ms": settings.latency_ms, "jitter_ms": settings.jitter_ms,
+                     "rate_limit_ratio": settings.rate_limit_ratio, "seed": settings.seed},
+            "env": {k: v for k, v in env.items() if k not in ("GEMINI_API_KEY", "CHROMA_DB_PATH")},
+        },
+        "levels": [],
+    }
+
+    async with main.lifespan(main.app):
+        lifespan_seconds = time.perf_counter() - startup_started
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            # 백그라운드 초기화가 끝날 때까지 대기 (/readyz)
+            ready = await wait_until_ready(client, args.ready_timeout)
+            report["startup"] = {
+                "lifespan_seconds": round(lifespan_seconds, 3),
+                "ready_seconds": round(time.perf_counter() - startup_started, 3),
+                "readiness": ready,
+                "rss_mb_before": round(rss_before, 1),
+                "rss_mb_after": round(rss_mb(), 1),
+            }
+            if not ready["ready"]:
+                raise RuntimeError(f"서버가 {args.ready_timeout}초 안에 준비되지 않았습니다: {ready}")
+            if args.warmup:
+                await run_level(client, build_queries(args.responses, args.warmup, unique=False), 1, args.stream)
+            offset = 0
+            for concurrency in args.levels:
+                queries = build_queries(args.responses, offset + args.requests, unique=not args.repeat_queries)[offset:]
+                offset += args.requests
+                if args.tracemalloc:
+                    tracemalloc.reset_peak()
+                level = await run_level(client, queries, concurrency, args.stream)
+                if args.tracemalloc:
+                    level["python_heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                report["levels"].append(level)
+                latency = level["latency_ms"]
+                print(f"  동시 {concurrency:>3}: {level['throughput_rps']:>7.2f} req/s, p50 {latency['p50']:>8.1f}ms, "
+                      f"p95 {latency['p95']:>8.1f}ms, p99 {latency['p99']:>8.1f}ms, 오류 {level['errors']}, "
+                      f"RSS {level['rss_mb']:.0f}MB", flush=True)
+        report["gemini"] = main.agent.gemini.get_stats()
+    report["stub"] = dict(stub.stats)
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test", description="Harbor Agent /query 부하 테스트")
+    parser.add_argument("--levels", default="1,4,16", help="동시 요청 수 단계 (쉼표 구분, 기본값: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=100, help="단계별 요청 수 (기본값: 100)")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="서버 준비(/readyz) 대기 시간(초) (기본값: 120)")
+    parser.add_argument("--warmup", type=int, default=5, help="측정 전 워밍업 요청 수 (기본값: 5)")
+    parser.add_argument("--stream", action="store_true", help="/query 대신 /query/stream 측정 (첫 바이트 시간 포함)")
+    parser.add_argument("--repeat-queries", action="store_true", help="질문에 번호를 붙이지 않아 검색 캐시가 적중하도록 함")
+    parser.add_argument("--answer-cache", action="store_true", help="답변 캐시 사용 (기본값: 사용 안 함)")
+    parser.add_argument("--legal-size", type=int, default=2000, help="legal_docs 청크 수 (기본값: 2000)")
+    parser.add_argument("--manual-size", type=int, default=500, help="legal_manuals 청크 수 (기본값: 500)")
+    parser.add_argument("--db-path", default=os.path.join(tempfile.gettempdir(), "harbor_bench_chroma_db"),
+                        help="합성 ChromaDB 경로 (같은 설정이면 재사용)")
+    parser.add_argument("--rebuild-fixture", action="store_true", help="합성 ChromaDB 다시 생성")
+    parser.add_argument("--responses", default=DEFAULT_RESPONSES_PATH, help="스텁 시나리오 JSON")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="스텁 응답 지연 평균 (기본값: 300)")
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0, help="스텁 응답 지연 변동 폭 (기본값: ±100)")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="스텁 호출 중 429로 실패시킬 비율 (기본값: 0)")
+    parser.add_argument("--rpm", type=int, default=1000000, help="GEMINI_RPM (기본값: 사실상 무제한)")
+    parser.add_argument("--gemini-concurrency", type=int, default=32, help="GEMINI_MAX_CONCURRENCY (기본값: 32)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="서버 환경 변수 추가 설정 (여러 번 사용 가능)")
+    parser.add_argument("--seed", type=int, default=42, help="합성 데이터/스텁 난수 시드 (기본값: 42)")
+    parser.add_argument("--tracemalloc", action="store_true", help="단계별 Python 힙 최대 사용량 측정 (측정 오버헤드 있음)")
+    parser.add_argument("-o", "--output", help="결과 JSON 파일")
+    parser.add_argument("--baseline", help="비교할 기준선 JSON (기준보다 나빠지면 종료 코드 1)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="기준선 대비 허용 변화율 (기본값: 0.15)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"결과를 기준선으로 저장 ({DEFAULT_BASELINE_PATH})")
+    parser.add_argument("--log-level", default="WARNING", help="서버 로그 레벨 (기본값: WARNING)")
+    args = parser.parse_args(argv)
+    args.levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"🚀 부하 테스트: 동시 {args.levels}, 단계별 {args.requests}건, 스텁 지연 {args.llm_latency_ms:.0f}±{args.llm_jitter_ms:.0f}ms"
+          f"{', 스트리밍' if args.stream else ''}")
+    report = asyncio.run(run_benchmark(args))
+    print(f"📦 최대 RSS {report['peak_rss_mb']:.0f}MB, LLM 호출 {report['stub']['calls']}회 (429 {report['stub']['rate_limited']}회)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 결과 파일: {args.output}")
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"💾 기준선 저장: {DEFAULT_BASELINE_PATH}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ 기준선({baseline['meta'].get('git_commit') or args.baseline}) 대비 성능 저하:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✅ 기준선({baseline['meta'].get('git_commit') or args.baseline}) 대비 허용 범위(±{args.tolerance * 100:.0f}%) 안입니다.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
+
+from utils import estimate_tokens
+
+DEFAULT_RESPONSES_PATH = os.path.join(os.path.dirname(__file__), "stub_responses.json")
+
+# GeminiClient._build_prompt/_format_messages_for_gemini가 만드는 프롬프트 구획
+_TOOLS_HEADER = "# 사용 가능한 도구 목록:"
+_TOOL_RESULT_HEADER = "# 도구 실행 결과:"
+_USER_HEADER = "# 사용자 질문:\n"
+_TOOL_NAME_PATTERN = re.compile(r"^• (\w+):", re.MULTILINE)
+
+
+@dataclass
+class StubSettings:
+    """스텁 응답 지연/오류 설정"""
+    latency_ms: float = 300.0
+    # 호출마다 ±jitter_ms 범위에서 균등 분포로 더하는 지연 (seed로 재현 가능)
+    jitter_ms: float = 100.0
+    # 호출 중 429(ResourceExhausted)로 실패시킬 비율
+    rate_limit_ratio: float = 0.0
+    # 스트리밍 응답 조각 크기(글자)와 조각 사이 지연
+    stream_chunk_chars: int = 24
+    stream_chunk_delay_ms: float = 5.0
+    seed: int = 42
+
+
+class StubGenerativeModel:
+    """
+    genai.GenerativeModel 대역. stub_responses.json의 시나리오에 따라 도구 호출/답변 JSON을 재생하므로
+    실제 GeminiClient(스케줄러, 재시도, 파싱, 토큰 집계)와 에이전트 경로는 그대로 실행됨
+    """
+
+    def __init__(self, scenarios: List[Dict], settings: StubSettings):
+        self.scenarios = scenarios
+        self.settings = settings
+        self._rng = random.Random(settings.seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "tool_call_responses": 0, "answer_responses": 0, "rate_limited": 0}
+
+    async def generate_content_async(self, prompt: str, generation_config=None, stream: bool = False, **kwargs):
+        with self._lock:
+            self.stats["calls"] += 1
+            delay = max(0.0, self.settings.latency_ms + self._rng.uniform(-self.settings.jitter_ms, self.settings.jitter_ms))
+            rate_limited = self._rng.random() < self.settings.rate_limit_ratio
+        await asyncio.sleep(delay / 1000)
+        if rate_limited:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            raise ResourceExhausted("429 Resource has been exhausted (stub)")
+
+        text = self._reply(prompt)
+        usage = SimpleNamespace(prompt_token_count=estimate_tokens(prompt), candidates_token_count=estimate_tokens(text),
+                                total_token_count=estimate_tokens(prompt) + estimate_tokens(text))
+        if not stream:
+            return SimpleNamespace(text=text, usage_metadata=usage)
+        return self._stream(text, usage)
+
+    async def _stream(self, text: str, usage):
+        size = max(1, self.settings.stream_chunk_chars)
+        for start in range(0, len(text), size):
+            if start:
+                await asyncio.sleep(self.settings.stream_chunk_delay_ms / 1000)
+            yield SimpleNamespace(text=text[start:start + size], usage_metadata=usage)
+
+    def _reply(self, prompt: str) -> str:
+        query = self._user_query(prompt)
+        scenario = self._match_scenario(query)
+        available = set(_TOOL_NAME_PATTERN.findall(prompt))
+        # 도구 목록은 있고 아직 도구 결과가 없으면 도구 호출, 그 외(도구 결과 이후/형식 재작성)는 답변
+        if _TOOLS_HEADER in prompt and _TOOL_RESULT_HEADER not in prompt:
+            calls = [call for call in scenario["tool_calls"] if call["function_name"] in available]
+            if calls:
+                with self._lock:
+                    self.stats["tool_call_responses"] += 1
+                return json.dumps({"reasoning": f"{scenario['name']} 시나리오", "tool_calls": [
+                    {"function_name": call["function_name"],
+                     "arguments": {k: v.replace("{query}", query) if isinstance(v, str) else v
+                                   for k, v in call["arguments"].items()}}
+                    for call in calls
+                ]}, ensure_ascii=False)
+        with self._lock:
+            self.stats["answer_responses"] += 1
+        return json.dumps({"reasoning": f"{scenario['name']} 시나리오", "content": scenario["answer"].replace("{query}", query)},
+                          ensure_ascii=False)
+
+    @staticmethod
+    def _user_query(prompt: str) -> str:
+        start = prompt.rfind(_USER_HEADER)
+        if start < 0:
+            return ""
+        query = prompt[start + len(_USER_HEADER):]
+        return query.split("\n\n# ", 1)[0].strip()
+
+    def _match_scenario(self, query: str) -> Dict:
+        for scenario in self.scenarios:
+            if any(q in query for q in scenario["queries"]):
+                return scenario
+        # 시나리오에 없는 질문은 해시로 고정 배정
+        digest = int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16)
+        return self.scenarios[digest % len(self.scenarios)]
+
+
+def load_scenarios(path: str = DEFAULT_RESPONSES_PATH) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["scenarios"]
+
+
+_installed: Optional[StubGenerativeModel] = None
+
+
+def install(settings: StubSettings, responses_path: str = DEFAULT_RESPONSES_PATH) -> StubGenerativeModel:
+    """GeminiClient가 만드는 GenerativeModel을 스텁으로 교체하고, 스텁 인스턴스를 반환 (앱 시작 전에 호출)"""
+    global _installed
+    _installed = StubGenerativeModel(load_scenarios(responses_path), settings)
+    genai.GenerativeModel = lambda *args, **kwargs: _installed
+    genai.configure = lambda *args, **kwargs: None
+    # 준비 상태 확인(LLM 연결)용 모델 정보 조회
+    genai.get_model = lambda name, **kwargs: SimpleNamespace(name=name)
+    return _installed
@@ -0,0 +1,107 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# "제 12 조", "제12조의2" 같은 조문 번호는 띄어쓰기와 무관하게 하나의 토큰으로 취급
+_ARTICLE_PATTERN = re.compile(r'제\s*(\d+)\s*(조|항|호|장|절|편)(?:\s*의\s*(\d+))?')
+_WORD_PATTERN = re.compile(r'[가-힣]+|[a-zA-Z]+|\d+')
+_HANGUL_WORD_PATTERN = re.compile(r'[가-힣]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    형태소 분석기 없이 쓰는 한국어 색인용 토크나이저.
+    조문 번호 토큰 + 단어 토큰 + 한글 단어의 음절 바이그램 (조사/어미가 붙어도 어간이 겹치도록)
+    """
+    tokens = []
+    for number, unit, sub in _ARTICLE_PATTERN.findall(text):
+        tokens.append(f"제{number}{unit}" + (f"의{sub}" if sub else ""))
+    for word in _WORD_PATTERN.findall(text.lower()):
+        tokens.append(word)
+        if _HANGUL_WORD_PATTERN.fullmatch(word) and len(word) > 2:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Chroma where 필터 중 단순 일치 조건만 평가 (연산자가 있으면 False)"""
+    if not where:
+        return True
+    for key, expected in where.items():
+        if key.startswith("$") or isinstance(expected, dict):
+            return False
+        if metadata.get(key) != expected:
+            return False
+    return True
+
+
+def is_simple_where(where: Optional[Dict]) -> bool:
+    return not where or all(not k.startswith("$") and not isinstance(v, dict) for k, v in where.items())
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """여러 순위 목록을 RRF(1 / (k + 순위)) 점수 합으로 통합"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """컬렉션 청크 전체에 대한 메모리 내 역색인 BM25 검색기"""
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict],
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        # term -> [(문서 번호, 단어 빈도)]
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._doc_lengths: List[int] = []
+        for doc_index, document in enumerate(documents):
+            counts = Counter(tokenize(document or ""))
+            self._doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((doc_index, tf))
+        self._avg_length = (sum(self._doc_lengths) / len(self._doc_lengths)) if self._doc_lengths else 0.0
+        self._idf = {
+            term: math.log(1 + (len(documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000, **kwargs) -> "BM25Index":
+        """Chroma 컬렉션의 문서/메타데이터를 페이지 단위로 읽어 색인 생성"""
+        ids, documents, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            offset += len(page["ids"])
+        return cls(ids, documents, metadatas, **kwargs)
+
+    def search(self, query: str, n_results: int, where: Optional[Dict] = None) -> List[Tuple[int, float]]:
+        """(문서 번호, BM25 점수) 목록을 점수 내림차순으로 반환"""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, tf in self._postings[term]:
+                length_norm = 1 - self.b + self.b * self._doc_lengths[doc_index] / self._avg_length
+                scores[doc_index] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if where:
+            ranked = [(i, s) for i, s in ranked if matches_where(self.metadatas[i], where)]
+        return ranked[:n_results]
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+저메모리 배포용 읽기 전용 벡터 인덱스.
+ChromaDB 컬렉션을 양자화한 임베딩(int8/float16, 메모리 맵 NumPy 배열)과 오프셋으로 찾는 문서/메타데이터 파일로 내보내고,
+ChromaDBManager가 쓰는 컬렉션 API(query/get/count)와 같은 형태로 검색함.
+파일은 mmap으로 읽으므로 같은 노드의 여러 복제본이 OS 페이지 캐시를 공유하고, 시작 시 인덱스를 메모리에 올리지 않음.
+
+    python compact_index.py --db-path ./chroma_db --output ./compact_index --dtype int8 --ivf-lists 64
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+DTYPES = ("int8", "float16")
+VECTOR_BACKENDS = ("chroma", "compact")
+# 검색 시 한 번에 float32로 변환하는 행 수 (변환용 임시 메모리 상한)
+_BLOCK_ROWS = 32768
+_MASK_CACHE_SIZE = 64
+
+
+def _matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Chroma where 필터 평가 (일치 조건, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin, $and/$or)"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected: return False
+                if op == "$ne" and value == expected: return False
+                if op == "$in" and value not in expected: return False
+                if op == "$nin" and value in expected: return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None: return False
+                    if op == "$gt" and not value > expected: return False
+                    if op == "$gte" and not value >= expected: return False
+                    if op == "$lt" and not value < expected: return False
+                    if op == "$lte" and not value <= expected: return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _where_keys(where: Optional[Dict]) -> List[str]:
+    keys = []
+    for key, condition in (where or {}).items():
+        if key in ("$and", "$or"):
+            for c in condition:
+                keys.extend(_where_keys(c))
+        else:
+            keys.append(key)
+    return list(dict.fromkeys(keys))
+
+
+class CompactCollection:
+    """
+    내보낸 컬렉션 하나 (읽기 전용). 벡터는 단위 벡터로 양자화해 두고 노름을 따로 저장하므로
+    컬렉션의 거리 방식(cosine/l2/ip)을 Chroma와 같은 값으로 계산함
+    """
+
+    def __init__(self, path: str, nprobe: int = 8):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 압축 인덱스 형식: {self.manifest.get('format')} ({path})")
+        self.name = self.manifest["name"]
+        self.id = self.manifest["fingerprint"]
+        self.metadata = self.manifest.get("metadata") or {}
+        self.space = self.metadata.get("hnsw:space", "l2")
+        self.nprobe = nprobe
+
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.manifest["dtype"] == "int8" else None
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self.centroids = None
+        self.lists = None
+        if self.manifest.get("ivf_lists"):
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.lists = np.load(os.path.join(path, "lists.npy"))
+
+        self._records_file = open(os.path.join(path, "records.jsonl"), "rb")
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ) if len(self.ids) else None
+        # where 필터용 메타데이터 열과 필터 결과 마스크 (처음 쓰일 때 한 번 읽음)
+        self._lock = threading.Lock()
+        self._columns: Dict[str, List[Any]] = {}
+        self._masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _record(self, row: int) -> Dict:
+        return json.loads(self._records[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    def _column(self, key: str) -> List[Any]:
+        with self._lock:
+            column = self._columns.get(key)
+        if column is None:
+            column = [self._record(row)["metadata"].get(key) for row in range(len(self.ids))]
+            with self._lock:
+                self._columns[key] = column
+        return column
+
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """where 필터를 통과하는 행의 불리언 마스크 (필터가 없으면 None)"""
+        if not where:
+            return None
+        cache_key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            mask = self._masks.get(cache_key)
+            if mask is not None:
+                self._masks.move_to_end(cache_key)
+                return mask
+        columns = {key: self._column(key) for key in _where_keys(where)}
+        mask = np.fromiter((_matches({k: c[row] for k, c in columns.items()}, where) for row in range(len(self.ids))),
+                           dtype=bool, count=len(self.ids))
+        with self._lock:
+            self._masks[cache_key] = mask
+            while len(self._masks) > _MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return mask
+
+    def _dot(self, start: int, end: int, queries: np.ndarray) -> np.ndarray:
+        """행 [start, end)의 단위 벡터와 질의 벡터들의 내적 (행 수 × 질의 수)"""
+        scores = np.empty((end - start, queries.shape[0]), dtype=np.float32)
+        for block_start in range(start, end, _BLOCK_ROWS):
+            block_end = min(end, block_start + _BLOCK_ROWS)
+            block = np.asarray(self.vectors[block_start:block_end], dtype=np.float32) @ queries.T
+            if self.scales is not None:
+                block *= np.asarray(self.scales[block_start:block_end])[:, None]
+            scores[block_start - start:block_end - start] = block
+        return scores
+
+    def _distances(self, dots: np.ndarray, rows: Optional[np.ndarray], query_norms: np.ndarray) -> np.ndarray:
+        """단위 벡터 내적 → 컬렉션 거리 방식의 거리 (Chroma와 같이 l2는 제곱 거리)"""
+        if self.space == "cosine":
+            return 1.0 - dots
+        norms = np.asarray(self.norms if rows is None else self.norms[rows], dtype=np.float32)[:, None]
+        if self.space == "ip":
+            return 1.0 - dots * norms * query_norms[None, :]
+        return norms ** 2 + query_norms[None, :] ** 2 - 2.0 * dots * norms * query_norms[None, :]
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """IVF가 있으면 질의와 가까운 nprobe개 목록의 행 번호 (없으면 None = 전체)"""
+        if self.centroids is None or self.nprobe >= len(self.centroids):
+            return None
+        nearest = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        return np.concatenate([np.arange(self.lists[c], self.lists[c + 1]) for c in sorted(nearest)])
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: Optional[Dict] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), **kwargs) -> Dict[str, List]:
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        query_norms = np.linalg.norm(queries, axis=1)
+        units = queries / np.where(query_norms == 0, 1.0, query_norms)[:, None]
+        mask = self._mask(where)
+        output = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        full = None
+        if self.centroids is None or self.nprobe >= len(self.centroids):
+            # 전체 검색은 모든 질의를 한 번의 행렬 곱으로 계산
+            full = self._distances(self._dot(0, len(self.ids), units), None, query_norms) if len(self.ids) else None
+        for q in range(len(units)):
+            if full is not None:
+                rows, distances = None, full[:, q]
+            elif len(self.ids):
+                rows = self._candidate_rows(units[q])
+                dots = self._dot(0, len(self.ids), units[q:q + 1]) if rows is None else \
+                    (np.asarray(self.vectors[rows], dtype=np.float32) @ units[q][:, None]) * \
+                    (np.asarray(self.scales[rows])[:, None] if self.scales is not None else 1.0)
+                distances = self._distances(dots, rows, query_norms[q:q + 1])[:, 0]
+            else:
+                rows, distances = None, np.empty(0, dtype=np.float32)
+            if mask is not None:
+                distances = np.where(mask if rows is None else mask[rows], distances, np.inf)
+            k = min(n_results, int(np.isfinite(distances).sum()))
+            top = np.argpartition(distances, k - 1)[:k] if 0 < k < len(distances) else np.arange(k)
+            top = top[np.argsort(distances[top], kind="stable")]
+            result_rows = top if rows is None else rows[top]
+            records = [self._record(row) for row in result_rows]
+            output["ids"].append([self.ids[row] for row in result_rows])
+            output["documents"].append([r["document"] for r in records])
+            output["metadatas"].append([r["metadata"] for r in records])
+            output["distances"].append([float(d) for d in distances[top]])
+        return {key: (value if key == "ids" or key in include else None) for key, value in output.items()}
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = ("documents", "metadatas"), **kwargs) -> Dict[str, List]:
+        if ids is not None:
+            rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        else:
+            rows = list(range(len(self.ids)))
+        mask = self._mask(where)
+        if mask is not None:
+            rows = [row for row in rows if mask[row]]
+        rows = rows[offset or 0:(offset or 0) + limit if limit is not None else None]
+        records = [self._record(row) for row in rows] if ("documents" in include or "metadatas" in include) else []
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [r["document"] for r in records] if "documents" in include else None,
+            "metadatas": [r["metadata"] for r in records] if "metadatas" in include else None,
+            "embeddings": None,
+        }
+
+    def close(self):
+        if self._records is not None:
+            self._records.close()
+        self._records_file.close()
+
+
+class CompactClient:
+    """chromadb.PersistentClient 대신 쓰는 압축 인덱스 폴더 클라이언트 (get_collection만 지원)"""
+
+    def __init__(self, path: str, nprobe: int = 8):
+        self.path = path
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._collections: Dict[str, CompactCollection] = {}
+
+    def fingerprint(self, name: str) -> str:
+        """내보낸 컬렉션의 지문을 매니페스트에서만 읽음 (파일을 열거나 닫지 않으므로 변경 감지용)"""
+        manifest_path = os.path.join(self.path, name, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"Collection {name} does not exist. ({self.path})")
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)["fingerprint"]
+
+    def get_collection(self, name: str, embedding_function: Any = None) -> CompactCollection:
+        """
+        컬렉션을 열어 재사용. 다시 내보내서 지문이 바뀌었으면 새로 염.
+        이전 컬렉션은 검색 중일 수 있으므로 닫지 않고, 호출한 쪽이 참조를 바꾼 뒤 close_replaced로 닫음
+        """
+        fingerprint = self.fingerprint(name)
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None or collection.id != fingerprint:
+                collection = CompactCollection(os.path.join(self.path, name), nprobe=self.nprobe)
+                self._collections[name] = collection
+            return collection
+
+    def close_replaced(self, collections: Sequence[Optional[CompactCollection]]):
+        """새 파일로 교체되어 더 이상 이 클라이언트가 돌려주지 않는 컬렉션의 파일을 닫음"""
+        with self._lock:
+            current = [id(c) for c in self._collections.values()]
+        for collection in collections:
+            if collection is not None and id(collection) not in current:
+                collection.close()
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 42) -> np.ndarray:
+    """단위 벡터의 코사인 k-means 중심 (IVF 대략 목록용)"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assignments == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+            else:
+                centroids[c] = vectors[rng.integers(len(vectors))]
+    return centroids
+
+
+def export_collection(collection, output_dir: str, dtype: str = "int8", ivf_lists: int = 0,
+                      page_size: int = 1000, sample_size: int = 50000) -> Dict[str, Any]:
+    """Chroma 컬렉션 하나를 압축 인덱스 폴더로 내보내고 manifest를 반환"""
+    if dtype not in DTYPES:
+        raise ValueError(f"지원하지 않는 형식: {dtype} ({', '.join(DTYPES)} 중 선택)")
+    os.makedirs(output_dir, exist_ok=True)
+    ids: List[str] = []
+    units: List[np.ndarray] = []
+    norms: List[np.ndarray] = []
+    records_path = os.path.join(output_dir, "records.jsonl")
+    offsets = [0]
+    tmp_records_path = records_path + ".tmp"
+    with open(tmp_records_path, "wb") as records:
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            page_norms = np.linalg.norm(embeddings, axis=1)
+            units.append(embeddings / np.where(page_norms == 0, 1.0, page_norms)[:, None])
+            norms.append(page_norms)
+            for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                line = json.dumps({"document": document, "metadata": metadata or {}}, ensure_ascii=False).encode("utf-8") + b"\n"
+                records.write(line)
+                offsets.append(offsets[-1] + len(line))
+                ids.append(chunk_id)
+            offset += len(page["ids"])
+
+    vectors = np.concatenate(units) if units else np.zeros((0, 0), dtype=np.float32)
+    all_norms = np.concatenate(norms) if norms else np.zeros(0, dtype=np.float32)
+    order = np.arange(len(ids))
+    n_lists = min(ivf_lists, len(ids) // 10) if ivf_lists else 0
+    if n_lists:
+        # 행을 IVF 목록 순으로 재배치해 목록 하나가 연속된 구간이 되도록 함
+        rng = np.random.default_rng(42)
+        sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+        centroids = _spherical_kmeans(sample, n_lists)
+        assignments = np.concatenate([np.argmax(vectors[s:s + _BLOCK_ROWS] @ centroids.T, axis=1)
+                                      for s in range(0, len(vectors), _BLOCK_ROWS)])
+        order = np.argsort(assignments, kind="stable")
+        np.save(os.path.join(output_dir, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(output_dir, "lists.npy"),
+                np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64))
+
+    vectors = vectors[order]
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(output_dir, "vectors.npy"), np.round(vectors / scales[:, None]).astype(np.int8))
+        np.save(os.path.join(output_dir, "scales.npy"), scales.astype(np.float32))
+    else:
+        np.save(os.path.join(output_dir, "vectors.npy"), vectors.astype(np.float16))
+    np.save(os.path.join(output_dir, "norms.npy"), all_norms[order].astype(np.float32))
+
+    new_offsets = [0]
+    with open(tmp_records_path, "rb") as source, open(records_path, "wb") as target:
+        for row in order:
+            source.seek(offsets[row])
+            line = source.read(offsets[row + 1] - offsets[row])
+            target.write(line)
+            new_offsets.append(new_offsets[-1] + len(line))
+    os.remove(tmp_records_path)
+    np.save(os.path.join(output_dir, "offsets.npy"), np.asarray(new_offsets, dtype=np.int64))
+    with open(os.path.join(output_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump([ids[row] for row in order], f, ensure_ascii=False)
+
+    created_at = datetime.now().isoformat(timespec="seconds")
+    manifest = {
+        "format": FORMAT_VERSION,
+        "name": collection.name,
+        "count": len(ids),
+        "dim": int(vectors.shape[1]) if len(ids) else 0,
+        "dtype": dtype,
+        "ivf_lists": n_lists,
+        "metadata": dict(collection.metadata or {}),
+        "source_id": str(collection.id),
+        "created_at": created_at,
+        "fingerprint": hashlib.sha256(f"{collection.id}:{len(ids)}:{dtype}:{n_lists}:{created_at}".encode()).hexdigest()[:16],
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def export_index(db_path: str, output_path: str, collection_names: Sequence[str], dtype: str = "int8",
+                 ivf_lists: int = 0) -> List[Dict[str, Any]]:
+    """
+    ChromaDB의 컬렉션들을 output_path 아래 컬렉션별 폴더로 내보냄.
+    새 폴더에 모두 쓴 뒤 교체하므로 실행 중인 서버는 재시작 전까지 기존 파일을 계속 읽음
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=db_path)
+    manifests = []
+    for name in collection_names:
+        # 메타데이터/임베딩만 읽으므로 임베딩 함수 없이 열어 모델 로드를 피함
+        collection = client.get_collection(name=name, embedding_function=None)
+        started = time.perf_counter()
+        staging = os.path.join(output_path, f".{name}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        manifest = export_collection(collection, staging, dtype=dtype, ivf_lists=ivf_lists)
+        target = os.path.join(output_path, name)
+        if os.path.exists(target):
+            retired = os.path.join(output_path, f".{name}.old")
+            shutil.rmtree(retired, ignore_errors=True)
+            os.replace(target, retired)
+            os.replace(staging, target)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.replace(staging, target)
+        manifest["export_seconds"] = round(time.perf_counter() - started, 2)
+        manifests.append(manifest)
+    return manifests
+
+
+def _directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def main():
+    """ChromaDB 컬렉션을 압축 인덱스로 내보내기"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="ChromaDB 컬렉션을 저메모리 압축 인덱스(VECTOR_BACKEND=compact)로 내보내기")
+    parser.add_argument("--db-path", default=os.getenv("CHROMA_DB_PATH", "./chroma_db"), help="ChromaDB 경로 (기본값: CHROMA_DB_PATH 또는 ./chroma_db)")
+    parser.add_argument("--output", default=os.getenv("COMPACT_INDEX_PATH", "./compact_index"), help="출력 폴더 (기본값: COMPACT_INDEX_PATH 또는 ./compact_index)")
+    parser.add_argument("--collections", default="legal_docs,legal_manuals", help="내보낼 컬렉션 (쉼표 구분, 기본값: legal_docs,legal_manuals)")
+    parser.add_argument("--dtype", default="int8", choices=DTYPES, help="임베딩 저장 형식 (기본값: int8)")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="IVF 대략 목록 수, 0이면 전체 검색 (기본값: 0)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    collection_names = [name.strip() for name in args.collections.split(",") if name.strip()]
+    print(f"🚀 압축 인덱스 내보내기: {args.db_path} → {args.output} ({args.dtype}, IVF {args.ivf_lists or '없음'})")
+    print("=" * 50)
+    for manifest in export_index(args.db_path, args.output, collection_names, args.dtype, args.ivf_lists):
+        size_mb = _directory_size(os.path.join(args.output, manifest["name"])) / 2 ** 20
+        print(f"✅ {manifest['name']}: {manifest['count']}개 청크, {manifest['dim']}차원, {size_mb:.1f}MB, "
+              f"{manifest['export_seconds']:.1f}초 (지문 {manifest['fingerprint']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import re
+import threading
+from typing import Dict, List, Set, Tuple
+
+from bm25 import tokenize
+from utils import estimate_tokens
+
+# 문장 끝 문장부호 뒤 공백 또는 줄바꿈에서 분리 (전처리 노트북의 문장 분할과 같은 기준)
+_SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?。])\s+|\n+')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+# 생략된 문장 자리 표시
+ELLIPSIS = " … "
+# 이보다 작은 예산으로는 청크 일부를 잘라 넣지 않음
+MIN_FRAGMENT_TOKENS = 20
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT_PATTERN.split(text or "") if s and s.strip()]
+
+
+def _sentence_key(sentence: str) -> str:
+    return _WHITESPACE_PATTERN.sub(' ', sentence).strip()
+
+
+class ContextBudget:
+    """
+    한 요청 동안의 남은 토큰 예산과 이미 프롬프트에 넣은 문장.
+    여러 반복에 걸쳐 도구 결과를 넣어도 같은 예산과 중복 기준이 적용됨
+    """
+
+    def __init__(self, budgeter: "ContextBudgeter", query: str):
+        self.budgeter = budgeter
+        self.remaining = budgeter.max_tokens
+        self._query_terms = set(tokenize(query))
+        # 출처 파일별로 이미 넣은 문장 (청크 간 겹침 제거용)
+        self._seen: Dict[str, Set[str]] = {}
+
+    def compact(self, tool_results: List[Dict]) -> List[Dict]:
+        """
+        도구 결과 목록을 예산에 맞게 압축한 사본을 반환.
+        겹치는 문장 제거 → 긴 청크는 질의와 관련 있는 문장만 남김 → 각 결과의 순위별로 번갈아 넣고 예산을 넘는 낮은 순위부터 제외
+        """
+        compacted = [{**result, "results": []} if isinstance(result, dict) and "results" in result else result
+                     for result in tool_results]
+        # (순위, 도구 순서) 순으로 넣어 모든 도구의 1순위 결과가 2순위 결과보다 먼저 예산을 받도록 함
+        hits: List[Tuple[int, int, Dict]] = []
+        for tool_index, result in enumerate(tool_results):
+            if isinstance(result, dict):
+                for rank, hit in enumerate(result.get("results") or []):
+                    hits.append((rank, tool_index, hit))
+        hits.sort(key=lambda item: (item[0], item[1]))
+
+        stats = {"hits_in": len(hits), "tokens_in": 0, "tokens_out": 0, "deduplicated": 0, "trimmed": 0, "dropped": 0}
+        for _, tool_index, hit in hits:
+            content = hit.get("content") or ""
+            stats["tokens_in"] += estimate_tokens(content)
+            seen = self._seen.setdefault(hit.get("source_file") or "", set())
+            sentences = [s for s in split_sentences(content) if _sentence_key(s) not in seen]
+            if not sentences:
+                stats["deduplicated"] += 1
+                continue
+            limit = min(self.budgeter.max_chunk_tokens, self.remaining)
+            text, kept = self._select_sentences(sentences, limit)
+            if not kept:
+                stats["dropped"] += 1
+                continue
+            if text != " ".join(sentences):
+                stats["trimmed"] += 1
+            seen.update(_sentence_key(s) for s in kept)
+            tokens = estimate_tokens(text)
+            self.remaining -= tokens
+            stats["tokens_out"] += tokens
+            compacted[tool_index]["results"].append({**hit, "content": text})
+
+        for original, result in zip(tool_results, compacted):
+            if isinstance(original, dict) and "results" in original:
+                omitted = len(original.get("results") or []) - len(result["results"])
+                if omitted:
+                    result["omitted_results"] = omitted
+        self.budgeter.record(stats)
+        return compacted
+
+    def _select_sentences(self, sentences: List[str], limit: int) -> Tuple[str, List[str]]:
+        """
+        limit 토큰 안에 들도록 문장 선택. 전부 들어가면 그대로, 아니면 질의어가 많이 겹치는 문장부터 고르되
+        첫 문장(조문 제목 등)을 우선하고 원래 순서로 이어 붙임
+        """
+        if limit <= 0:
+            return "", []
+        text = " ".join(sentences)
+        if estimate_tokens(text) <= limit:
+            return text, sentences
+
+        scores = []
+        for index, sentence in enumerate(sentences):
+            terms = tokenize(sentence)
+            overlap = sum(1 for t in terms if t in self._query_terms) / (len(terms) ** 0.5) if terms else 0.0
+            scores.append(float("inf") if index == 0 else overlap)
+
+        chosen: List[int] = []
+        used = 0
+        for index in sorted(range(len(sentences)), key=lambda i: (scores[i], -i), reverse=True):
+            if scores[index] <= 0 and chosen:
+                break
+            tokens = estimate_tokens(sentences[index])
+            if used + tokens > limit:
+                continue
+            chosen.append(index)
+            used += tokens
+        if not chosen:
+            # 문장부호 없이 긴 청크(슬라이드 텍스트 등)는 남은 예산만큼 앞부분을 잘라 사용
+            if limit < MIN_FRAGMENT_TOKENS:
+                return "", []
+            first = sentences[0]
+            # 글자 수 비례로 자른 뒤, 추정치 올림과 생략 부호 때문에 한도를 넘으면 조금씩 더 자름
+            cut = int(len(first) * limit / estimate_tokens(first))
+            while cut > 0 and estimate_tokens(first[:cut].rstrip() + "…") > limit:
+                cut -= max(1, cut // 20)
+            return first[:cut].rstrip() + "…", [first]
+        chosen.sort()
+        parts = [sentences[chosen[0]]]
+        for previous, index in zip(chosen, chosen[1:]):
+            parts.append((" " if index == previous + 1 else ELLIPSIS) + sentences[index])
+        return "".join(parts), [sentences[i] for i in chosen]
+
+
+class ContextBudgeter:
+    """도구 결과가 프롬프트에 들어가기 전에 요청당 토큰 예산 안으로 압축"""
+
+    def __init__(self, max_tokens: int = 2000, max_chunk_tokens: int = 400):
+        self.max_tokens = max_tokens
+        self.max_chunk_tokens = max_chunk_tokens
+        self._lock = threading.Lock()
+        self._totals = {"requests": 0, "hits_in": 0, "tokens_in": 0, "tokens_out": 0,
+                        "deduplicated": 0, "trimmed": 0, "dropped": 0}
+
+    def start(self, query: str) -> ContextBudget:
+        with self._lock:
+            self._totals["requests"] += 1
+        return ContextBudget(self, query)
+
+    def record(self, stats: Dict[str, int]):
+        with self._lock:
+            for key, value in stats.items():
+                self._totals[key] += value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            totals = dict(self._totals)
+        saved = totals["tokens_in"] - totals["tokens_out"]
+        return {
+            **totals,
+            "max_tokens": self.max_tokens,
+            "max_chunk_tokens": self.max_chunk_tokens,
+            "saved_ratio": saved / totals["tokens_in"] if totals["tokens_in"] else 0.0,
+        }
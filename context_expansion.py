@@ -0,0 +1,237 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+EXPANSION_MODES = ("none", "parent", "article", "neighbors")
+# 긴 조문을 나눌 때 문장 단위 분할은 앞 청크의 마지막 문장을 겹쳐 넣으므로, 이어 붙일 때 겹친 부분을 제거
+_MAX_OVERLAP_CHARS = 600
+_MIN_OVERLAP_CHARS = 10
+
+
+def _strip_part_header(content: str) -> Tuple[str, str]:
+    """하위 청크의 '[제목 (부분)]' 머리글을 떼어 (원래 제목, 본문)으로 반환"""
+    if content.startswith("[") and "\n" in content:
+        header, body = content.split("\n", 1)
+        if header.endswith("(부분)]"):
+            return header[1:-len("(부분)]")].strip(), body
+    return "", content
+
+
+def _merge_overlap(text: str, following: str) -> str:
+    limit = min(len(text), len(following), _MAX_OVERLAP_CHARS)
+    for size in range(limit, _MIN_OVERLAP_CHARS - 1, -1):
+        if text.endswith(following[:size]):
+            return text + following[size:]
+    return f"{text}\n{following}" if text else following
+
+
+class ChunkGraph:
+    """
+    컬렉션 청크 사이의 관계 (메타데이터만 보관, 본문은 필요할 때 가져옴).
+    분할된 조문의 하위 청크 목록(parent_chunk_id), 조문 단위 청크 목록(hierarchy_path), 파일 안의 순서(chunk_index)
+    """
+
+    def __init__(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        self.metadatas: Dict[str, Dict] = {}
+        self._siblings: Dict[str, List[str]] = {}
+        self._articles: Dict[Tuple[str, str], List[str]] = {}
+        self._files: Dict[str, List[str]] = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            metadata = metadata or {}
+            self.metadatas[chunk_id] = metadata
+            source_file = metadata.get("source_file", "")
+            self._files.setdefault(source_file, []).append(chunk_id)
+            if metadata.get("is_sub_chunk") and metadata.get("parent_chunk_id"):
+                self._siblings.setdefault(metadata["parent_chunk_id"], []).append(chunk_id)
+            article = self._article_of(metadata)
+            if article:
+                self._articles.setdefault((source_file, article), []).append(chunk_id)
+
+        order = lambda chunk_id: int(self.metadatas[chunk_id].get("chunk_index") or 0)
+        for members in (*self._articles.values(), *self._files.values()):
+            members.sort(key=order)
+        for members in self._siblings.values():
+            members.sort(key=lambda chunk_id: int(self.metadatas[chunk_id].get("sub_index") or 0))
+        self._file_positions = {chunk_id: i for members in self._files.values() for i, chunk_id in enumerate(members)}
+
+    def __len__(self) -> int:
+        return len(self.metadatas)
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000) -> "ChunkGraph":
+        """Chroma 컬렉션의 메타데이터만 페이지 단위로 읽어 생성 (본문/임베딩은 읽지 않음)"""
+        ids, metadatas = [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        return cls(ids, metadatas)
+
+    @staticmethod
+    def _article_of(metadata: Dict) -> str:
+        try:
+            path = json.loads(metadata.get("hierarchy_path") or "[]")
+        except (TypeError, ValueError):
+            return ""
+        levels = dict(part.split(":", 1) for part in path if isinstance(part, str) and ":" in part)
+        # 부칙 조문은 본문 조문과 번호가 겹치므로 묶지 않음
+        if "appendix" in levels or "attachment" in levels:
+            return ""
+        return levels.get("article", "")
+
+    def group(self, chunk_id: str, metadata: Dict, mode: str, window: int) -> Tuple[str, List[str]]:
+        """
+        확장 단위의 (키, 청크 ID 목록). 키가 같은 검색 결과는 하나로 합침.
+        parent: 분할된 조문의 하위 청크 전체 / article: 같은 조문의 모든 청크 / neighbors: 파일 안 앞뒤 window개
+        """
+        source_file = metadata.get("source_file", "")
+        parent_id = metadata.get("parent_chunk_id") if metadata.get("is_sub_chunk") else ""
+        if mode == "article":
+            article = self._article_of(metadata)
+            members = self._articles.get((source_file, article)) if article else None
+            if members:
+                return f"article:{source_file}:{article}", members
+        if mode == "neighbors" and chunk_id in self._file_positions:
+            members = self._files[source_file]
+            position = self._file_positions[chunk_id]
+            return f"chunk:{chunk_id}", members[max(0, position - window):position + window + 1]
+        if parent_id and parent_id in self._siblings:
+            return f"parent:{parent_id}", self._siblings[parent_id]
+        return f"chunk:{chunk_id}", [chunk_id]
+
+
+class ContextExpander:
+    """
+    작은 청크로 검색한 결과를 부모 조문/같은 조문/이웃 청크로 넓혀 반환 (small-to-big).
+    같은 부모를 가진 결과는 가장 순위가 높은 것 하나로 합치고, 필요한 청크 본문은 요청 하나당 한 번의 일괄 조회로 가져오며,
+    완성된 확장 본문은 LRU 캐시에 보관
+    """
+
+    def __init__(self, mode: str = "parent", window: int = 1, max_chars: int = 3000, cache_size: int = 512):
+        if mode not in EXPANSION_MODES:
+            raise ValueError(f"알 수 없는 문맥 확장 방식: {mode} ({', '.join(EXPANSION_MODES)} 중 선택)")
+        self.mode = mode
+        self.window = window
+        self.max_chars = max_chars
+        self.cache_size = cache_size
+        self.graphs: Dict[str, ChunkGraph] = {}
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self.stats = {"expanded": 0, "merged": 0, "cache_hits": 0, "fetched_chunks": 0, "fetches": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none"
+
+    def collapse(self, collection_name: str, hits: List, limit: Optional[int] = None, mode: Optional[str] = None) -> List:
+        """같은 확장 단위에 속한 결과 중 가장 순위가 높은 결과만 남기고 앞에서부터 limit개 반환 (mode를 주면 설정 대신 사용)"""
+        graph = self.graphs.get(collection_name)
+        if not self.enabled or graph is None:
+            return hits[:limit]
+        mode = mode or self.mode
+        seen, collapsed = set(), []
+        for hit in hits:
+            if limit is not None and len(collapsed) >= limit:
+                break
+            key = graph.group(hit.id, hit.metadata, mode, self.window)[0] if hit.id is not None else f"hit:{id(hit)}"
+            if key in seen:
+                with self._lock:
+                    self.stats["merged"] += 1
+                continue
+            seen.add(key)
+            collapsed.append(hit)
+        return collapsed
+
+    def expand(self, collection_name: str, result_lists: List[List], fetch: Callable[[List[str]], Dict[str, str]],
+               mode: Optional[str] = None) -> List[List]:
+        """
+        여러 검색 요청의 결과 목록을 확장. 캐시에 없는 확장 단위의 청크 본문은 fetch(ids) 한 번으로 가져옴
+        (검색 결과로 이미 가진 본문은 다시 가져오지 않음)
+        """
+        graph = self.graphs.get(collection_name)
+        if not self.enabled or graph is None:
+            return result_lists
+        mode = mode or self.mode
+
+        known: Dict[str, str] = {}
+        plans: Dict[str, Tuple[str, List[str]]] = {}
+        texts: Dict[str, str] = {}
+        for hits in result_lists:
+            for hit in hits:
+                if hit.id is None:
+                    continue
+                known[hit.id] = hit.content
+                key, members = graph.group(hit.id, hit.metadata, mode, self.window)
+                if len(members) <= 1 or key in plans or key in texts:
+                    continue
+                with self._lock:
+                    cached = self._cache.get((collection_name, key))
+                    if cached is not None:
+                        self._cache.move_to_end((collection_name, key))
+                        self.stats["cache_hits"] += 1
+                if cached is not None:
+                    texts[key] = cached
+                else:
+                    plans[key] = (hit.id, members)
+
+        missing = list(dict.fromkeys(m for _, members in plans.values() for m in members if m not in known))
+        if missing:
+            known.update(fetch(missing))
+            with self._lock:
+                self.stats["fetches"] += 1
+                self.stats["fetched_chunks"] += len(missing)
+        for key, (hit_id, members) in plans.items():
+            texts[key] = self._assemble(hit_id, [m for m in members if m in known], known)
+            with self._lock:
+                self._cache[(collection_name, key)] = texts[key]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        expanded_lists = []
+        for hits in result_lists:
+            expanded = []
+            for hit in hits:
+                key = graph.group(hit.id, hit.metadata, mode, self.window)[0] if hit.id is not None else None
+                if key in texts:
+                    hit = type(hit)(content=texts[key], metadata=hit.metadata, distance=hit.distance, id=hit.id)
+                    with self._lock:
+                        self.stats["expanded"] += 1
+                expanded.append(hit)
+            expanded_lists.append(expanded)
+        return expanded_lists
+
+    def _assemble(self, hit_id: str, members: List[str], texts: Dict[str, str]) -> str:
+        """청크 본문을 문서 순서대로 이어 붙임. max_chars를 넘으면 검색된 청크에서 가까운 청크부터 포함"""
+        if hit_id in members and self.max_chars:
+            center = members.index(hit_id)
+            chosen, total = {center}, len(texts[hit_id])
+            for distance in range(1, len(members)):
+                for position in (center - distance, center + distance):
+                    if 0 <= position < len(members) and total + len(texts[members[position]]) <= self.max_chars:
+                        chosen.add(position)
+                        total += len(texts[members[position]])
+            members = [members[p] for p in sorted(chosen)]
+
+        # 분할된 하위 청크는 연속된 것끼리 머리글을 한 번만 남기고 겹친 문장을 제거해 원래 조문으로 복원
+        segments: List[List[str]] = []  # [제목, 본문]
+        for chunk_id in members:
+            title, body = _strip_part_header(texts[chunk_id])
+            if title and segments and segments[-1][0] == title:
+                segments[-1][1] = _merge_overlap(segments[-1][1], body)
+            else:
+                segments.append([title, body if title else texts[chunk_id]])
+        return "\n".join(f"[{title}]\n{body}" if title else body for title, body in segments)
+
+    def cache_stats(self) -> Dict:
+        with self._lock:
+            return {"mode": self.mode, **self.stats, "cache_entries": len(self._cache),
+                    "chunks": {name: len(graph) for name, graph in self.graphs.items()}}
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
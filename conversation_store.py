@@ -0,0 +1,160 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore:
+    """세션별 대화 내역 저장소 (턴/토큰 상한, LRU·TTL 제거, 선택적 SQLite 영속화 - 여러 워커 간 공유 가능)"""
+
+    def __init__(self, max_turns: int = 6, max_tokens: int = 2000, ttl_seconds: int = 1800,
+                 max_sessions: int = 1000, db_path: Optional[str] = None):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.db_path = db_path
+        # session_id -> (마지막 접근 시각, 메시지 목록), 가장 오래 사용되지 않은 세션이 앞쪽
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_sessions = 0
+        self._last_db_sweep = 0.0
+        if self.db_path:
+            self._init_db()
+
+    def _init_db(self):
+        """세션 저장용 SQLite 테이블 초기화"""
+        with sqlite3.connect(self.db_path) as conn:
+            # 여러 워커 프로세스가 같은 파일을 동시에 읽고 쓸 수 있도록 WAL 모드 사용
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    messages TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+
+    def get_history(self, session_id: Optional[str]) -> List[Dict]:
+        """상한이 적용된 세션 대화 내역 반환 (세션이 없으면 빈 목록)"""
+        if not session_id:
+            return []
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            # SQLite를 쓰면 다른 워커 프로세스가 추가한 턴이 있을 수 있으므로 항상 DB 내용을 기준으로 함
+            entry = None if self.db_path else self._sessions.get(session_id)
+            if entry is None:
+                messages = self._load(session_id, now)
+                if messages is None:
+                    return []
+            else:
+                messages = entry[1]
+            self._touch(session_id, messages, now)
+            return list(messages)
+
+    def append_turn(self, session_id: Optional[str], user_message: str, assistant_message: str):
+        """사용자 질문과 최종 답변 한 턴을 세션에 추가하고 상한에 맞게 정리"""
+        if not session_id:
+            return
+        now = time.time()
+        with self._lock:
+            entry = None if self.db_path else self._sessions.get(session_id)
+            messages = list(entry[1]) if entry else (self._load(session_id, now) or [])
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": assistant_message})
+            messages = self._trim(messages)
+            self._touch(session_id, messages, now)
+            self._evict_overflow()
+            self._save(session_id, messages, now)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self.db_path:
+                try:
+                    with sqlite3.connect(self.db_path) as conn:
+                        conn.execute('DELETE FROM conversation_sessions WHERE session_id = ?', (session_id,))
+                except sqlite3.Error as e:
+                    logger.error(f"세션 삭제 실패 {session_id}: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "evicted_sessions": self.evicted_sessions,
+                "max_turns": self.max_turns,
+                "max_tokens": self.max_tokens,
+                "persistent": bool(self.db_path),
+            }
+
+    def _trim(self, messages: List[Dict]) -> List[Dict]:
+        """최근 max_turns 턴만 남기고, 토큰 상한을 넘으면 오래된 턴부터 제거"""
+        messages = messages[-self.max_turns * 2:]
+        total = sum(estimate_tokens(m["content"]) for m in messages)
+        while len(messages) > 2 and total > self.max_tokens:
+            dropped, messages = messages[:2], messages[2:]
+            total -= sum(estimate_tokens(m["content"]) for m in dropped)
+        return messages
+
+    def _touch(self, session_id: str, messages: List[Dict], now: float):
+        self._sessions[session_id] = (now, messages)
+        self._sessions.move_to_end(session_id)
+
+    def _evict_expired(self, now: float):
+        """TTL이 지난 유휴 세션 제거"""
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted_sessions += 1
+        # 영속화된 만료 세션은 1분에 한 번만 정리
+        if self.db_path and now - self._last_db_sweep > 60:
+            self._last_db_sweep = now
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    conn.execute('DELETE FROM conversation_sessions WHERE last_access < ?', (now - self.ttl_seconds,))
+            except sqlite3.Error as e:
+                logger.error(f"만료 세션 정리 실패: {e}")
+
+    def _evict_overflow(self):
+        """최대 세션 수를 넘으면 가장 오래 사용되지 않은 세션부터 메모리에서 제거"""
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted_sessions += 1
+
+    def _load(self, session_id: str, now: float) -> Optional[List[Dict]]:
+        if not self.db_path:
+            return None
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    'SELECT messages, last_access FROM conversation_sessions WHERE session_id = ?',
+                    (session_id,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"세션 로드 실패 {session_id}: {e}")
+            return None
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+        return self._trim(json.loads(row[0]))
+
+    def _save(self, session_id: str, messages: List[Dict], now: float):
+        if not self.db_path:
+            return
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO conversation_sessions (session_id, messages, last_access)
+                    VALUES (?, ?, ?)
+                ''', (session_id, json.dumps(messages, ensure_ascii=False), now))
+        except sqlite3.Error as e:
+            logger.error(f"세션 저장 실패 {session_id}: {e}")
@@ -0,0 +1,26 @@
+"""
+항만 법률/매뉴얼 문서 → ChromaDB 수집 패키지 (data_preprocessing_code.ipynb의 파이프라인을 모듈로 분리).
+
+    python -m harbor_ingest --data-dir ./data --collection legal_docs
+"""
+from .config import IngestConfig
+from .hash_manager import FileHashManager
+from .parser import EnhancedLegalParser, LegalStructure
+from .pipeline import IngestPipeline, ParsedDocument, discover_files, parse_document
+from .processor import EnhancedDocumentProcessor
+from .splitter import LegalSentenceSplitter
+from .vector_store import VectorStoreWriter
+
+__all__ = [
+    "EnhancedDocumentProcessor",
+    "EnhancedLegalParser",
+    "FileHashManager",
+    "IngestConfig",
+    "IngestPipeline",
+    "LegalSentenceSplitter",
+    "LegalStructure",
+    "ParsedDocument",
+    "VectorStoreWriter",
+    "discover_files",
+    "parse_document",
+]
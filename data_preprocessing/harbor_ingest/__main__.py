@@ -0,0 +1,91 @@
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from .config import EMBEDDING_BACKENDS, IngestConfig
+from .pipeline import IngestPipeline
+
+
+def main():
+    """문서 폴더를 파싱/임베딩해 ChromaDB 컬렉션에 증분 저장"""
+    load_dotenv()
+    defaults = IngestConfig()
+
+    parser = argparse.ArgumentParser(prog="python -m harbor_ingest", description="Harbor Agent 문서 수집 (벡터 DB 생성)")
+    parser.add_argument("--data-dir", default=defaults.data_dir, help=f"원본 문서 폴더 (기본값: {defaults.data_dir})")
+    parser.add_argument("--db-path", default=defaults.db_path, help=f"ChromaDB 경로 (기본값: {defaults.db_path})")
+    parser.add_argument("--collection", default=defaults.collection_name,
+                        help=f"컬렉션 이름: legal_docs(법률) 또는 legal_manuals(매뉴얼) (기본값: {defaults.collection_name})")
+    parser.add_argument("--metadata-db", default=defaults.metadata_db_path,
+                        help=f"처리 기록 SQLite 파일 (기본값: {defaults.metadata_db_path})")
+    parser.add_argument("--model", default=defaults.embedding_model, help=f"임베딩 모델 (기본값: {defaults.embedding_model})")
+    parser.add_argument("--backend", default=defaults.embedding_backend, choices=EMBEDDING_BACKENDS,
+                        help=f"임베딩 백엔드 (기본값: {defaults.embedding_backend})")
+    parser.add_argument("--device", default=defaults.embedding_device, help=f"임베딩 장치 (기본값: {defaults.embedding_device})")
+    parser.add_argument("--onnx-file", default=defaults.embedding_onnx_file, help="onnx 백엔드에서 사용할 모델 파일")
+    parser.add_argument("--workers", type=int, default=defaults.workers,
+                        help=f"문서 파싱 프로세스 수, 1이면 프로세스 풀 없이 실행 (기본값: {defaults.workers})")
+    parser.add_argument("--embed-batch-size", type=int, default=defaults.embed_batch_size,
+                        help=f"임베딩 배치 크기 (기본값: {defaults.embed_batch_size})")
+    parser.add_argument("--upsert-batch-size", type=int, default=defaults.upsert_batch_size,
+                        help=f"Chroma upsert 배치 크기 (기본값: {defaults.upsert_batch_size})")
+    parser.add_argument("--queue-size", type=int, default=defaults.queue_size,
+                        help=f"임베딩 대기 파일 수 상한 (기본값: {defaults.queue_size})")
+    parser.add_argument("--embedding-cache", default=defaults.embedding_cache_path,
+                        help="임베딩 캐시 SQLite 파일 (기본값: --metadata-db 파일에 함께 저장)")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="임베딩 캐시를 사용하지 않음")
+    parser.add_argument("--force", action="store_true", help="변경되지 않은 파일도 다시 처리 (바뀐 청크만 다시 임베딩)")
+    parser.add_argument("--log-level", default="INFO", help="로그 레벨 (기본값: INFO)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not Path(args.data_dir).is_dir():
+        print(f"❌ 문서 폴더를 찾을 수 없습니다: {args.data_dir}")
+        sys.exit(1)
+
+    config = IngestConfig(
+        data_dir=args.data_dir,
+        db_path=args.db_path,
+        collection_name=args.collection,
+        metadata_db_path=args.metadata_db,
+        embedding_model=args.model,
+        embedding_backend=args.backend,
+        embedding_device=args.device,
+        embedding_onnx_file=args.onnx_file,
+        workers=args.workers,
+        embed_batch_size=args.embed_batch_size,
+        upsert_batch_size=args.upsert_batch_size,
+        queue_size=args.queue_size,
+        embedding_cache=defaults.embedding_cache and not args.no_embedding_cache,
+        embedding_cache_path=args.embedding_cache,
+        force=args.force,
+    )
+    print(f"🚀 문서 수집 시작: {config.data_dir} → {config.db_path} ({config.collection_name})")
+    print(f"🔧 모델 {config.indexed_model_name} ({config.embedding_backend}, {config.embedding_device}), "
+          f"파싱 프로세스 {config.workers}개, 임베딩 배치 {config.embed_batch_size}, upsert 배치 {config.upsert_batch_size}")
+    print("=" * 50)
+
+    try:
+        stats = IngestPipeline(config).run()
+    except KeyboardInterrupt:
+        print("\n👋 중단했습니다. 저장이 끝난 파일은 기록되었으므로 다시 실행하면 남은 파일부터 처리합니다.")
+        sys.exit(1)
+
+    print("=" * 50)
+    print(f"✅ 완료: 처리 {stats['files_processed']}개, 변경 없음 {stats['files_skipped']}개, "
+          f"실패 {stats['files_failed']}개, {stats['elapsed_seconds']:.1f}초")
+    print(f"📦 청크 {stats['chunks']}개: 추가 {stats['chunks_added']}개, 메타데이터 갱신 {stats['chunks_updated']}개, "
+          f"삭제 {stats['chunks_removed']}개, 변경 없음 {stats['chunks_unchanged']}개 "
+          f"(임베딩 계산 {stats['embedded']}개, 캐시 {stats['embedding_cache_hits']}개)")
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if stats["files_failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
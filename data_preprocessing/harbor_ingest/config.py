@@ -0,0 +1,60 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict
+
+# 청킹 설정 (노트북 Config와 같은 값)
+MIN_CHUNK_LENGTH = 50
+MAX_CHUNK_LENGTH = 1500  # 법률 조항 최적화
+OVERLAP_SIZE = 200  # 문장 분할 시 앞뒤 문맥을 더 많이 포함하도록 설정
+
+SUPPORTED_EXTENSIONS = (".docx", ".pdf", ".pptx")
+# 서버 embeddings.DEFAULT_EMBEDDING_MODEL과 같은 모델
+DEFAULT_EMBEDDING_MODEL = "jhgan/ko-sroberta-multitask"
+EMBEDDING_BACKENDS = ("sentence-transformers", "onnx", "default")
+# Chroma 기본 임베딩 함수(ONNX)가 사용하는 모델
+CHROMA_DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+@dataclass
+class IngestConfig:
+    """
+    수집 파이프라인 실행 설정. 기본값은 환경 변수에서 읽고 CLI 인자로 덮어씀
+    (API 서버와 같은 CHROMA_DB_PATH / EMBEDDING_* 변수를 사용해 서버와 같은 모델로 색인)
+    """
+    data_dir: str = field(default_factory=lambda: os.getenv("INGEST_DATA_DIR", "./data"))
+    db_path: str = field(default_factory=lambda: os.getenv("CHROMA_DB_PATH", "./chroma_db"))
+    collection_name: str = field(default_factory=lambda: os.getenv("INGEST_COLLECTION", "legal_manuals"))
+    metadata_db_path: str = field(default_factory=lambda: os.getenv("INGEST_METADATA_DB_PATH", "./legal_metadata.db"))
+    embedding_model: str = field(default_factory=lambda: os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL))
+    embedding_backend: str = field(default_factory=lambda: os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower())
+    embedding_device: str = field(default_factory=lambda: os.getenv("EMBEDDING_DEVICE", "cpu"))
+    embedding_onnx_file: str = field(default_factory=lambda: os.getenv("EMBEDDING_ONNX_FILE", ""))
+    # 문서 파싱 프로세스 수
+    workers: int = field(default_factory=lambda: int(os.getenv("INGEST_WORKERS", min(4, os.cpu_count() or 1))))
+    # 임베딩 모델에 한 번에 넣는 문서 수 (CPU 추론 배치)
+    embed_batch_size: int = field(default_factory=lambda: int(os.getenv("INGEST_EMBED_BATCH_SIZE", 32)))
+    # Chroma upsert 한 번에 넣는 청크 수 (노트북 BATCH_SIZE)
+    upsert_batch_size: int = field(default_factory=lambda: int(os.getenv("INGEST_UPSERT_BATCH_SIZE", 100)))
+    # 파싱이 끝나 임베딩을 기다리는 파일 수 상한 (메모리 사용량 제한)
+    queue_size: int = field(default_factory=lambda: int(os.getenv("INGEST_QUEUE_SIZE", 8)))
+    # (모델, 청크 해시) 임베딩 캐시 사용 여부와 경로 (비우면 metadata_db_path 파일에 함께 저장)
+    embedding_cache: bool = field(default_factory=lambda: os.getenv("INGEST_EMBEDDING_CACHE", "true").lower() == "true")
+    embedding_cache_path: str = field(default_factory=lambda: os.getenv("INGEST_EMBEDDING_CACHE_PATH", ""))
+    # 변경되지 않은 파일도 다시 처리
+    force: bool = False
+
+    @property
+    def indexed_model_name(self) -> str:
+        """컬렉션 메타데이터에 기록할 실제 임베딩 모델 이름 (서버 embedding_model_name과 같은 규칙)"""
+        return CHROMA_DEFAULT_MODEL if self.embedding_backend == "default" else self.embedding_model
+
+    @property
+    def embedding_cache_key(self) -> str:
+        """임베딩 캐시의 모델 키. 같은 모델이라도 백엔드(ONNX 양자화 등)가 다르면 벡터가 달라지므로 구분"""
+        key = f"{self.indexed_model_name}|{self.embedding_backend}"
+        return f"{key}|{self.embedding_onnx_file}" if self.embedding_onnx_file else key
+
+    @property
+    def collection_metadata(self) -> Dict[str, str]:
+        # embedding_model: API 서버가 시작 시 자신의 임베딩 모델(EMBEDDING_MODEL)과 일치하는지 확인하는 값
+        return {"hnsw:space": "cosine", "embedding_model": self.indexed_model_name}
@@ -0,0 +1,50 @@
+import logging
+from typing import List, Optional, Sequence
+
+from .config import EMBEDDING_BACKENDS
+
+logger = logging.getLogger(__name__)
+
+
+def load_embedding_function(model_name: str, backend: str = "sentence-transformers", device: str = "cpu",
+                            onnx_file: Optional[str] = None):
+    """
+    문서 임베딩 함수 로드 (서버 embeddings.load_embedding_function과 같은 방식이어야 검색 시 같은 벡터 공간을 사용).
+    sentence-transformers: PyTorch, onnx: 같은 모델을 ONNX Runtime으로 CPU 추론, default: Chroma 기본 임베딩 함수
+    """
+    from chromadb.utils import embedding_functions
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"지원하지 않는 임베딩 백엔드: {backend}")
+    if backend == "default":
+        return embedding_functions.DefaultEmbeddingFunction()
+
+    kwargs = {}
+    if backend == "onnx":
+        kwargs["backend"] = "onnx"
+        if onnx_file:
+            kwargs["model_kwargs"] = {"file_name": onnx_file}
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name, device=device, **kwargs)
+
+
+class BatchEmbedder:
+    """
+    문서를 batch_size개씩 나눠 임베딩.
+    upsert 배치 크기와 분리되어 있어 CPU 캐시/메모리에 맞는 작은 배치로 추론하고 결과는 모아서 저장할 수 있음
+    """
+
+    def __init__(self, embedding_function, batch_size: int = 32):
+        self.embedding_function = embedding_function
+        self.batch_size = max(1, batch_size)
+        self.documents = 0
+        self.batches = 0
+
+    def embed(self, documents: Sequence[str]) -> List:
+        embeddings: List = []
+        for start in range(0, len(documents), self.batch_size):
+            batch = list(documents[start:start + self.batch_size])
+            embeddings.extend(self.embedding_function(batch))
+            self.batches += 1
+        self.documents += len(documents)
+        return embeddings
+
@@ -0,0 +1,62 @@
+import sqlite3
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+
+# SQLite 한 쿼리의 바인딩 변수 수 제한보다 작게 나눠 조회
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    (임베딩 모델, 청크 내용 해시) → 임베딩 벡터 SQLite 캐시.
+    컬렉션을 새로 만들거나 같은 모델로 다시 색인할 때 이미 계산한 청크는 인코더를 거치지 않음
+    """
+
+    def __init__(self, db_path: str, model_key: str):
+        self.db_path = db_path
+        self.model_key = model_key
+        self.hits = 0
+        self.misses = 0
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (model, chunk_hash)
+                )
+            ''')
+
+    def get_many(self, chunk_hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """캐시에 있는 해시의 임베딩만 반환"""
+        chunk_hashes = list(dict.fromkeys(chunk_hashes))
+        found: Dict[str, np.ndarray] = {}
+        with self._connect() as conn:
+            for start in range(0, len(chunk_hashes), _LOOKUP_BATCH):
+                batch = chunk_hashes[start:start + _LOOKUP_BATCH]
+                rows = conn.execute(
+                    f"SELECT chunk_hash, embedding FROM embedding_cache WHERE model = ? AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    (self.model_key, *batch),
+                ).fetchall()
+                for chunk_hash, blob in rows:
+                    found[chunk_hash] = np.frombuffer(blob, dtype=np.float32)
+        self.hits += len(found)
+        self.misses += len(chunk_hashes) - len(found)
+        return found
+
+    def put_many(self, chunk_hashes: Sequence[str], embeddings: Sequence):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, chunk_hash, embedding) VALUES (?, ?, ?)",
+                [(self.model_key, h, np.asarray(e, dtype=np.float32).tobytes()) for h, e in zip(chunk_hashes, embeddings)],
+            )
+
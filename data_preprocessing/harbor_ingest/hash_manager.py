@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: str) -> str:
+    """파일 해시 계산"""
+    hash_sha256 = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hash_sha256.update(chunk)
+    except OSError as e:
+        logger.error(f"파일 해시 계산 실패 {file_path}: {e}")
+        # 파일 수정시간과 크기를 기반으로 폴백 해시
+        stat = os.stat(file_path)
+        fallback_string = f"{file_path}_{stat.st_mtime}_{stat.st_size}"
+        return hashlib.sha256(fallback_string.encode()).hexdigest()
+
+    return hash_sha256.hexdigest()
+
+
+class FileHashManager:
+    """
+    파일 해시 및 메타데이터 관리.
+    파일은 청크가 벡터 DB에 모두 저장된 뒤에만 기록되므로, 중간에 중단된 실행을 다시 시작하면
+    기록되지 않은 파일부터 이어서 처리함
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        """메타데이터 DB 초기화"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_metadata (
+                    file_path TEXT PRIMARY KEY,
+                    file_hash TEXT NOT NULL,
+                    last_modified REAL NOT NULL,
+                    chunk_count INTEGER DEFAULT 0,
+                    processing_time REAL DEFAULT 0,
+                    last_processed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunk_metadata (
+                    chunk_id TEXT PRIMARY KEY,
+                    parent_chunk_id TEXT,
+                    file_path TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    is_sub_chunk BOOLEAN DEFAULT FALSE,
+                    chunk_hash TEXT,
+                    creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (file_path) REFERENCES file_metadata (file_path)
+                )
+            ''')
+            # 청크 해시 도입 이전에 만든 DB
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(chunk_metadata)')}
+            if 'chunk_hash' not in columns:
+                conn.execute('ALTER TABLE chunk_metadata ADD COLUMN chunk_hash TEXT')
+
+    def get_file_hash(self, file_path: str) -> str:
+        return file_sha256(file_path)
+
+    def should_process_file(self, file_path: str, file_hash: Optional[str] = None) -> bool:
+        """파일 처리 필요 여부 확인"""
+        try:
+            with self._connect() as conn:
+                result = conn.execute(
+                    'SELECT file_hash, last_modified FROM file_metadata WHERE file_path = ?',
+                    (file_path,)
+                ).fetchone()
+
+            if result is None:
+                return True  # 새 파일
+
+            stored_hash, stored_mtime = result
+            # 수정 시각이 같으면 해시 계산(파일 전체 읽기)을 생략
+            if abs(os.path.getmtime(file_path) - stored_mtime) <= 1:
+                return False
+            return (file_hash or self.get_file_hash(file_path)) != stored_hash
+
+        except Exception as e:
+            logger.error(f"파일 처리 필요성 확인 실패 {file_path}: {e}")
+            return True  # 오류 시 안전하게 처리
+
+    def mark_processed(self, file_path: str, file_hash: str, last_modified: float, chunks: List[Dict[str, Any]],
+                       parent_chunk_map: Dict[str, str], processing_time: float):
+        """
+        파일 메타데이터와 청크 목록을 한 트랜잭션으로 기록.
+        file_hash/last_modified는 파싱 시점 값이므로 처리 중에 파일이 바뀌면 다음 실행에서 다시 처리됨
+        """
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO file_metadata
+                (file_path, file_hash, last_modified, chunk_count, processing_time, last_processed)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (file_path, file_hash, last_modified, len(chunks), processing_time))
+
+            # 기존 청크 삭제 후 새 청크 등록
+            conn.execute('DELETE FROM chunk_metadata WHERE file_path = ?', (file_path,))
+            conn.executemany('''
+                INSERT OR REPLACE INTO chunk_metadata
+                (chunk_id, parent_chunk_id, file_path, chunk_index, is_sub_chunk, chunk_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (chunk['chunk_id'], parent_chunk_map.get(chunk['chunk_id']), file_path, i,
+                 chunk['chunk_id'] in parent_chunk_map, chunk.get('chunk_hash'))
+                for i, chunk in enumerate(chunks)
+            ])
+
@@ -0,0 +1,136 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class LegalStructure:
+    """법률 구조 정보를 담는 데이터 클래스"""
+    structure_type: str
+    number: str
+    title: str
+    level: int
+    parent_ref: Optional[str] = None
+    cross_refs: List[str] = field(default_factory=list)
+    original_chunk_id: Optional[str] = None  # 원본 청크 추적용
+
+
+class EnhancedLegalParser:
+    """개선된 법률 문서 구조 파서"""
+
+    def __init__(self):
+        # 기존 패턴 유지하되 개선
+        self.patterns = {
+            'chapter': re.compile(r"^\s*제\s*([0-9]+(?:의[0-9]+)?)\s*장\s*(.*)$", re.MULTILINE),
+            'section': re.compile(r"^\s*제\s*([0-9]+(?:의[0-9]+)?)\s*절\s*(.*)$", re.MULTILINE),
+            'article': re.compile(r"^\s*제\s*([0-9]+(?:의[0-9]+)?)\s*조\s*(?:\(([^)]+)\))?\s*(.*)$", re.MULTILINE),
+            'paragraph': re.compile(r"^\s*(①|②|③|④|⑤|⑥|⑦|⑧|⑨|⑩|⑪|⑫|⑬|⑭|⑮|⑯|⑰|⑱|⑲|⑳)\s*(.*)$", re.MULTILINE),
+            'item': re.compile(r"^\s*([0-9]+)\.\s*(.*)$", re.MULTILINE),
+            'subitem': re.compile(r"^\s*([가-힣])\.\s*(.*)$", re.MULTILINE),
+            'appendix': re.compile(r"^\s*부\s*칙\s*(.*)$", re.MULTILINE),
+            'attachment': re.compile(r"^\s*(\[별표\s*[0-9]+.*?\]|별지\s*제[0-9]+호서식)\s*(.*)$", re.MULTILINE),
+        }
+
+        self.cross_ref_patterns = {
+            'article_ref': re.compile(r"제\s*([0-9]+(?:의[0-9]+)?)\s*조"),
+            'paragraph_ref': re.compile(r"제\s*([0-9]+)\s*항"),
+            'item_ref': re.compile(r"제\s*([0-9]+)\s*호"),
+            'law_ref': re.compile(r"「([^」]+)」"),
+        }
+
+        self.paragraph_map = {
+            '①': '1', '②': '2', '③': '3', '④': '4', '⑤': '5',
+            '⑥': '6', '⑦': '7', '⑧': '8', '⑨': '9', '⑩': '10',
+            '⑪': '11', '⑫': '12', '⑬': '13', '⑭': '14', '⑮': '15',
+            '⑯': '16', '⑰': '17', '⑱': '18', '⑲': '19', '⑳': '20'
+        }
+
+        # 시간 정보 추출을 위한 정규식
+        self.temporal_patterns = {
+            # '[시행 2025. 4. 22.]' 형식과 '시행일: 2025. 4. 22.' 형식 모두 처리
+            "effective_date": re.compile(r"\[?\s*시행(?:일)?\s*:?\s*(\d{4}\.\s*\d{1,2}\.\s*\d{1,2})\.?\s*\]?"),
+
+            # '[법률 제...호, 2025. 4. 22., ...]' 형식에서 공포일 추출
+            "publication_date": re.compile(r"법률\s*제[0-9]+호\s*,\s*(\d{4}\.\s*\d{1,2}\.\s*\d{1,2})\.?"),
+
+            # 법률 번호, 날짜, 개정 종류를 포함하여 추출
+            "amendment_info": re.compile(r"(법률\s*제[0-9]+호,\s*\d{4}\.\s*\d{1,2}\.\s*\d{1,2}\.?,\s*.*?개정)"),
+        }
+
+    def parse_structure(self, text: str) -> Optional[LegalStructure]:
+        """텍스트에서 법률 구조 정보를 추출"""
+        text = text.strip()
+        if not text:
+            return None
+
+        for structure_type, pattern in self.patterns.items():
+            match = pattern.match(text)
+            if match:
+                return self._create_structure(structure_type, match, text)
+
+        return None
+
+    def _create_structure(self, structure_type: str, match, original_text: str) -> LegalStructure:
+        """매치 결과로부터 LegalStructure 객체 생성"""
+        level_map = {
+            'chapter': 1, 'section': 2, 'article': 3,
+            'paragraph': 4, 'item': 5, 'subitem': 6,
+            'appendix': 1, 'attachment': 2
+        }
+
+        if structure_type == 'paragraph':
+            number = self.paragraph_map.get(match.group(1), match.group(1))
+            title = match.group(2).strip() if match.group(2) else ""
+        elif structure_type in ['chapter', 'section', 'article']:
+            number = match.group(1)
+            if structure_type == 'article' and match.lastindex >= 3:
+                subtitle = match.group(2) if match.group(2) else ""
+                content = match.group(3) if match.group(3) else ""
+                title = f"{subtitle} {content}".strip() if subtitle else content.strip()
+            else:
+                title = match.group(2).strip() if match.lastindex >= 2 else ""
+        elif structure_type in ['item', 'subitem']:
+            number = match.group(1)
+            title = match.group(2).strip() if match.group(2) else ""
+        else:
+            number = "1"
+            title = match.group(1).strip() if match.group(1) else ""
+
+        cross_refs = self._extract_cross_references(original_text)
+
+        return LegalStructure(
+            structure_type=structure_type,
+            number=number,
+            title=title,
+            level=level_map.get(structure_type, 7),
+            cross_refs=cross_refs
+        )
+
+    def _extract_cross_references(self, text: str) -> List[str]:
+        """텍스트에서 상호 참조 추출"""
+        refs = []
+        for ref_type, pattern in self.cross_ref_patterns.items():
+            matches = pattern.findall(text)
+            for match in matches:
+                if ref_type == 'law_ref':
+                    refs.append(f"법률:{match}")
+                elif ref_type == 'article_ref':
+                    refs.append(f"조:{match}")
+                elif ref_type == 'paragraph_ref':
+                    refs.append(f"항:{match}")
+                elif ref_type == 'item_ref':
+                    refs.append(f"호:{match}")
+        return list(set(refs))
+
+    def extract_temporal_info(self, text: str) -> Dict[str, Optional[str]]:
+        """텍스트에서 시간 관련 메타데이터 추출"""
+        info = {
+            "effective_date": None,
+            "publication_date": None,
+            "amendment_info": None,
+        }
+        for key, pattern in self.temporal_patterns.items():
+            match = pattern.search(text)
+            if match:
+                info[key] = match.group(1).strip()
+        return info
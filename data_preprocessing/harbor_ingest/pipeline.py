@@ -0,0 +1,279 @@
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from queue import Empty, Full, Queue
+from typing import Any, Dict, List, Optional
+
+from .config import SUPPORTED_EXTENSIONS, IngestConfig
+from .embedder import BatchEmbedder, load_embedding_function
+from .embedding_cache import EmbeddingCache
+from .hash_manager import FileHashManager, file_sha256
+from .processor import EnhancedDocumentProcessor
+from .vector_store import ChunkDelta, VectorStoreWriter
+
+logger = logging.getLogger(__name__)
+
+# 파싱 스레드 종료 표시
+_DONE = object()
+
+
+@dataclass
+class ParsedDocument:
+    """파싱 프로세스에서 임베딩/저장 단계로 넘기는 파일 하나의 결과"""
+    file_path: str
+    file_name: str
+    file_hash: str
+    last_modified: float
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    parent_chunk_map: Dict[str, str] = field(default_factory=dict)
+    parse_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def discover_files(data_dir: str) -> List[str]:
+    """data_dir 아래의 지원 형식 문서 목록 (Word 임시 파일 '~$...' 제외, 하위 폴더 포함)"""
+    return sorted(
+        str(path) for path in Path(data_dir).rglob("*")
+        if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS and not path.name.startswith("~")
+    )
+
+
+def parse_document(file_path: str) -> ParsedDocument:
+    """문서 하나를 청크로 분할 (ProcessPoolExecutor 워커에서 실행되므로 모듈 최상위 함수)"""
+    started = time.perf_counter()
+    file_hash = file_sha256(file_path)
+    document = ParsedDocument(
+        file_path=file_path,
+        file_name=os.path.basename(file_path),
+        file_hash=file_hash,
+        last_modified=os.path.getmtime(file_path),
+    )
+    try:
+        processor = EnhancedDocumentProcessor(file_path, file_hash=file_hash)
+        document.chunks, document.parent_chunk_map = processor.extract_structured_chunks()
+    except Exception as e:
+        logger.error(f"{document.file_name} 파싱 실패: {e}", exc_info=True)
+        document.error = str(e)
+    document.parse_seconds = time.perf_counter() - started
+    return document
+
+
+def _init_worker(log_level: int):
+    # spawn으로 시작한 프로세스는 부모의 로깅 설정을 물려받지 않음
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+
+
+class IngestPipeline:
+    """
+    문서 → 벡터 DB 수집 파이프라인.
+    파싱(프로세스 풀, 생산자) → 제한된 큐 → 임베딩/저장(메인 스레드, 소비자) 순으로 흘러가며,
+    파싱이 끝난 파일부터 바로 임베딩하므로 전체 파싱을 기다리지 않고 파일 수와 무관하게 메모리 사용량이 일정함.
+    파일은 벡터 DB 저장까지 끝난 뒤에만 FileHashManager에 기록되어 중단 후 다시 실행하면 남은 파일만 처리.
+    바뀐 파일도 청크 내용 해시로 컬렉션과 비교해 추가/변경된 청크만 임베딩하고 삭제된 청크만 지우며,
+    임베딩은 (모델, 청크 해시) 캐시를 먼저 확인
+    """
+
+    def __init__(self, config: IngestConfig, embedding_function=None):
+        self.config = config
+        self.hash_manager = FileHashManager(config.metadata_db_path)
+        self._embedding_function = embedding_function
+        self._stop = threading.Event()
+        self.stats = {
+            "files_found": 0, "files_skipped": 0, "files_processed": 0, "files_failed": 0, "files_empty": 0,
+            "chunks": 0, "chunks_added": 0, "chunks_updated": 0, "chunks_removed": 0, "chunks_unchanged": 0,
+            "embedded": 0, "embedding_cache_hits": 0,
+            "parse_seconds": 0.0, "embed_seconds": 0.0, "upsert_seconds": 0.0, "elapsed_seconds": 0.0,
+        }
+
+    def run(self, files: Optional[List[str]] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        files = discover_files(self.config.data_dir) if files is None else files
+        self.stats["files_found"] = len(files)
+
+        pending = [f for f in files if self.config.force or self.hash_manager.should_process_file(f)]
+        self.stats["files_skipped"] = len(files) - len(pending)
+        if not pending:
+            logger.info(f"처리할 파일이 없습니다. (발견 {len(files)}개, 변경 없음 {self.stats['files_skipped']}개)")
+            self.stats["elapsed_seconds"] = time.perf_counter() - started
+            return self.stats
+        logger.info(f"{len(pending)}개 파일 처리 시작 (변경 없음 {self.stats['files_skipped']}개 건너뜀)")
+
+        if self._embedding_function is None:
+            self._embedding_function = load_embedding_function(
+                self.config.embedding_model,
+                backend=self.config.embedding_backend,
+                device=self.config.embedding_device,
+                onnx_file=self.config.embedding_onnx_file or None,
+            )
+        embedder = BatchEmbedder(self._embedding_function, self.config.embed_batch_size)
+        writer = VectorStoreWriter(self.config, self._embedding_function)
+        cache = None
+        if self.config.embedding_cache:
+            cache = EmbeddingCache(self.config.embedding_cache_path or self.config.metadata_db_path,
+                                   self.config.embedding_cache_key)
+
+        queue: Queue = Queue(maxsize=max(1, self.config.queue_size))
+        producer = threading.Thread(target=self._produce, args=(pending, queue), name="ingest-parse", daemon=True)
+        producer.start()
+        try:
+            self._consume(queue, embedder, writer, cache, total=len(pending))
+        finally:
+            self._stop.set()
+            # 파싱 스레드가 가득 찬 큐에서 대기 중일 수 있으므로 비워서 종료시킴
+            while producer.is_alive():
+                try:
+                    queue.get(timeout=0.1)
+                except Empty:
+                    pass
+            producer.join()
+
+        self.stats["elapsed_seconds"] = time.perf_counter() - started
+        self.stats["embed_batches"] = embedder.batches
+        self.stats["collection_count"] = writer.count()
+        return self.stats
+
+    def _produce(self, files: List[str], queue: Queue):
+        """파일을 파싱해 완료된 순서대로 큐에 넣음. 큐가 가득 차면 대기하므로 파싱이 임베딩보다 너무 앞서가지 않음"""
+        try:
+            if self.config.workers <= 1:
+                for file_path in files:
+                    if self._stop.is_set() or not self._put(queue, parse_document(file_path)):
+                        return
+                return
+
+            # fork 대신 spawn: 임베딩 모델(PyTorch 스레드)이 로드된 프로세스를 복제하지 않음
+            with ProcessPoolExecutor(max_workers=self.config.workers, mp_context=mp.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(logging.getLogger().level,)) as executor:
+                remaining = iter(files)
+                # 진행 중인 작업 수를 제한해 파싱 결과가 메모리에 쌓이지 않도록 함
+                in_flight = {executor.submit(parse_document, f) for f in _take(remaining, self.config.workers * 2)}
+                while in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if self._stop.is_set() or not self._put(queue, future.result()):
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            return
+                        in_flight |= {executor.submit(parse_document, f) for f in _take(remaining, 1)}
+        except Exception as e:
+            logger.error(f"파싱 단계 오류: {e}", exc_info=True)
+        finally:
+            self._put(queue, _DONE)
+
+    def _put(self, queue: Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.5)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _consume(self, queue: Queue, embedder: BatchEmbedder, writer: VectorStoreWriter,
+                 cache: Optional[EmbeddingCache], total: int):
+        """파싱된 파일을 모아 임베딩 배치를 채운 뒤, 바뀐 청크만 임베딩하고 파일 단위로 저장"""
+        done = 0
+        finished = False
+        while not finished:
+            item = queue.get()
+            if item is _DONE:
+                break
+            group = [item]
+            # 작은 파일 여러 개를 한 임베딩 배치로 묶음 (이미 도착한 것만, 기다리지 않음)
+            while sum(len(d.chunks) for d in group) < embedder.batch_size:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                group.append(item)
+
+            planned = []
+            for document in group:
+                if not self._accept(document):
+                    continue
+                try:
+                    planned.append((document, writer.plan_file_chunks(document.file_name, document.chunks)))
+                except Exception as e:
+                    logger.error(f"{document.file_name} 기존 청크 조회 실패: {e}", exc_info=True)
+                    self.stats["files_failed"] += 1
+
+            try:
+                embeddings = self._embed_chunks([chunk for _, delta in planned for chunk in delta.added], embedder, cache)
+            except Exception as e:
+                logger.error(f"임베딩 실패 ({', '.join(d.file_name for d, _ in planned)}): {e}", exc_info=True)
+                self.stats["files_failed"] += len(planned)
+                planned = []
+
+            for document, delta in planned:
+                self._write(document, delta, embeddings, writer)
+            done += len(group)
+            logger.info(f"[{done}/{total}] 처리 완료 (누적 청크 {self.stats['chunks']}개, 임베딩 {self.stats['embedded']}개)")
+
+    def _embed_chunks(self, chunks: List[Dict[str, Any]], embedder: BatchEmbedder,
+                      cache: Optional[EmbeddingCache]) -> Dict[str, Any]:
+        """청크 해시 → 임베딩. 캐시에 없는 내용만 인코더로 계산 (같은 내용의 청크는 한 번만)"""
+        texts = {chunk['chunk_hash']: chunk['content'] for chunk in chunks}
+        if not texts:
+            return {}
+        embeddings = cache.get_many(texts) if cache else {}
+        self.stats["embedding_cache_hits"] += len(embeddings)
+        missing = [h for h in texts if h not in embeddings]
+        if missing:
+            embed_started = time.perf_counter()
+            vectors = embedder.embed([texts[h] for h in missing])
+            self.stats["embed_seconds"] += time.perf_counter() - embed_started
+            self.stats["embedded"] += len(missing)
+            if cache:
+                cache.put_many(missing, vectors)
+            embeddings.update(zip(missing, vectors))
+        return embeddings
+
+    def _accept(self, document: ParsedDocument) -> bool:
+        self.stats["parse_seconds"] += document.parse_seconds
+        if document.error:
+            self.stats["files_failed"] += 1
+            return False
+        if not document.chunks:
+            logger.warning(f"{document.file_name}: 추출된 청크가 없습니다.")
+            self.stats["files_empty"] += 1
+            return False
+        return True
+
+    def _write(self, document: ParsedDocument, delta: ChunkDelta, embeddings: Dict[str, Any], writer: VectorStoreWriter):
+        upsert_started = time.perf_counter()
+        try:
+            writer.apply_delta(delta, embeddings)
+            # 저장이 끝난 뒤에만 기록 (중간에 실패하면 다음 실행에서 다시 처리)
+            self.hash_manager.mark_processed(
+                document.file_path, document.file_hash, document.last_modified, document.chunks,
+                document.parent_chunk_map, document.parse_seconds,
+            )
+        except Exception as e:
+            logger.error(f"{document.file_name} 저장 실패: {e}", exc_info=True)
+            self.stats["files_failed"] += 1
+            return
+        finally:
+            self.stats["upsert_seconds"] += time.perf_counter() - upsert_started
+        self.stats["files_processed"] += 1
+        self.stats["chunks"] += len(document.chunks)
+        self.stats["chunks_added"] += len(delta.added)
+        self.stats["chunks_updated"] += len(delta.updated)
+        self.stats["chunks_removed"] += len(delta.removed_ids)
+        self.stats["chunks_unchanged"] += delta.unchanged
+        logger.info(f"{document.file_name}: 청크 {len(document.chunks)}개 반영 (파싱 {document.parse_seconds:.2f}초)")
+
+
+def _take(iterator, n: int) -> List:
+    items = []
+    for item in iterator:
+        items.append(item)
+        if len(items) >= n:
+            break
+    return items
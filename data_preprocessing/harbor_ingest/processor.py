@@ -0,0 +1,523 @@
+import gc
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import MAX_CHUNK_LENGTH, MIN_CHUNK_LENGTH, OVERLAP_SIZE
+from .hash_manager import file_sha256
+from .parser import EnhancedLegalParser, LegalStructure
+from .splitter import LegalSentenceSplitter
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """청크 내용 해시 (청크 ID와 임베딩 캐시 키로 사용)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EnhancedDocumentProcessor:
+    """
+    개선된 문서 처리기.
+    파싱 프로세스에서 실행되므로 DB 연결 없이 파일 해시만 받아 청크에 기록
+    (python-docx / PyMuPDF / python-pptx는 해당 형식을 처리할 때만 import)
+    """
+
+    def __init__(self, file_path: str, file_hash: Optional[str] = None):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"지정된 파일을 찾을 수 없습니다: {file_path}")
+
+        self.file_path = file_path
+        self.file_name = os.path.basename(file_path)
+        self.parser = EnhancedLegalParser()
+        self.sentence_splitter = LegalSentenceSplitter()
+        self.file_hash = file_hash or file_sha256(file_path)
+        self.structure_hierarchy = []
+        self.temporal_metadata = {}
+
+        # 파일 안에서 이미 사용한 청크 ID (같은 내용의 청크가 여러 번 나오는 경우 구분)
+        self.used_chunk_ids = set()
+        self.parent_chunk_map = {}
+
+    # 테이블을 Markdown으로 변환하는 헬퍼 함수
+    def _convert_docx_table_to_markdown(self, table) -> str:
+        """Docx 테이블을 Markdown 형식으로 변환"""
+        markdown_text = "\n\n| "
+        try:
+            header_cells = [cell.text.strip().replace('\n', ' ') for cell in table.rows[0].cells]
+            markdown_text += " | ".join(header_cells) + " |\n"
+            markdown_text += "| " + " | ".join(["---"] * len(header_cells)) + " |\n"
+
+            for row in table.rows[1:]:
+                row_cells = [cell.text.strip().replace('\n', ' ') for cell in row.cells]
+                markdown_text += "| " + " | ".join(row_cells) + " |\n"
+        except IndexError:
+            logger.warning(f"'{self.file_name}'에서 비정상적인 테이블 구조 발견, 건너뜁니다.")
+            return ""
+        return markdown_text.strip() + "\n\n"
+
+    def _convert_pptx_table_to_markdown(self, table) -> str:
+        """PPTX 테이블을 Markdown 형식으로 변환 (수정된 버전)"""
+        markdown_text = "\n\n| "
+        try:
+            # 테이블의 컬럼 수를 기준으로 순회하도록 수정
+            num_cols = len(table.columns)
+            header_cells = [table.cell(0, c).text.strip().replace('\n', ' ') for c in range(num_cols)]
+            markdown_text += " | ".join(header_cells) + " |\n"
+            markdown_text += "| " + " | ".join(["---"] * len(header_cells)) + " |\n"
+
+            # row와 col 인덱스를 사용하여 셀 텍스트에 접근
+            for r in range(1, len(table.rows)):
+                row_cells = [table.cell(r, c).text.strip().replace('\n', ' ') for c in range(num_cols)]
+                markdown_text += "| " + " | ".join(row_cells) + " |\n"
+        except Exception as e:
+            logger.warning(f"'{self.file_name}'의 PPTX 테이블 변환 중 오류: {e}")
+            return ""
+        return markdown_text.strip() + "\n\n"
+
+    def _extract_initial_metadata_from_text(self, text: str):
+        """일반 텍스트에서 시간 메타데이터 추출"""
+        # 텍스트의 앞부분 30줄을 검사
+        initial_lines = text.split('\n')[:30]
+        temp_info = {k: None for k in self.parser.temporal_patterns.keys()}
+
+        for line in initial_lines:
+            if all(temp_info.values()): break
+            extracted = self.parser.extract_temporal_info(line)
+            for key, value in extracted.items():
+                if not temp_info.get(key) and value:
+                    temp_info[key] = value
+        self.temporal_metadata = temp_info
+    def _get_text_blocks(self) -> List[str]:
+        """파일 형식에 따라 텍스트 블록 리스트를 추출"""
+        file_ext = Path(self.file_path).suffix.lower()
+        if file_ext == '.docx':
+            return self._get_docx_blocks()
+        if file_ext == '.pdf':
+            return self._get_pdf_blocks()
+        if file_ext == '.pptx':
+            return self._get_pptx_blocks()
+        logger.warning(f"지원하지 않는 파일 형식입니다: {self.file_name}")
+        return []
+
+    def _get_docx_blocks(self) -> List[str]:
+        import docx
+        from docx.oxml.table import CT_Tbl
+        from docx.oxml.text.paragraph import CT_P
+        from docx.table import Table as DocxTable
+        from docx.text.paragraph import Paragraph
+
+        blocks = []
+        document = docx.Document(self.file_path)
+        # DOCX는 자체 단락 구조에서 메타데이터를 찾는 것이 더 정확
+        initial_paragraphs = [p.text for p in document.paragraphs[:15]]
+        self._extract_initial_metadata_from_text("\n".join(initial_paragraphs))
+        for element in document.element.body:
+            if isinstance(element, CT_P):
+                blocks.append(Paragraph(element, document).text.strip())
+            elif isinstance(element, CT_Tbl):
+                blocks.append(self._convert_docx_table_to_markdown(DocxTable(element, document)))
+        return blocks
+
+    def _get_pdf_blocks(self) -> List[str]:
+        import fitz
+
+        full_text = ""
+        with fitz.open(self.file_path) as doc:
+            for page in doc:
+                full_text += page.get_text(sort=True) + "\n"
+        self._extract_initial_metadata_from_text(full_text)
+        return full_text.split('\n')
+
+    def _get_pptx_blocks(self) -> List[str]:
+        from pptx import Presentation
+
+        blocks = []
+        prs = Presentation(self.file_path)
+        full_text_for_metadata = ""
+        for slide in prs.slides:
+            for shape in slide.shapes:
+                if shape.has_table:
+                    table_text = self._convert_pptx_table_to_markdown(shape.table)
+                    blocks.append(table_text)
+                    full_text_for_metadata += table_text + "\n"
+                elif shape.has_text_frame:
+                    text = shape.text_frame.text.strip()
+                    blocks.append(text)
+                    full_text_for_metadata += text + "\n"
+        self._extract_initial_metadata_from_text(full_text_for_metadata)
+        return blocks
+
+    def extract_structured_chunks(self) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """모든 파일 형식에 대해 구조화된 텍스트 청크를 추출하는 범용 메서드"""
+        try:
+            text_blocks = self._get_text_blocks()
+            if not text_blocks:
+                logger.warning(f"'{self.file_name}'에서 텍스트를 추출하지 못했습니다.")
+                return [], {}
+        except Exception as e:
+            logger.error(f"'{self.file_name}' 파일 읽기 또는 파싱 실패: {e}", exc_info=True)
+            return [], {}
+
+        chunks = []
+        current_chunk = None
+        file_hash = self.file_hash
+
+        for text in text_blocks:
+            text = text.strip()
+            if not text:
+                continue
+
+            structure = self.parser.parse_structure(text)
+            if structure:
+                if current_chunk and current_chunk['content']:
+                    chunks.append(self._finalize_chunk(current_chunk, file_hash))
+
+                self._update_hierarchy(structure)
+                current_chunk = {
+                    'structure': structure, 'content': [text],
+                    'hierarchy_path': self._get_hierarchy_path(),
+                    'parent_structures': self._get_parent_structures()
+                }
+            else:
+                if not current_chunk: # 문서 시작 부분
+                    current_chunk = {
+                        'structure': LegalStructure('preamble', '0', '서문', 0),
+                        'content': [text], 'hierarchy_path': [], 'parent_structures': []
+                    }
+                else:
+                    current_chunk['content'].append(text)
+
+        if current_chunk and current_chunk['content']:
+            chunks.append(self._finalize_chunk(current_chunk, file_hash))
+
+        processed_chunks = self._post_process_chunks_advanced(chunks)
+        logger.info(f"'{self.file_name}'에서 {len(processed_chunks)}개의 청크를 추출했습니다.")
+        gc.collect()
+        return processed_chunks, self.parent_chunk_map
+
+    def _generate_chunk_id(self, chunk_hash: str) -> str:
+        """
+        내용 해시 기반 청크 ID 생성. 같은 내용이면 다시 파싱해도 같은 ID가 되어
+        문서 일부만 바뀐 경우 바뀐 청크만 다시 임베딩/저장할 수 있음
+        """
+        base_id = f"{self.file_name}_{chunk_hash[:16]}"
+        chunk_id = base_id
+        duplicate = 1
+        while chunk_id in self.used_chunk_ids:
+            duplicate += 1
+            chunk_id = f"{base_id}_{duplicate}"
+        self.used_chunk_ids.add(chunk_id)
+        return chunk_id
+
+    def _update_hierarchy(self, structure: LegalStructure):
+        """계층 구조 업데이트"""
+        self.structure_hierarchy = [
+            s for s in self.structure_hierarchy if s.level < structure.level
+        ]
+
+        if self.structure_hierarchy:
+            structure.parent_ref = f"{self.structure_hierarchy[-1].structure_type}:{self.structure_hierarchy[-1].number}"
+
+        self.structure_hierarchy.append(structure)
+
+    def _get_hierarchy_path(self) -> List[str]:
+        """현재 계층 경로 반환"""
+        return [f"{s.structure_type}:{s.number}" for s in self.structure_hierarchy]
+
+    def _get_parent_structures(self) -> List[Dict[str, str]]:
+        """상위 구조 정보 반환"""
+        return [
+            {
+                'type': s.structure_type,
+                'number': s.number,
+                'title': s.title,
+                'level': s.level
+            }
+            for s in self.structure_hierarchy[:-1]
+        ]
+
+    def _finalize_chunk(self, chunk: Dict[str, Any], file_hash: str) -> Dict[str, Any]:
+        """청크를 최종 형태로 변환"""
+        content = "\n".join(chunk['content'])
+        structure = chunk['structure']
+
+        # 청크의 제목을 생성
+        chunk_title = f"{structure.structure_type}:{structure.number} {structure.title}".strip()
+
+        # 청크 내용 맨 앞에 제목을 붙여 문맥 정보를 강화합니다.
+        final_content = f"[{chunk_title}]\n{content}"
+        chunk_hash = content_hash(final_content)
+        structure.original_chunk_id = self._generate_chunk_id(chunk_hash)
+
+        final_chunk = {
+            'chunk_id': structure.original_chunk_id,
+            'chunk_hash': chunk_hash,
+            'title': chunk_title,
+            'content': final_content,
+            'structure_info': {
+                'type': structure.structure_type,
+                'number': structure.number,
+                'level': structure.level,
+                'parent_ref': structure.parent_ref,
+                'cross_refs': structure.cross_refs,
+                'original_chunk_id': structure.original_chunk_id
+            },
+            'hierarchy_path': chunk['hierarchy_path'],
+            'parent_structures': chunk['parent_structures'],
+            'char_count': len(content),
+            'word_count': len(content.split()),
+            'file_hash': file_hash
+        }
+
+        # 추출된 시간 메타데이터를 청크에 추가
+        final_chunk.update(self.temporal_metadata)
+
+        return final_chunk
+
+    def _post_process_chunks_advanced(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """향상된 청크 후처리"""
+        processed = []
+
+        for chunk in chunks:
+            if chunk['char_count'] < MIN_CHUNK_LENGTH:
+                # if chunk['structure_info']['type'] in ['article', 'chapter', 'section']:
+                #     processed.append(chunk)
+                continue
+
+            if chunk['char_count'] > MAX_CHUNK_LENGTH:
+                # 청킹 시 문맥 유지를 위해 오버랩 개념을 명시적으로 고려할 수 있음
+                # 현재는 문장 단위 분할이 우선되지만, 향후 슬라이딩 윈도우 적용 시 이 부분 수정
+                split_chunks = self._split_chunk_advanced(chunk, MAX_CHUNK_LENGTH)
+                processed.extend(split_chunks)
+            else:
+                processed.append(chunk)
+
+        return processed
+
+    def _split_chunk_advanced(self, chunk: Dict[str, Any], max_length: int) -> List[Dict[str, Any]]:
+        """향상된 청크 분할"""
+        structure_info = chunk['structure_info']
+
+        # 법률 구조별 분할 전략
+        if structure_info['type'] == 'article':
+            return self._split_by_paragraphs_advanced(chunk, max_length)
+        elif structure_info['type'] == 'paragraph':
+            return self._split_by_items_advanced(chunk, max_length)
+        else:
+            return self._split_by_sentences_advanced(chunk, max_length)
+
+    def _split_by_sentences_advanced(self, chunk: Dict[str, Any], max_length: int) -> List[Dict[str, Any]]:
+        """향상된 문장 단위 분할"""
+        content = chunk['content']
+        sentences = self.sentence_splitter.split_sentences(content)
+
+        if len(sentences) <= 1:
+            # 단일 문장이 너무 긴 경우 - 의미 단위로 분할
+            return self._split_single_long_sentence(chunk, max_length)
+
+        split_chunks = []
+        current_content = []
+        current_length = 0
+
+        # 문장 윈도우 전략과 유사한 접근
+        # N개의 문장을 하나의 청크로 구성하고, 길이가 초과되면 분할
+        for i, sentence in enumerate(sentences):
+            sentence_length = len(sentence)
+
+            if current_length + sentence_length > max_length and current_content:
+                # 현재 청크 저장
+                sub_chunk_text = ' '.join(current_content)
+                sub_chunk = self._create_sub_chunk(chunk, sub_chunk_text, len(split_chunks) + 1)
+                split_chunks.append(sub_chunk)
+
+                # 슬라이딩 윈도우(오버랩) 구현
+                # 이전 청크의 마지막 문장을 현재 청크의 시작 부분에 포함
+                overlap_sentences = [s for s in current_content[-2:] if len(' '.join(current_content[-2:])) < OVERLAP_SIZE]
+                current_content = overlap_sentences + [sentence]
+                current_length = len(' '.join(current_content))
+            else:
+                current_content.append(sentence)
+                current_length += sentence_length
+
+        if current_content:
+            sub_chunk = self._create_sub_chunk(chunk, ' '.join(current_content), len(split_chunks) + 1)
+            split_chunks.append(sub_chunk)
+
+        return split_chunks if split_chunks else [chunk]
+
+    def _split_single_long_sentence(self, chunk: Dict[str, Any], max_length: int) -> List[Dict[str, Any]]:
+        """단일 긴 문장을 의미 단위로 분할"""
+        content = chunk['content']
+
+        # 의미 기반 청킹을 위한 분할점 (정규식 기반)
+        split_points = [
+            r'(?<=다만)\s*,?\s*',    # 단서 조항
+            r'(?<=그러나)\s*,?\s*',  # 예외 조항
+            r'(?<=다음과\s같다)\s*:?\s*',  # 열거 시작
+            r'(다음\\s각\\s호(?:의 어느 하나에 해당하는 경우)?\\s*:?\\s*)',  # 각호 시작
+            r'(?<=이\s경우)\s*,?\s*',     # 조건 시작
+            r'(?<=[.\)\]])\s+(?=한편|또한|그리고)', # 접속 부사
+            r';\s+', # 세미콜론은 문맥상 중요한 분리점일 수 있음
+        ]
+
+        # 의미 단위로 분할 시도
+        parts = [content]
+        for pattern in split_points:
+            new_parts = []
+            for part in parts:
+                if len(part) > max_length:
+                    # re.split은 구분자도 결과에 포함시키기 위해 괄호로 묶음
+                    split_result = re.split(f'({pattern})', part)
+                    # 분리된 텍스트와 구분자를 다시 합쳐서 의미 유지
+                    temp_part = ""
+                    for j in range(0, len(split_result), 2):
+                        segment = split_result[j]
+                        delimiter = split_result[j+1] if j+1 < len(split_result) else ""
+                        if len(temp_part) + len(segment) + len(delimiter) > max_length and temp_part:
+                             new_parts.append(temp_part)
+                             temp_part = segment + delimiter
+                        else:
+                             temp_part += segment + delimiter
+                    if temp_part:
+                        new_parts.append(temp_part)
+                else:
+                    new_parts.append(part)
+            parts = new_parts
+
+        # 여전히 긴 부분이 있으면 단어 단위로 분할
+        final_parts = []
+        for part in parts:
+            if len(part) > max_length:
+                words = part.split()
+                current_part = []
+                current_length = 0
+
+                for word in words:
+                    word_length = len(word) + 1  # 공백 포함
+                    if current_length + word_length > max_length and current_part:
+                        final_parts.append(' '.join(current_part))
+                        current_part = [word]
+                        current_length = word_length
+                    else:
+                        current_part.append(word)
+                        current_length += word_length
+
+                if current_part:
+                    final_parts.append(' '.join(current_part))
+            else:
+                final_parts.append(part)
+
+        # 청크 생성
+        split_chunks = []
+        for i, part in enumerate(final_parts):
+            if part.strip():
+                sub_chunk = self._create_sub_chunk(chunk, part.strip(), i + 1)
+                split_chunks.append(sub_chunk)
+
+        return split_chunks if split_chunks else [chunk]
+
+    def _split_by_paragraphs_advanced(self, chunk: Dict[str, Any], max_length: int) -> List[Dict[str, Any]]:
+        """향상된 항 단위 분할"""
+        content = chunk['content']
+        paragraph_pattern = re.compile(r'(①|②|③|④|⑤|⑥|⑦|⑧|⑨|⑩|⑪|⑫|⑬|⑭|⑮|⑯|⑰|⑱|⑲|⑳)')
+
+        paragraphs = paragraph_pattern.split(content)
+        if len(paragraphs) <= 1:
+            return self._split_by_sentences_advanced(chunk, max_length)
+
+        split_chunks = []
+        current_content = paragraphs[0] if paragraphs[0].strip() else ""
+
+        i = 1
+        while i < len(paragraphs):
+            if i + 1 < len(paragraphs):
+                paragraph_marker = paragraphs[i]
+                paragraph_content = paragraphs[i + 1]
+                paragraph_text = paragraph_marker + paragraph_content
+
+                if len(current_content) + len(paragraph_text) > max_length and current_content.strip():
+                    sub_chunk = self._create_sub_chunk(chunk, current_content, len(split_chunks) + 1)
+                    split_chunks.append(sub_chunk)
+                    current_content = paragraph_text
+                else:
+                    current_content += paragraph_text
+
+                i += 2
+            else:
+                current_content += paragraphs[i]
+                i += 1
+
+        if current_content.strip():
+            sub_chunk = self._create_sub_chunk(chunk, current_content, len(split_chunks) + 1)
+            split_chunks.append(sub_chunk)
+
+        return split_chunks if split_chunks else [chunk]
+
+    def _split_by_items_advanced(self, chunk: Dict[str, Any], max_length: int) -> List[Dict[str, Any]]:
+        """향상된 호 단위 분할"""
+        content = chunk['content']
+        item_pattern = re.compile(r'(\d+\.)')
+
+        items = item_pattern.split(content)
+        if len(items) <= 1:
+            return self._split_by_sentences_advanced(chunk, max_length)
+
+        split_chunks = []
+        current_content = items[0] if items[0].strip() else ""
+
+        i = 1
+        while i < len(items):
+            if i + 1 < len(items):
+                item_marker = items[i]
+                item_content = items[i + 1]
+                item_text = item_marker + item_content
+
+                if len(current_content) + len(item_text) > max_length and current_content.strip():
+                    sub_chunk = self._create_sub_chunk(chunk, current_content, len(split_chunks) + 1)
+                    split_chunks.append(sub_chunk)
+                    current_content = item_text
+                else:
+                    current_content += item_text
+
+                i += 2
+            else:
+                current_content += items[i]
+                i += 1
+
+        if current_content.strip():
+            sub_chunk = self._create_sub_chunk(chunk, current_content, len(split_chunks) + 1)
+            split_chunks.append(sub_chunk)
+
+        return split_chunks if split_chunks else [chunk]
+
+    def _create_sub_chunk(self, original_chunk: Dict[str, Any], content: str, sub_index: int) -> Dict[str, Any]:
+        """향상된 하위 청크 생성"""
+        contextual_title = original_chunk.get('title', '관련 조항')
+        final_content = f"[{contextual_title} (부분)]\n{content}"
+
+        # 하위 청크도 자신의 내용으로 ID를 만들어, 긴 조항의 일부만 바뀌면 그 부분만 다시 처리
+        chunk_hash = content_hash(final_content)
+        sub_chunk_id = self._generate_chunk_id(chunk_hash)
+        parent_chunk_id = original_chunk['chunk_id']
+
+        # 부모-자식 관계 추적
+        self.parent_chunk_map[sub_chunk_id] = parent_chunk_id
+
+        new_chunk = original_chunk.copy()
+
+        new_chunk.update({
+            'chunk_id': sub_chunk_id,
+            'chunk_hash': chunk_hash,
+            'title': f"{original_chunk['title']} (부분 {sub_index})",
+            'content': final_content,
+            'char_count': len(content),
+            'word_count': len(content.split()),
+            'is_sub_chunk': True,
+            'sub_index': sub_index,
+            'parent_chunk_id': parent_chunk_id
+        })
+        return new_chunk
@@ -0,0 +1,106 @@
+import re
+from typing import List
+
+
+class LegalSentenceSplitter:
+    """법률 문서 특화 문장 분할기"""
+
+    def __init__(self):
+        # 법률 문서에서 마침표가 문장 끝이 아닌 경우들
+        self.abbreviation_patterns = [
+            r'\b(?:제|항|호|목|조|장|절|편|부|별표|별지)\s*\d+(?:\s*의\s*\d+)?\s*\.',
+            r'\b\d+\.\s*(?=\d)',  # 번호 매김
+            r'\b[A-Z]\.',  # 단일 대문자 약어
+            r'(?:등|기타|포함|예시|단서|다만|그러나|다른|이외|기준|대상)\.',
+            r'(?:법|시행령|시행규칙|고시|훈령|예규)\.',
+        ]
+
+        # 실제 문장 끝을 나타내는 패턴
+        self.sentence_end_patterns = [
+            r'(?<=[다음과같습니다])\.',
+            r'(?<=[이다])\.',
+            r'(?<=[한다])\.',
+            r'(?<=[된다])\.',
+            r'(?<=[않는다])\.',
+            r'(?<=[있다])\.',
+            r'(?<=[없다])\.',
+        ]
+
+        self.compiled_abbrev = [re.compile(p) for p in self.abbreviation_patterns]
+        self.compiled_sent_end = [re.compile(p) for p in self.sentence_end_patterns]
+
+    def split_sentences(self, text: str) -> List[str]:
+        """법률 문서에 특화된 문장 분할"""
+        if not text.strip():
+            return []
+
+        # 임시 플레이스홀더로 약어의 마침표를 보호
+        protected_text = text
+        placeholders = {}
+
+        for i, pattern in enumerate(self.compiled_abbrev):
+            matches = list(pattern.finditer(protected_text))
+            for match in reversed(matches):  # 역순으로 처리하여 인덱스 보존
+                placeholder = f"__ABBREV_{i}_{len(placeholders)}__"
+                placeholders[placeholder] = match.group()
+                protected_text = protected_text[:match.start()] + placeholder + protected_text[match.end():]
+
+        # 문장 분할
+        sentences = []
+        current_sentence = ""
+
+        # 개선된 문장 분할 로직
+        parts = re.split(r'([.!?])\s+', protected_text)
+
+        i = 0
+        while i < len(parts):
+            current_sentence += parts[i]
+
+            if i + 1 < len(parts) and parts[i + 1] in '.!?':
+                current_sentence += parts[i + 1]
+
+                # 실제 문장 끝인지 확인
+                if self._is_sentence_end(current_sentence):
+                    sentences.append(current_sentence.strip())
+                    current_sentence = ""
+                else:
+                    current_sentence += " "  # 계속 이어짐
+
+                i += 2
+            else:
+                i += 1
+
+        if current_sentence.strip():
+            sentences.append(current_sentence.strip())
+
+        # 플레이스홀더 복원
+        restored_sentences = []
+        for sentence in sentences:
+            restored = sentence
+            for placeholder, original in placeholders.items():
+                restored = restored.replace(placeholder, original)
+
+            if restored.strip():
+                restored_sentences.append(restored.strip())
+
+        return restored_sentences
+
+    def _is_sentence_end(self, text: str) -> bool:
+        """실제 문장 끝인지 판단"""
+        # 문장 끝 패턴 매칭
+        for pattern in self.compiled_sent_end:
+            if pattern.search(text):
+                return True
+
+        # 추가 휴리스틱
+        text = text.strip()
+        if len(text) < 10:  # 너무 짧으면 문장이 아님
+            return False
+
+        # 법률 조문의 특징적 끝맺음
+        legal_endings = ['한다', '이다', '된다', '않는다', '있다', '없다', '같다', '바와 같다']
+        for ending in legal_endings:
+            if text.endswith(ending + '.'):
+                return True
+
+        return False
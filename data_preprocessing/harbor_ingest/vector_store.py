@@ -0,0 +1,186 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional
+
+from .config import IngestConfig
+
+logger = logging.getLogger(__name__)
+
+# 메타데이터 비교에서 제외하는 필드 (매 실행마다 바뀜)
+_TIMESTAMP_FIELDS = ("created_at", "last_updated")
+# 청크를 쓸 때마다 올리는 컬렉션 메타데이터 값. 청크 교체/메타데이터 갱신은 청크 수가 그대로여서
+# API 서버가 이 값으로 변경을 감지함 (harbor_agent.ChromaDBManager.index_fingerprint)
+INDEX_REVISION_KEY = "index_revision"
+
+
+def _date_to_timestamp(value: Optional[str]) -> int:
+    """'2025. 4. 22.' 형식 날짜를 타임스탬프로 (변환 실패 시 0)"""
+    if not value:
+        return 0
+    try:
+        return int(datetime.strptime(value.replace(' ', '').strip('.'), '%Y.%m.%d').timestamp())
+    except (ValueError, TypeError):
+        return 0
+
+
+def build_chunk_metadata(file_name: str, chunk: Dict[str, Any], chunk_index: int) -> Dict[str, Any]:
+    """청크 → Chroma 메타데이터 (노트북 _prepare_enhanced_batch_data와 같은 필드)"""
+    structure_info = chunk.get('structure_info', {})
+    now = datetime.now().isoformat()
+    return {
+        "source_file": file_name,
+        "file_hash": chunk.get('file_hash', ''),
+        "chunk_id": chunk['chunk_id'],
+        "chunk_hash": chunk.get('chunk_hash', ''),
+        "article_title": chunk.get('title', 'Unknown')[:200],
+        "level": max(0, min(10, structure_info.get('level', 4))),
+        "char_count": max(0, chunk.get('char_count', 0)),
+        "word_count": max(0, chunk.get('word_count', 0)),
+        "chunk_index": chunk_index,
+
+        # 법률 구조 정보
+        "structure_type": structure_info.get('type', 'unknown'),
+        "structure_number": structure_info.get('number', ''),
+        "parent_ref": structure_info.get('parent_ref') or '',
+        "cross_refs": json.dumps(structure_info.get('cross_refs', []), ensure_ascii=False),
+        "hierarchy_path": json.dumps(chunk.get('hierarchy_path', []), ensure_ascii=False),
+        "original_chunk_id": structure_info.get('original_chunk_id') or '',
+
+        # 하위 청크 정보
+        "is_sub_chunk": chunk.get('is_sub_chunk', False),
+        "sub_index": chunk.get('sub_index', 0),
+        "parent_chunk_id": chunk.get('parent_chunk_id') or '',
+
+        # 시간 메타데이터
+        "effective_date": _date_to_timestamp(chunk.get('effective_date')),
+        "publication_date": _date_to_timestamp(chunk.get('publication_date')),
+        "amendment_info": chunk.get('amendment_info') or '',
+
+        # 타임스탬프
+        "created_at": now,
+        "last_updated": now,
+    }
+
+
+def _same_metadata(existing: Mapping[str, Any], new: Mapping[str, Any]) -> bool:
+    return all(existing.get(k) == v for k, v in new.items() if k not in _TIMESTAMP_FIELDS)
+
+
+@dataclass
+class ChunkDelta:
+    """파일 하나의 새 청크 목록과 컬렉션에 저장된 청크의 차이"""
+    file_name: str
+    chunk_ids: List[str]
+    # 새로 임베딩해 저장할 청크 (내용이 바뀌었거나 추가된 청크)
+    added: List[Dict[str, Any]] = field(default_factory=list)
+    # 내용은 같고 위치/계층 등 메타데이터만 바뀐 청크 (임베딩 없이 메타데이터만 갱신)
+    updated: List[Dict[str, Any]] = field(default_factory=list)
+    removed_ids: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    metadatas: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+class VectorStoreWriter:
+    """
+    Chroma 컬렉션 쓰기 (노트북 EnhancedVectorDBManager.upsert_chunks_incremental).
+    임베딩은 파이프라인에서 미리 계산해 넘기지만, 컬렉션 설정에 임베딩 함수가 기록되어야
+    서버가 같은 함수로 컬렉션을 열 수 있으므로 생성 시 함께 전달
+    """
+
+    def __init__(self, config: IngestConfig, embedding_function):
+        import chromadb
+
+        self.config = config
+        self.upsert_batch_size = max(1, config.upsert_batch_size)
+        self.client = chromadb.PersistentClient(path=config.db_path)
+        self.collection = self.client.get_or_create_collection(
+            name=config.collection_name,
+            embedding_function=embedding_function,
+            metadata=config.collection_metadata,
+        )
+        self._record_embedding_model()
+        logger.info(f"컬렉션 '{config.collection_name}' 준비 완료 ({self.collection.count()}개 청크, 모델 {config.indexed_model_name})")
+
+    def _record_embedding_model(self):
+        """기존 컬렉션의 메타데이터에 임베딩 모델 기록 (다른 모델로 만든 컬렉션이면 중단)"""
+        model = self.config.indexed_model_name
+        metadata = dict(self.collection.metadata or {})
+        recorded = metadata.get("embedding_model")
+        if recorded and recorded != model:
+            raise RuntimeError(f"컬렉션이 '{recorded}' 모델로 생성되었습니다. 현재 모델: {model}")
+        if not recorded:
+            # 거리 함수(hnsw:*)는 생성 후 변경할 수 없으므로 제외하고 갱신
+            metadata = {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}
+            self.collection.modify(metadata={**metadata, "embedding_model": model})
+            logger.info(f"컬렉션 메타데이터에 임베딩 모델을 기록했습니다: {model}")
+
+    def plan_file_chunks(self, file_name: str, chunks: List[Dict[str, Any]]) -> ChunkDelta:
+        """
+        컬렉션에 저장된 파일 청크와 비교해 추가/갱신/삭제할 청크를 계산.
+        청크 ID가 내용 해시 기반이므로 ID가 같으면 내용도 같아 다시 임베딩할 필요가 없음
+        """
+        existing = self.collection.get(where={"source_file": {"$eq": file_name}}, include=["metadatas"])
+        existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+
+        delta = ChunkDelta(file_name=file_name, chunk_ids=[chunk['chunk_id'] for chunk in chunks])
+        for index, chunk in enumerate(chunks):
+            chunk_id = chunk['chunk_id']
+            metadata = build_chunk_metadata(file_name, chunk, index)
+            stored = existing_metadata.get(chunk_id)
+            if stored is None:
+                delta.added.append(chunk)
+            elif stored.get("chunk_hash") != metadata["chunk_hash"]:
+                # 해시 필드가 없는 이전 형식 청크
+                delta.added.append(chunk)
+            elif _same_metadata(stored, metadata):
+                delta.unchanged += 1
+                continue
+            else:
+                metadata["created_at"] = stored.get("created_at", metadata["created_at"])
+                delta.updated.append(chunk)
+            delta.metadatas[chunk_id] = metadata
+
+        new_ids = set(delta.chunk_ids)
+        delta.removed_ids = [chunk_id for chunk_id in existing['ids'] if chunk_id not in new_ids]
+        return delta
+
+    def apply_delta(self, delta: ChunkDelta, embeddings: Mapping[str, Any]):
+        """
+        계산한 차이만 반영: 삭제된 청크 제거, 추가된 청크는 embeddings(chunk_hash → 벡터)로 upsert_batch_size개씩 저장,
+        메타데이터만 바뀐 청크는 update (실패 시 예외). 무언가 썼으면 컬렉션의 색인 리비전을 올림
+        """
+        if delta.removed_ids:
+            for start in range(0, len(delta.removed_ids), self.upsert_batch_size):
+                self.collection.delete(ids=delta.removed_ids[start:start + self.upsert_batch_size])
+
+        for start in range(0, len(delta.added), self.upsert_batch_size):
+            batch = delta.added[start:start + self.upsert_batch_size]
+            self.collection.upsert(
+                ids=[chunk['chunk_id'] for chunk in batch],
+                documents=[chunk['content'] for chunk in batch],
+                metadatas=[delta.metadatas[chunk['chunk_id']] for chunk in batch],
+                embeddings=[embeddings[chunk['chunk_hash']] for chunk in batch],
+            )
+
+        for start in range(0, len(delta.updated), self.upsert_batch_size):
+            batch = delta.updated[start:start + self.upsert_batch_size]
+            self.collection.update(
+                ids=[chunk['chunk_id'] for chunk in batch],
+                metadatas=[delta.metadatas[chunk['chunk_id']] for chunk in batch],
+            )
+
+        if delta.added or delta.updated or delta.removed_ids:
+            self._bump_revision()
+            logger.info(f"{delta.file_name}: 추가 {len(delta.added)}개, 메타데이터 갱신 {len(delta.updated)}개, "
+                        f"삭제 {len(delta.removed_ids)}개, 변경 없음 {delta.unchanged}개")
+
+    def _bump_revision(self):
+        # 거리 함수(hnsw:*)는 생성 후 변경할 수 없으므로 제외하고 갱신
+        metadata = {k: v for k, v in (self.collection.metadata or {}).items() if not k.startswith("hnsw:")}
+        metadata[INDEX_REVISION_KEY] = int(metadata.get(INDEX_REVISION_KEY) or 0) + 1
+        self.collection.modify(metadata=metadata)
+
+    def count(self) -> int:
+        return self.collection.count()
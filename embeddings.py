@@ -0,0 +1,73 @@
+import logging
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("sentence-transformers", "onnx", "default")
+# 전처리 노트북(Config.PRIMARY_MODEL)과 같은 모델
+DEFAULT_EMBEDDING_MODEL = "jhgan/ko-sroberta-multitask"
+# Chroma 기본 임베딩 함수(ONNX)가 사용하는 모델
+CHROMA_DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+class EmbeddingModelMismatchError(RuntimeError):
+    """서버 임베딩 모델이 컬렉션을 만들 때 사용한 모델과 다른 경우"""
+
+
+def load_embedding_function(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = "sentence-transformers",
+                            device: str = "cpu", onnx_file: Optional[str] = None):
+    """
+    검색 질의용 임베딩 함수 로드.
+    sentence-transformers: 노트북과 같은 방식(PyTorch), onnx: 같은 모델을 ONNX Runtime으로 CPU 추론
+    (onnx_file로 양자화 모델 지정 가능), default: Chroma 기본 임베딩 함수
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"지원하지 않는 임베딩 백엔드: {backend}")
+    # chromadb는 import가 무거우므로 서버 모듈 로드가 아니라 모델을 로드할 때 불러옴
+    from chromadb.utils import embedding_functions
+    if backend == "default":
+        return embedding_functions.DefaultEmbeddingFunction()
+
+    kwargs = {}
+    if backend == "onnx":
+        kwargs["backend"] = "onnx"
+        if onnx_file:
+            kwargs["model_kwargs"] = {"file_name": onnx_file}
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name, device=device, **kwargs)
+
+
+def embedding_model_name(model_name: str, backend: str) -> str:
+    """백엔드를 고려한 실제 임베딩 모델 이름 (컬렉션 메타데이터와 비교용)"""
+    return CHROMA_DEFAULT_MODEL if backend == "default" else model_name
+
+
+def warm_up_embedding_function(embedding_function, batch_size: int = 8) -> float:
+    """더미 배치를 한 번 임베딩해 모델 로드/초기화 비용을 첫 요청 전에 치르고 소요 시간(초)을 반환"""
+    started = time.perf_counter()
+    embedding_function(["항만 안전 규정 워밍업 문장"] * batch_size)
+    return time.perf_counter() - started
+
+
+def indexed_embedding_model(collection: Any) -> Optional[str]:
+    """컬렉션을 만들 때 사용한 임베딩 모델 이름 (메타데이터 → Chroma 임베딩 함수 설정 순으로 확인)"""
+    model = (collection.metadata or {}).get("embedding_model")
+    if model:
+        return model
+    config = (getattr(collection, "configuration_json", None) or {}).get("embedding_function") or {}
+    return (config.get("config") or {}).get("model_name")
+
+
+def check_embedding_model(collection: Any, expected_model: Optional[str]):
+    """컬렉션의 임베딩 모델이 서버 설정과 다르면 EmbeddingModelMismatchError"""
+    if not expected_model:
+        return
+    indexed = indexed_embedding_model(collection)
+    if indexed is None:
+        logger.warning(f"컬렉션 '{collection.name}'에 임베딩 모델 정보가 없어 일치 여부를 확인할 수 없습니다. (서버: {expected_model})")
+        return
+    if indexed != expected_model:
+        raise EmbeddingModelMismatchError(
+            f"컬렉션 '{collection.name}'은 '{indexed}' 모델로 생성되었지만 서버는 '{expected_model}' 모델을 사용합니다. "
+            "EMBEDDING_MODEL 설정을 확인하세요."
+        )
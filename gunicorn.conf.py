@@ -0,0 +1,43 @@
+# gunicorn 다중 워커 실행 설정 (run.py에서 WORKERS > 1이면 사용)
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# - 마스터가 앱을 미리 import하고(preload_app) 임베딩/재정렬 모델을 한 번 로드한 뒤 fork하므로
+#   모델 가중치는 워커들이 copy-on-write로 공유 (워커 수만큼 메모리를 쓰지 않음)
+# - Chroma 클라이언트는 fork 이후 각 워커의 lifespan에서 열고 읽기 전용으로만 사용
+# - 공유되는 것은 모델뿐: BM25/조문/청크 관계 색인은 각 워커가 자신의 Chroma 클라이언트로 읽어 따로 만들므로
+#   이 메모리와 생성 시간은 워커 수만큼 늘어남 (Chroma 클라이언트는 fork 전에 열 수 없어 마스터에서 미리 만들지 않음)
+# - 요청 한도/답변 캐시/세션은 SHARED_STATE_DB_PATH의 SQLite 파일로 워커 간 공유
+import gc
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv("WORKERS", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# BACKGROUND_INIT=false로 워커 시작 시 Chroma 열기/BM25 색인 생성/모델 워밍업을 기다리는 경우를 고려
+timeout = int(os.getenv("WORKER_TIMEOUT_SECONDS", 120))
+graceful_timeout = 30
+keepalive = 5
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# 워커들이 같은 API 키 한도와 캐시를 나눠 쓰도록 공유 상태 파일 기본값 지정 (app import 전에 설정)
+os.environ.setdefault("SHARED_STATE_DB_PATH", "./harbor_state.db")
+
+
+def when_ready(server):
+    """워커를 fork하기 전에 마스터에서 모델을 로드"""
+    import main
+
+    models = main.preload_shared_models()
+    server.log.info(f"공유 모델 사전 로드 완료: {models['embedding_model']}")
+    # 사전 로드한 객체를 GC 추적 대상에서 빼 fork 이후 GC 스캔으로 공유 페이지가 복사되는 것을 줄임
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info(f"워커 시작 (pid {worker.pid})")
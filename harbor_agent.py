@@ -1,14 +1,33 @@
-import chromadb
+import asyncio
+import contextvars
+import functools
+import hashlib
 import json
 import sqlite3
-from typing import Dict, List, Optional, Tuple, Any
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from datetime import datetime
 import logging
-import google.generativeai as genai
 import os
-import re
+import random
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from answer_cache import AnswerCache
+from bm25 import BM25Index, is_simple_where, reciprocal_rank_fusion
+from compact_index import VECTOR_BACKENDS, CompactClient
+from context_budget import ContextBudget, ContextBudgeter
+from context_expansion import ChunkGraph, ContextExpander
+from conversation_store import ConversationStore
+from embeddings import check_embedding_model, load_embedding_function
+from metrics import ITERATIONS, TOOL_CALLS, record_span, span
+from query_router import QueryRouter
+from response_parser import ContentStreamParser, build_response_schema, parse_json_object
+from scheduler import GeminiScheduler, PRIORITY_INTERACTIVE, SchedulerDeadlineExceeded
+from structured_index import LawVersion, StructuredIndex, format_date, normalize_structure_number, parse_date
+from utils import StageTimings, estimate_tokens
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
@@ -19,25 +38,218 @@ class SearchResult:
     """검색 결과를 담는 데이터 클래스"""
     content: str
     metadata: Dict
-    distance: float
+    distance: Optional[float]  # 벡터 검색 거리 (BM25로만 찾은 결과는 None)
+    id: Optional[str] = None
 
 class GeminiClient:
-    """무료 Gemini API 클라이언트"""
-    def __init__(self, api_key: str):
+    """무료 Gemini API 클라이언트 (비동기)"""
+    TOKEN_ACCOUNTING_MODES = ("usage", "estimate", "off")
+    # TPM 버킷에서 발송 시 미리 차감하는 예상 출력 토큰 수 (응답 후 실제 사용량으로 보정)
+    EXPECTED_COMPLETION_TOKENS = 512
+    MODEL_NAME = "gemini-2.5-flash-lite"
+    GENERATION_PARAMS = {"temperature": 0.1, "max_output_tokens": 2048, "top_p": 0.9, "top_k": 40}
+    # 형식 재작성 요청에 넣을 깨진 응답의 최대 길이
+    MAX_REFORMAT_CHARS = 6000
+    REFORMAT_INSTRUCTION = "아래는 형식이 깨진 응답입니다. 내용은 바꾸지 말고 지시된 JSON 형식의 객체 하나로만 다시 작성하세요."
+
+    def __init__(self, api_key: str, max_concurrency: int = 8, token_accounting: str = "usage",
+                 verbose: bool = False, prompt_log_sample_rate: float = 1.0,
+                 scheduler: Optional[GeminiScheduler] = None, queue_timeout: float = 30.0,
+                 json_mode: bool = True, parse_retries: int = 1):
+        # google.generativeai는 import에 1초 가까이 걸리므로 모듈 로드 시점이 아니라 클라이언트를 만들 때 불러옴
+        import google.generativeai as genai
+        self._genai = genai
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        self.generation_config = genai.types.GenerationConfig(
-            temperature=0.1, max_output_tokens=2048, top_p=0.9, top_k=40
-        )
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.generation_config = genai.types.GenerationConfig(**self.GENERATION_PARAMS)
+        # JSON 모드: response_mime_type + 도구 정의로 만든 응답 스키마로 출력 형식을 강제 (도구 조합별 설정 캐시)
+        self.json_mode = json_mode
+        self._json_configs: Dict[Tuple[str, ...], Any] = {}
+        # 로컬 복구로도 파싱하지 못한 응답을 짧은 형식 재작성 요청으로 다시 받을 횟수 (스트리밍 제외)
+        self.parse_retries = parse_retries
+        # RPM/TPM 한도와 동시 호출 수에 맞춰 호출을 배분하는 스케줄러 (대기열 최대 대기 시간: queue_timeout)
+        self.scheduler = scheduler or GeminiScheduler(max_concurrency=max_concurrency)
+        self.queue_timeout = queue_timeout
+        # usage: 응답의 usage_metadata 사용(없으면 로컬 추정), estimate: 로컬 추정만 사용, off: 집계 안 함
+        if token_accounting not in self.TOKEN_ACCOUNTING_MODES:
+            raise ValueError(f"지원하지 않는 토큰 집계 방식: {token_accounting}")
+        self.token_accounting = token_accounting
+        # 프롬프트/응답 전문 로그는 verbose일 때 표본 비율만큼만 출력
+        self.verbose = verbose
+        self.prompt_log_sample_rate = prompt_log_sample_rate
+        self.stats = {"calls": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                      "parse_ok": 0, "parse_repaired": 0, "parse_failed": 0, "parse_retries": 0}
 
-    def generate_response(self, messages: List[Dict], tools: List[Dict] = None) -> Dict:
+    async def generate_response(self, messages: List[Dict], tools: List[Dict] = None,
+                                priority: int = PRIORITY_INTERACTIVE) -> Dict:
         """단일 JSON 객체 응답을 파싱하는 최종 간소화 버전"""
         try:
-            formatted_prompt = self._format_messages_for_gemini(messages)
-            if tools:
-                tool_descriptions = self._format_tools_for_prompt(tools)
-                formatted_prompt += f"\n\n# 사용 가능한 도구 목록:\n{tool_descriptions}\n\n"
-                formatted_prompt += """
+            with span("prompt_build"):
+                formatted_prompt = self._build_prompt(messages, tools)
+            log_exchange = self.verbose and random.random() < self.prompt_log_sample_rate
+            if log_exchange:
+                logger.info(f"[Gemini 요청 프롬프트]\n{formatted_prompt}")
+
+            response_text, usage = await self._generate_text(formatted_prompt, tools, priority)
+            if log_exchange:
+                logger.info(f"[Gemini 응답]\n{response_text}")
+
+            with span("response_parse"):
+                parsed = self._parse_response_text(response_text, tools)
+            attempt = 0
+            while parsed is None and attempt < self.parse_retries:
+                # 전체 대화를 다시 보내지 않고 깨진 응답만 보내 형식을 고쳐 받음
+                attempt += 1
+                self.stats["parse_retries"] += 1
+                logger.warning(f"Gemini 응답 JSON 파싱 실패 - 형식 재작성 요청 ({attempt}/{self.parse_retries})")
+                reformat_prompt = self._build_prompt(
+                    [{"role": "user", "content": f"{self.REFORMAT_INSTRUCTION}\n\n{response_text[:self.MAX_REFORMAT_CHARS]}"}], tools)
+                retry_text, retry_usage = await self._generate_text(reformat_prompt, tools, priority)
+                usage = {k: usage[k] + retry_usage[k] for k in usage}
+                with span("response_parse"):
+                    parsed = self._parse_response_text(retry_text, tools)
+            if parsed is None:
+                # 끝내 파싱하지 못하면 원문을 답변으로 사용 (추가 에이전트 반복을 유발하지 않음)
+                parsed = {"type": "text", "content": response_text}
+            parsed["usage"] = usage
+            return parsed
+        except Exception as e:
+            return self._error_response(e)
+
+    async def _generate_text(self, formatted_prompt: str, tools: Optional[List[Dict]],
+                             priority: int) -> Tuple[str, Dict[str, int]]:
+        """스케줄러를 거쳐 한 번 생성하고 (응답 텍스트, 토큰 사용량)을 반환"""
+        estimated = self._estimate_request_tokens(formatted_prompt)
+        generation_config = self._generation_config(tools)
+        # 같은 프롬프트가 동시에 들어오면 업스트림 호출 하나를 공유
+        with span("llm_generate"):
+            response, shared = await self.scheduler.run(
+                lambda: self.model.generate_content_async(formatted_prompt, generation_config=generation_config),
+                key=hashlib.sha256(formatted_prompt.encode("utf-8")).hexdigest(),
+                priority=priority, estimated_tokens=estimated, timeout=self.queue_timeout,
+            )
+        response_text = response.text.strip()
+        if shared:
+            return response_text, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        usage = self._account_tokens(formatted_prompt, response_text, getattr(response, "usage_metadata", None))
+        self.scheduler.reconcile_tokens(estimated, usage["total_tokens"] or estimated)
+        return response_text, usage
+
+    def _generation_config(self, tools: Optional[List[Dict]]):
+        if not self.json_mode:
+            return self.generation_config
+        key = tuple(tool["function"]["name"] for tool in tools or [])
+        config = self._json_configs.get(key)
+        if config is None:
+            config = self._genai.types.GenerationConfig(**self.GENERATION_PARAMS, response_mime_type="application/json",
+                                                        response_schema=build_response_schema(tools))
+            self._json_configs[key] = config
+        return config
+
+    async def stream_response(self, messages: List[Dict], tools: List[Dict] = None,
+                              priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Dict]:
+        """
+        스트리밍 생성. 응답 JSON의 content 필드가 도착하는 대로 {"type": "delta"} 조각을 내보내고,
+        마지막에 generate_response와 같은 형식의 최종 파싱 결과를 내보냄
+        """
+        try:
+            with span("prompt_build"):
+                formatted_prompt = self._build_prompt(messages, tools)
+            log_exchange = self.verbose and random.random() < self.prompt_log_sample_rate
+            if log_exchange:
+                logger.info(f"[Gemini 요청 프롬프트]\n{formatted_prompt}")
+
+            parser = ContentStreamParser()
+            chunks, usage_metadata = [], None
+            estimated = self._estimate_request_tokens(formatted_prompt)
+            deadline = time.monotonic() + self.queue_timeout if self.queue_timeout else None
+            attempt = 0
+            started = time.perf_counter()
+            # 스트림은 공유하지 않고 슬롯을 응답이 끝날 때까지 점유. 429는 첫 조각을 받기 전에만 재시도
+            while True:
+                async with self.scheduler.slot(priority, estimated, deadline):
+                    try:
+                        response = await self.model.generate_content_async(
+                            formatted_prompt, generation_config=self._generation_config(tools), stream=True
+                        )
+                    except Exception as e:
+                        if self.scheduler.should_retry(e, attempt):
+                            attempt += 1
+                            continue
+                        raise
+                    async for chunk in response:
+                        text = chunk.text
+                        usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                        chunks.append(text)
+                        delta = parser.feed(text)
+                        if delta:
+                            yield {"type": "delta", "content": delta}
+                break
+            record_span("llm_stream", time.perf_counter() - started)
+
+            response_text = "".join(chunks).strip()
+            if log_exchange:
+                logger.info(f"[Gemini 응답]\n{response_text}")
+            with span("response_parse"):
+                # 이미 내보낸 조각이 있으므로 재작성 요청 없이, 파싱하지 못하면 원문을 답변으로 사용
+                parsed = self._parse_response_text(response_text, tools) or {"type": "text", "content": response_text}
+            parsed["usage"] = self._account_tokens(formatted_prompt, response_text, usage_metadata)
+            self.scheduler.reconcile_tokens(estimated, parsed["usage"]["total_tokens"] or estimated)
+            yield parsed
+        except Exception as e:
+            yield self._error_response(e)
+
+    def _error_response(self, error: Exception) -> Dict:
+        self.stats["errors"] += 1
+        if isinstance(error, SchedulerDeadlineExceeded):
+            logger.warning("Gemini 호출 대기열 대기 시간 초과")
+            return {"type": "error", "content": "요청이 많아 응답 생성이 지연되고 있습니다. 잠시 후 다시 시도해주세요."}
+        logger.error(f"Gemini API 오류: {error}")
+        # 429 Rate Limit 오류 처리
+        if "429" in str(error):
+            self.stats["rate_limited"] += 1
+            return {"type": "error", "content": "API 요청 한도를 초과했습니다. 1분 후에 다시 시도해주세요."}
+        return {"type": "error", "content": "죄송합니다. 현재 응답을 생성할 수 없습니다."}
+
+    def _account_tokens(self, prompt: str, response_text: str, usage_metadata: Any) -> Dict[str, int]:
+        """호출 한 번의 토큰 사용량 계산 (추가 count_tokens 호출 없음)"""
+        self.stats["calls"] += 1
+        if self.token_accounting == "off":
+            return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        prompt_tokens = completion_tokens = None
+        if self.token_accounting == "usage" and usage_metadata is not None:
+            prompt_tokens = getattr(usage_metadata, "prompt_token_count", None)
+            completion_tokens = getattr(usage_metadata, "candidates_token_count", None)
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(response_text)
+
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _estimate_request_tokens(self, prompt: str) -> int:
+        return estimate_tokens(prompt) + self.EXPECTED_COMPLETION_TOKENS
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "token_accounting": self.token_accounting, "scheduler": self.scheduler.stats()}
+
+    def check_reachable(self) -> str:
+        """모델 정보 조회로 API 키/네트워크를 확인 (생성 호출이 아니므로 RPM/TPM 한도를 쓰지 않음, 블로킹)"""
+        return self._genai.get_model(f"models/{self.MODEL_NAME}").name
+
+    def close(self):
+        self.scheduler.close()
+
+    def _build_prompt(self, messages: List[Dict], tools: List[Dict] = None) -> str:
+        formatted_prompt = self._format_messages_for_gemini(messages)
+        if tools:
+            tool_descriptions = self._format_tools_for_prompt(tools)
+            formatted_prompt += f"\n\n# 사용 가능한 도구 목록:\n{tool_descriptions}\n\n"
+            formatted_prompt += """
 # 지시사항:
 - 만약 사용자의 질문에 답변하기 위해 도구를 사용해야 한다면, 반드시 다음 JSON 형식에 맞춰 단 하나의 JSON 객체만 생성해야 합니다. 다른 텍스트는 일절 포함하지 마세요.
 {
@@ -56,39 +268,40 @@ class GeminiClient:
   "content": "사용자에게 보여줄 최종 답변 내용."
 }
 """
-            token_count = self.model.count_tokens(formatted_prompt)
-            print("--- [API 요청 전 확인] ---")
-            print(f"▶ 전송될 프롬프트 내용: \n{formatted_prompt}")
-            print(f"▶ 총 토큰 수: {token_count.total_tokens} 개")
-            print("--------------------------")
-
-            response = self.model.generate_content(
-                formatted_prompt, generation_config=self.generation_config
-            )
-            response_text = response.text.strip()
-
-            try:
-                match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if not match:
-                    return {"type": "text", "content": response_text}
+        return formatted_prompt
 
-                json_str = match.group(0)
-                parsed_response = json.loads(json_str, strict=False)
+    def _parse_response_text(self, response_text: str, tools: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """응답 JSON을 도구 호출 목록 또는 답변으로 변환. 형식이 깨졌거나 쓸 수 있는 내용이 없으면 None"""
+        parsed_response, repaired = parse_json_object(response_text)
+        calls = self._normalize_tool_calls(parsed_response.get("tool_calls"), tools) if parsed_response else []
+        content = parsed_response.get("content") if parsed_response else None
+        if not calls and not (isinstance(content, str) and content.strip()):
+            self.stats["parse_failed"] += 1
+            return None
+        self.stats["parse_repaired" if repaired else "parse_ok"] += 1
+        if calls:
+            return {"type": "tool_call_list", "calls": calls}
+        return {"type": "text", "content": content}
 
-                if "tool_calls" in parsed_response and parsed_response["tool_calls"]:
-                    return {"type": "tool_call_list", "calls": parsed_response["tool_calls"]}
-                elif "content" in parsed_response:
-                    return {"type": "text", "content": parsed_response["content"]}
-                else:
-                    return {"type": "text", "content": response_text}
-            except json.JSONDecodeError:
-                return {"type": "text", "content": response_text}
-        except Exception as e:
-            logger.error(f"Gemini API 오류: {e}")
-            # 429 Rate Limit 오류 처리
-            if "429" in str(e):
-                return {"type": "error", "content": "API 요청 한도를 초과했습니다. 1분 후에 다시 시도해주세요."}
-            return {"type": "error", "content": "죄송합니다. 현재 응답을 생성할 수 없습니다."}
+    @staticmethod
+    def _normalize_tool_calls(calls: Any, tools: Optional[List[Dict]]) -> List[Dict]:
+        """알 수 없는 도구 호출을 버리고, 인자는 해당 도구에 정의된 매개변수 중 값이 있는 것만 남김"""
+        if not isinstance(calls, list):
+            return []
+        allowed = {tool["function"]["name"]: set(tool["function"].get("parameters", {}).get("properties", {}))
+                   for tool in tools or []}
+        normalized = []
+        for call in calls:
+            if not isinstance(call, dict) or not call.get("function_name"):
+                continue
+            name = call["function_name"]
+            arguments = call.get("arguments") if isinstance(call.get("arguments"), dict) else {}
+            if allowed:
+                if name not in allowed:
+                    continue
+                arguments = {k: v for k, v in arguments.items() if k in allowed[name] and v not in (None, "")}
+            normalized.append({"function_name": name, "arguments": arguments})
+        return normalized
 
     def _format_messages_for_gemini(self, messages: List[Dict]) -> str:
         formatted = ""
@@ -110,80 +323,596 @@ class GeminiClient:
             tool_descriptions.append(f"• {name}: {description}\n" + "\n".join(param_desc))
         return "\n\n".join(tool_descriptions)
 
+# 검색 요청 단위: (컬렉션 이름, 질의, 결과 개수, where 필터)
+SearchRequest = Tuple[str, str, int, Optional[Dict]]
+
 class ChromaDBManager:
     """ChromaDB 관리 클래스"""
-    def __init__(self, db_path: str = "./chroma_db"):
-        self.client = chromadb.PersistentClient(path=db_path)
+    LEGAL_COLLECTION = "legal_docs"
+    MANUAL_COLLECTION = "legal_manuals"
+
+    def __init__(self, db_path: str = "./chroma_db", max_workers: int = 4,
+                 embedding_cache_size: int = 2048, result_cache_size: int = 1024,
+                 embedding_function: Any = None, embedding_model: Optional[str] = None,
+                 hybrid_search: bool = True, hybrid_candidates: int = 20, reranker: Any = None,
+                 structured_lookup: bool = True, context_expander: Optional[ContextExpander] = None,
+                 vector_backend: str = "chroma", compact_index_path: str = "./compact_index", compact_nprobe: int = 8):
+        # chroma: ChromaDB 직접 검색 / compact: compact_index.py로 내보낸 양자화·메모리 맵 인덱스 검색 (읽기 전용)
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"알 수 없는 벡터 백엔드: {vector_backend} ({', '.join(VECTOR_BACKENDS)} 중 선택)")
+        self.vector_backend = vector_backend
+        if vector_backend == "compact":
+            # BM25/조문/청크 관계 색인은 모든 청크 본문과 메타데이터를 힙에 올리므로 저메모리용 압축 인덱스와 함께 쓸 수 없음
+            heap_indexes = [name for name, enabled in (
+                ("HYBRID_SEARCH", hybrid_search), ("STRUCTURED_LOOKUP", structured_lookup),
+                ("CONTEXT_EXPANSION", context_expander is not None and context_expander.enabled)) if enabled]
+            if heap_indexes:
+                raise ValueError(f"압축 인덱스 백엔드(VECTOR_BACKEND=compact)는 전체 청크를 메모리에 올리는 기능을 지원하지 않습니다. "
+                                 f"다음 설정을 끄세요: {', '.join(heap_indexes)}")
+            self.client = CompactClient(compact_index_path, nprobe=compact_nprobe)
+        else:
+            import chromadb
+            self.client = chromadb.PersistentClient(path=db_path)
+        # 블로킹 ChromaDB 쿼리를 이벤트 루프 밖에서 실행하기 위한 제한된 스레드 풀
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chroma-search")
+        # 인덱스를 만든 모델과 같은 임베딩 함수 (lifespan에서 한 번 로드해 전달, 없으면 Chroma 기본값)
+        self.embedding_function = embedding_function or load_embedding_function(backend="default")
+        self.embedding_model = embedding_model
         self.legal_collection = None
         self.manual_collection = None
+        self.reload_collections()
+
+        # 질의 임베딩 / 검색 결과 LRU 캐시
+        self._cache_lock = threading.Lock()
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._result_cache: "OrderedDict[Tuple, List[SearchResult]]" = OrderedDict()
+        self.embedding_cache_size = embedding_cache_size
+        self.result_cache_size = result_cache_size
+        self.cache_stats = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0}
+
+        # 법률 검색: 벡터 + BM25 결과를 RRF로 통합하고, 선택적으로 크로스 인코더로 재정렬
+        self.hybrid_search = hybrid_search
+        self.hybrid_candidates = hybrid_candidates
+        self.reranker = reranker
+        self.lexical_index: Optional[BM25Index] = None
+        self.timings = StageTimings(span_prefix="retrieval_")
+        # 조문 번호/시행일 직접 조회 색인 ("항만법 제23조"를 벡터 검색 없이 찾음)
+        self.structured_lookup = structured_lookup
+        self.structured_index: Optional[StructuredIndex] = None
+        # 검색된 하위 청크를 부모 조문/이웃 청크로 넓혀 반환 (None이면 검색된 청크 그대로)
+        self.context_expander = context_expander
+        self.refresh_indexes()
+
+    def reload_collections(self):
+        """컬렉션을 (다시) 열고 임베딩 모델을 확인 (압축 인덱스는 다시 내보낸 파일로 교체한 뒤 이전 파일을 닫음)"""
+        previous = [self.legal_collection, self.manual_collection]
+        legal_collection = manual_collection = None
         try:
-            self.legal_collection = self.client.get_collection(name="legal_docs")
-            self.manual_collection = self.client.get_collection(name="legal_manuals")
-            logger.info("ChromaDB 컬렉션 연결 성공")
+            legal_collection = self.client.get_collection(name=self.LEGAL_COLLECTION, embedding_function=self.embedding_function)
+            manual_collection = self.client.get_collection(name=self.MANUAL_COLLECTION, embedding_function=self.embedding_function)
+            logger.info(f"ChromaDB 컬렉션 연결 성공 (백엔드: {self.vector_backend})")
         except Exception as e:
             logger.error(f"ChromaDB 연결 실패: {e}")
+        self.legal_collection, self.manual_collection = legal_collection, manual_collection
+        if self.vector_backend == "compact":
+            # 새 검색이 모두 새 컬렉션을 보게 된 뒤에 교체된 이전 메모리 맵을 닫음
+            self.client.close_replaced(previous)
+        # 다른 모델로 만든 인덱스를 검색하면 결과가 무의미하므로 시작 시점에 실패시킴
+        for collection in (self.legal_collection, self.manual_collection):
+            if collection is not None:
+                check_embedding_model(collection, self.embedding_model)
+
+    @property
+    def collections(self) -> Dict[str, Any]:
+        return {self.LEGAL_COLLECTION: self.legal_collection, self.MANUAL_COLLECTION: self.manual_collection}
+
+    def collection_counts(self) -> Dict[str, Optional[int]]:
+        """컬렉션별 청크 수 (열지 못했거나 조회에 실패한 컬렉션은 None)"""
+        counts = {}
+        for name, collection in self.collections.items():
+            try:
+                counts[name] = collection.count() if collection is not None else None
+            except Exception as e:
+                logger.warning(f"{name} 청크 수 조회 실패: {e}")
+                counts[name] = None
+        return counts
 
     def search_legal(self, query: str, n_results: int = 3, where_filter: Optional[Dict] = None) -> List[SearchResult]:
-        if not self.legal_collection: return []
+        return self.search_batch([(self.LEGAL_COLLECTION, query, n_results, where_filter)])[0]
+
+    def search_manual(self, query: str, n_results: int = 3, where_filter: Optional[Dict] = None) -> List[SearchResult]:
+        return self.search_batch([(self.MANUAL_COLLECTION, query, n_results, where_filter)])[0]
+
+    def refresh_lexical_index(self):
+        """법률 컬렉션 전체 청크로 BM25 색인을 (다시) 생성"""
+        if self.legal_collection is None:
+            self.lexical_index = None
+            return
         try:
-            results = self.legal_collection.query(query_texts=[query], n_results=n_results, where=where_filter)
-            return [SearchResult(content=d, metadata=m, distance=dist) for d, m, dist in zip(results['documents'][0], results['metadatas'][0], results['distances'][0])]
+            with self.timings.measure("bm25_build"):
+                self.lexical_index = BM25Index.from_collection(self.legal_collection)
+            logger.info(f"BM25 색인 생성 완료: {len(self.lexical_index)}개 청크")
         except Exception as e:
-            logger.error(f"법률 문서 검색 오류: {e}")
-            return []
+            logger.error(f"BM25 색인 생성 실패 - 벡터 검색만 사용합니다: {e}")
+            self.lexical_index = None
 
-    def search_manual(self, query: str, n_results: int = 3, where_filter: Optional[Dict] = None) -> List[SearchResult]:
-        if not self.manual_collection: return []
+    def refresh_structured_index(self):
+        """법률 컬렉션 메타데이터로 조문 직접 조회 색인을 (다시) 생성 (BM25 색인이 있으면 이미 읽은 청크를 재사용)"""
+        if self.legal_collection is None:
+            self.structured_index = None
+            return
         try:
-            results = self.manual_collection.query(query_texts=[query], n_results=n_results, where=where_filter)
-            return [SearchResult(content=d, metadata=m, distance=dist) for d, m, dist in zip(results['documents'][0], results['metadatas'][0], results['distances'][0])]
+            with self.timings.measure("structured_build"):
+                if self.lexical_index is not None:
+                    self.structured_index = StructuredIndex(self.lexical_index.ids, self.lexical_index.documents,
+                                                            self.lexical_index.metadatas)
+                else:
+                    self.structured_index = StructuredIndex.from_collection(self.legal_collection)
+            logger.info(f"조문 색인 생성 완료: {self.structured_index.stats()}")
         except Exception as e:
-            logger.error(f"매뉴얼 검색 오류: {e}")
-            return []
+            logger.error(f"조문 색인 생성 실패 - 조문 조회는 벡터 검색으로 대신합니다: {e}")
+            self.structured_index = None
+
+    def refresh_chunk_graphs(self):
+        """문맥 확장용 청크 관계를 컬렉션별로 (다시) 생성 (법률 컬렉션은 BM25 색인이 읽어 둔 메타데이터를 재사용)"""
+        graphs = {}
+        for name, collection in self.collections.items():
+            if collection is None:
+                continue
+            try:
+                with self.timings.measure("graph_build"):
+                    if name == self.LEGAL_COLLECTION and self.lexical_index is not None:
+                        graphs[name] = ChunkGraph(self.lexical_index.ids, self.lexical_index.metadatas)
+                    else:
+                        graphs[name] = ChunkGraph.from_collection(collection)
+            except Exception as e:
+                logger.error(f"{name} 청크 관계 생성 실패 - 문맥 확장 없이 검색합니다: {e}")
+        self.context_expander.graphs = graphs
+        self.context_expander.clear_cache()
+        logger.info(f"문맥 확장({self.context_expander.mode}) 준비 완료: {', '.join(f'{n} {len(g)}개 청크' for n, g in graphs.items())}")
+
+    def refresh_indexes(self):
+        """컬렉션에서 만드는 BM25/조문/청크 관계 색인을 설정에 따라 모두 (다시) 생성"""
+        if self.hybrid_search:
+            self.refresh_lexical_index()
+        if self.structured_lookup:
+            self.refresh_structured_index()
+        if self.context_expander is not None and self.context_expander.enabled:
+            self.refresh_chunk_graphs()
+
+    def fetch_documents(self, collection_name: str, ids: List[str]) -> Dict[str, str]:
+        """청크 ID 목록의 본문을 한 번의 collection.get으로 조회"""
+        with self.timings.measure("fetch"):
+            found = self.collections[collection_name].get(ids=ids, include=["documents"])
+        return dict(zip(found["ids"], found["documents"]))
+
+    def lookup_legal(self, law: str = "", article: str = "", paragraph: str = "", chapter: str = "",
+                     as_of: Optional[int] = None, n_results: int = 8) -> Tuple[List[LawVersion], List[SearchResult]]:
+        """조문 색인으로 (조회한 개정본 목록, 조문 청크 목록)을 반환 (색인이 없으면 빈 목록)"""
+        if self.structured_index is None:
+            return [], []
+        with self.timings.measure("lookup"):
+            versions, found = self.structured_index.lookup(law, article, paragraph, chapter, as_of)
+            index = self.structured_index
+            results = [SearchResult(content=index.documents[i], metadata=index.metadatas[i], distance=None, id=index.ids[i])
+                       for i in found]
+        if self.context_expander is not None and self.context_expander.enabled:
+            # 확장 방식과 관계없이 분할된 조문의 하위 청크들만 하나로 합침 (조회 결과에 모두 있으므로 추가 조회 없음)
+            results = self._collapse(self.LEGAL_COLLECTION, results, mode="parent")
+            results = self._expand(self.LEGAL_COLLECTION, [results], mode="parent")[0]
+        return versions, results[:n_results]
+
+    def search_batch(self, requests: List[SearchRequest]) -> List[List[SearchResult]]:
+        """
+        여러 검색 요청을 컬렉션/필터별로 묶어 한 번의 임베딩 배치와 컬렉션당 한 번의 query로 처리
+        """
+        with self.timings.measure("search_total"):
+            return self._search_batch(requests)
+
+    def _search_batch(self, requests: List[SearchRequest]) -> List[List[SearchResult]]:
+        outputs: List[Optional[List[SearchResult]]] = [None] * len(requests)
+        groups: Dict[Tuple, List[int]] = {}
+        fresh: Dict[str, List[int]] = {}  # 컬렉션 -> 새로 검색한 요청 번호 (확장 후 캐시에 저장)
+        expanding = self.context_expander is not None and self.context_expander.enabled
+
+        for i, (collection_name, query, n_results, where_filter) in enumerate(requests):
+            if not self.collections.get(collection_name):
+                outputs[i] = []
+                continue
+            cached = self._get_cached_result(self._result_key(collection_name, query, n_results, where_filter))
+            if cached is not None:
+                outputs[i] = cached
+                continue
+            group_key = (collection_name, json.dumps(where_filter, sort_keys=True, ensure_ascii=False))
+            groups.setdefault(group_key, []).append(i)
+
+        if groups:
+            # 모든 그룹의 질의 임베딩을 한 번에 계산 (캐시된 질의는 제외)
+            with self.timings.measure("embed"):
+                self.embed(list(dict.fromkeys(requests[i][1] for indices in groups.values() for i in indices)))
+
+        for (collection_name, _), indices in groups.items():
+            queries = list(dict.fromkeys(requests[i][1] for i in indices))
+            n_results = max(requests[i][2] for i in indices)
+            where_filter = requests[indices[0]][3]
+            hybrid = self._use_hybrid(collection_name, where_filter)
+            try:
+                with self.timings.measure("vector"):
+                    results = self.collections[collection_name].query(
+                        query_embeddings=self.embed(queries),
+                        # 확장 시 같은 부모의 결과를 합치므로 후보를 더 가져옴
+                        n_results=max(n_results, self.hybrid_candidates) if hybrid else n_results * (2 if expanding else 1),
+                        where=where_filter,
+                    )
+                per_query = {
+                    q: [SearchResult(content=d, metadata=m, distance=dist, id=doc_id)
+                        for doc_id, d, m, dist in zip(ids, docs, metas, dists)]
+                    for q, ids, docs, metas, dists in zip(queries, results['ids'], results['documents'], results['metadatas'], results['distances'])
+                }
+                if hybrid:
+                    per_query = {q: self._hybrid_rank(q, vector_hits, where_filter) for q, vector_hits in per_query.items()}
+            except Exception as e:
+                logger.error(f"{collection_name} 검색 오류: {e}")
+                for i in indices:
+                    outputs[i] = []
+                continue
+
+            for i in indices:
+                outputs[i] = self._collapse(collection_name, per_query[requests[i][1]], limit=requests[i][2])
+                fresh.setdefault(collection_name, []).append(i)
+
+        for collection_name, indices in fresh.items():
+            if expanding:
+                try:
+                    expanded = self._expand(collection_name, [outputs[i] for i in indices])
+                    for i, results in zip(indices, expanded):
+                        outputs[i] = results
+                except Exception as e:
+                    logger.error(f"{collection_name} 문맥 확장 오류 - 검색된 청크만 사용합니다: {e}")
+            for i in indices:
+                _, query, n, where = requests[i]
+                self._put_cached_result(self._result_key(collection_name, query, n, where), outputs[i])
+
+        return outputs
+
+    def _collapse(self, collection_name: str, results: List[SearchResult], limit: Optional[int] = None,
+                  mode: Optional[str] = None) -> List[SearchResult]:
+        if self.context_expander is None:
+            return results[:limit]
+        return self.context_expander.collapse(collection_name, results, limit, mode)
+
+    def _expand(self, collection_name: str, result_lists: List[List[SearchResult]],
+                mode: Optional[str] = None) -> List[List[SearchResult]]:
+        """여러 검색 요청의 결과를 확장 (필요한 청크 본문은 컬렉션당 한 번의 일괄 조회)"""
+        with self.timings.measure("expand"):
+            return self.context_expander.expand(collection_name, result_lists,
+                                                functools.partial(self.fetch_documents, collection_name), mode)
+
+    def _use_hybrid(self, collection_name: str, where_filter: Optional[Dict]) -> bool:
+        # BM25 쪽은 단순 일치 필터만 지원하므로 연산자 필터는 벡터 검색만 사용
+        return (self.hybrid_search and self.lexical_index is not None
+                and collection_name == self.LEGAL_COLLECTION and is_simple_where(where_filter))
+
+    def _hybrid_rank(self, query: str, vector_hits: List[SearchResult], where_filter: Optional[Dict]) -> List[SearchResult]:
+        """벡터 후보와 BM25 후보를 RRF로 통합하고, 재정렬기가 있으면 상위 후보를 다시 정렬"""
+        with self.timings.measure("bm25"):
+            lexical = self.lexical_index.search(query, self.hybrid_candidates, where_filter)
+        with self.timings.measure("fusion"):
+            by_id = {hit.id: hit for hit in vector_hits}
+            for doc_index, _ in lexical:
+                doc_id = self.lexical_index.ids[doc_index]
+                if doc_id not in by_id:
+                    by_id[doc_id] = SearchResult(content=self.lexical_index.documents[doc_index],
+                                                 metadata=self.lexical_index.metadatas[doc_index],
+                                                 distance=None, id=doc_id)
+            fused = reciprocal_rank_fusion([
+                [hit.id for hit in vector_hits],
+                [self.lexical_index.ids[doc_index] for doc_index, _ in lexical],
+            ])
+            ranked = [by_id[doc_id] for doc_id, _ in fused]
+        if self.reranker is not None:
+            with self.timings.measure("rerank"):
+                ranked = self.reranker.rerank(query, ranked)
+        return ranked
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """컬렉션 검색과 같은 임베딩 함수로 텍스트 임베딩 (LRU 캐시, 미적중분만 한 번에 계산)"""
+        with self._cache_lock:
+            found = {t: self._embedding_cache[t] for t in texts if t in self._embedding_cache}
+            for text in found:
+                self._embedding_cache.move_to_end(text)
+            missing = [t for t in dict.fromkeys(texts) if t not in found]
+            self.cache_stats["embedding_hits"] += len(found)
+            self.cache_stats["embedding_misses"] += len(missing)
+
+        if missing:
+            computed = {t: list(map(float, v)) for t, v in zip(missing, self.embedding_function(missing))}
+            found.update(computed)
+            with self._cache_lock:
+                self._embedding_cache.update(computed)
+                while len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+        return [found[t] for t in texts]
+
+    def clear_caches(self):
+        with self._cache_lock:
+            self._embedding_cache.clear()
+            self._result_cache.clear()
+        if self.context_expander is not None:
+            self.context_expander.clear_cache()
+
+    def get_timings(self) -> Dict:
+        return self.timings.snapshot()
+
+    def get_cache_stats(self) -> Dict:
+        with self._cache_lock:
+            return {**self.cache_stats, "embedding_entries": len(self._embedding_cache), "result_entries": len(self._result_cache)}
+
+    @staticmethod
+    def _result_key(collection_name: str, query: str, n_results: int, where_filter: Optional[Dict]) -> Tuple:
+        return (collection_name, query, n_results, json.dumps(where_filter, sort_keys=True, ensure_ascii=False))
+
+    def _get_cached_result(self, key: Tuple) -> Optional[List[SearchResult]]:
+        with self._cache_lock:
+            results = self._result_cache.get(key)
+            if results is None:
+                self.cache_stats["result_misses"] += 1
+                return None
+            self._result_cache.move_to_end(key)
+            self.cache_stats["result_hits"] += 1
+            return list(results)
+
+    def _put_cached_result(self, key: Tuple, results: List[SearchResult]):
+        with self._cache_lock:
+            self._result_cache[key] = list(results)
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+
+    def index_fingerprint(self) -> str:
+        """컬렉션 식별자, 문서 수, 색인 리비전으로 만든 인덱스 버전 문자열 (재구축/청크 단위 변경 감지용)"""
+        parts = []
+        for name in (self.LEGAL_COLLECTION, self.MANUAL_COLLECTION):
+            try:
+                if self.vector_backend == "compact":
+                    # 검색 중인 컬렉션을 바꾸지 않도록 매니페스트의 내보내기 지문만 읽음 (교체는 reload_collections에서)
+                    parts.append(f"{name}:{self.client.fingerprint(name)}")
+                    continue
+                collection = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+                # index_revision: 수집 파이프라인이 청크를 쓸 때마다 올리는 값 (청크 수가 같은 교체/갱신 감지)
+                revision = (collection.metadata or {}).get("index_revision", 0)
+                parts.append(f"{name}:{collection.id}:{collection.count()}:{revision}")
+            except Exception:
+                parts.append(f"{name}:missing")
+        return "|".join(parts)
+
+    async def run_in_executor(self, func, *args):
+        """블로킹 검색 함수를 전용 스레드 풀에서 실행 (요청 단계 기록이 이어지도록 contextvars 전달)"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.vector_backend == "compact":
+            self.client.close()
 
 class HarborAgentTools:
     """Harbor Agent가 사용할 수 있는 도구들"""
-    def __init__(self, db_manager: ChromaDBManager):
+    def __init__(self, db_manager: ChromaDBManager, call_timeout: float = 10.0):
         self.db_manager = db_manager
+        self.call_timeout = call_timeout
+        # 배치 검색으로 묶을 수 있는 도구: 도구 이름 -> (결과 라벨, 검색 요청) 생성 함수
+        self._search_specs = {
+            "search_legal_documents": self._legal_search_spec,
+            "search_manual_documents": self._manual_search_spec,
+        }
 
     @staticmethod
     def get_tool_definitions() -> List[Dict]:
         return [
             {"type": "function", "function": {"name": "search_legal_documents", "description": "항만 관련 법률, 규정, 조문을 검색합니다.", "parameters": {"type": "object", "properties": {"query": {"type": "string", "description": "검색할 법률 내용"}, "structure_filter": {"type": "string", "description": "문서 구조 필터(article, chapter 등)"}, "n_results": {"type": "integer", "description": "검색 결과 개수(1-3)"}}, "required": ["query"]}}},
             {"type": "function", "function": {"name": "search_manual_documents", "description": "항만 업무 절차, 안전 매뉴얼, 실무 가이드를 검색합니다.", "parameters": {"type": "object", "properties": {"query": {"type": "string", "description": "검색할 절차나 방법"}, "n_results": {"type": "integer", "description": "검색 결과 개수(1-3)"}}, "required": ["query"]}}},
+            {"type": "function", "function": {"name": "lookup_legal_article", "description": "법령 이름과 조문 번호로 조문 전문을 바로 조회합니다. '항만법 제23조'처럼 조문 번호가 주어진 질문에 사용하며, 기준일에 시행 중인 개정본을 찾습니다.", "parameters": {"type": "object", "properties": {"law": {"type": "string", "description": "법령 이름(예: 항만법, 항만법 시행령)"}, "article": {"type": "string", "description": "조 번호(예: 23, 23의2)"}, "paragraph": {"type": "string", "description": "항 번호(선택)"}, "chapter": {"type": "string", "description": "장 번호(조 번호 없이 장 전체를 조회할 때)"}, "as_of": {"type": "string", "description": "기준일 YYYY-MM-DD(선택, 기본값: 오늘)"}, "query": {"type": "string", "description": "조문을 찾지 못했을 때 대신 검색할 문장(선택)"}}, "required": ["law"]}}},
         ]
 
     def execute_tool(self, tool_name: str, arguments: Dict) -> Dict:
         try:
             if tool_name == "search_legal_documents": return self._search_legal_documents(**arguments)
             elif tool_name == "search_manual_documents": return self._search_manual_documents(**arguments)
+            elif tool_name == "lookup_legal_article": return self._lookup_legal_article(**arguments)
             else: return {"error": f"알 수 없는 도구: {tool_name}"}
         except Exception as e:
             logger.error(f"도구 실행 오류 {tool_name}: {e}")
             return {"error": f"도구 실행 중 오류 발생: {str(e)}"}
 
+    async def execute_tool_async(self, tool_name: str, arguments: Dict) -> Dict:
+        """도구를 검색 전용 스레드 풀에서 실행하여 이벤트 루프를 막지 않음"""
+        return await self.db_manager.run_in_executor(self.execute_tool, tool_name, arguments)
+
+    async def execute_tools_async(self, tool_calls: List[Dict]) -> List[Dict]:
+        """
+        한 반복의 도구 호출들을 동시에 실행하고 결과를 호출 순서대로 반환.
+        검색 도구는 컬렉션별로 하나의 배치 검색으로 묶고, 각 작업은 개별 시간 제한과 오류 격리를 가짐
+        """
+        results: List[Optional[Dict]] = [None] * len(tool_calls)
+        search_groups: Dict[str, List[Tuple[int, str, SearchRequest]]] = {}
+        jobs = []  # (결과를 채울 호출 인덱스 목록, 코루틴)
+
+        for i, tool_call in enumerate(tool_calls):
+            tool_name, arguments = tool_call["function_name"], tool_call.get("arguments", {})
+            spec_builder = self._search_specs.get(tool_name)
+            if spec_builder is None:
+                jobs.append(([i], self.execute_tool_async(tool_name, arguments)))
+                continue
+            try:
+                label, request = spec_builder(**arguments)
+            except Exception as e:
+                logger.error(f"도구 실행 오류 {tool_name}: {e}")
+                results[i] = {"error": f"도구 실행 중 오류 발생: {str(e)}"}
+                continue
+            search_groups.setdefault(request[0], []).append((i, label, request))
+
+        for group in search_groups.values():
+            jobs.append(([i for i, _, _ in group], self._run_search_group(group)))
+
+        with span("tool_execute"):
+            outcomes = await asyncio.gather(
+                *(asyncio.wait_for(job, timeout=self.call_timeout) for _, job in jobs), return_exceptions=True
+            )
+        for (indices, _), outcome in zip(jobs, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.error(f"도구 실행 시간 초과({self.call_timeout}초): {[tool_calls[i]['function_name'] for i in indices]}")
+                outcome = [{"error": "도구 실행 시간이 초과되었습니다."} for _ in indices]
+            elif isinstance(outcome, Exception):
+                logger.error(f"도구 실행 오류: {outcome}")
+                outcome = [{"error": f"도구 실행 중 오류 발생: {str(outcome)}"} for _ in indices]
+            elif not isinstance(outcome, list):
+                outcome = [outcome]
+            for i, result in zip(indices, outcome):
+                results[i] = result
+        for tool_call, result in zip(tool_calls, results):
+            outcome = "error" if "error" in result else ("empty" if not result.get("results", True) else "ok")
+            TOOL_CALLS.inc(tool=tool_call["function_name"], outcome=outcome)
+        return results
+
+    async def execute_searches_scored(self, tool_calls: List[Dict]) -> Tuple[List[Dict], Optional[float]]:
+        """
+        검색 도구 호출들을 한 번의 배치 검색으로 실행하고 (호출 순서대로의 결과, 가장 가까운 검색 거리)를 반환.
+        조문 직접 조회(lookup_legal_article)로 찾은 결과는 거리 0으로 취급
+        """
+        specs = {i: self._search_specs[c["function_name"]](**c.get("arguments", {}))
+                 for i, c in enumerate(tool_calls) if c["function_name"] in self._search_specs}
+        lookups = {i: c.get("arguments", {}) for i, c in enumerate(tool_calls) if i not in specs}
+        found, *looked_up = await asyncio.wait_for(asyncio.gather(
+            self.db_manager.run_in_executor(self.db_manager.search_batch, [request for _, request in specs.values()]),
+            *(self.db_manager.run_in_executor(functools.partial(self._lookup, **arguments)) for arguments in lookups.values()),
+        ), timeout=self.call_timeout)
+
+        formatted: List[Optional[Dict]] = [None] * len(tool_calls)
+        distances = [r.distance for results in found for r in results if r.distance is not None]
+        for (i, (label, _)), results in zip(specs.items(), found):
+            formatted[i] = self._format_search_response(label, results)
+        for i, (response, distance) in zip(lookups, looked_up):
+            formatted[i] = response
+            if distance is not None:
+                distances.append(distance)
+        return formatted, (min(distances) if distances else None)
+
+    async def _run_search_group(self, group: List[Tuple[int, str, SearchRequest]]) -> List[Dict]:
+        """같은 컬렉션의 검색 요청들을 한 번의 배치 검색으로 실행"""
+        search_results = await self.db_manager.run_in_executor(self.db_manager.search_batch, [r for _, _, r in group])
+        return [self._format_search_response(label, found) for (_, label, _), found in zip(group, search_results)]
+
+    @staticmethod
+    def source_files(tool_result: Dict) -> List[str]:
+        """도구 실행 결과에 포함된 출처 파일 목록 (중복 제거, 순서 유지)"""
+        results = (tool_result or {}).get("results") or []
+        return list(dict.fromkeys(r["source_file"] for r in results if r.get("source_file")))
+
+    @staticmethod
+    def primary_source_file(tool_result: Dict) -> Optional[str]:
+        """도구 실행 결과의 대표 출처 파일 (첫 번째 검색 결과)"""
+        results = (tool_result or {}).get("results")
+        return results[0].get("source_file") if results else None
+
     def _format_search_results(self, results: List[SearchResult]) -> List[Dict]:
         if not results: return []
         return [{"content": r.content, "source_file": r.metadata.get('source_file', '알 수 없음')} for r in results]
 
-    def _search_legal_documents(self, query: str, structure_filter: str = "", n_results: int = 2) -> Dict:
+    def _format_search_response(self, label: str, results: List[SearchResult]) -> Dict:
+        if not results: return {"message": f"관련 {label} 정보를 찾을 수 없습니다.", "results": []}
+        return {"message": f"{len(results)}개의 {label} 정보를 찾았습니다.", "results": self._format_search_results(results)}
+
+    @staticmethod
+    def _legal_search_spec(query: str, structure_filter: str = "", n_results: int = 2) -> Tuple[str, SearchRequest]:
         where_filter = {"structure_type": structure_filter} if structure_filter else None
-        results = self.db_manager.search_legal(query, n_results, where_filter)
-        if not results: return {"message": "관련 법률 정보를 찾을 수 없습니다.", "results": []}
-        return {"message": f"{len(results)}개의 법률 정보를 찾았습니다.", "results": self._format_search_results(results)}
+        return "법률", (ChromaDBManager.LEGAL_COLLECTION, query, int(n_results), where_filter)
+
+    @staticmethod
+    def _manual_search_spec(query: str, n_results: int = 2) -> Tuple[str, SearchRequest]:
+        return "매뉴얼", (ChromaDBManager.MANUAL_COLLECTION, query, int(n_results), None)
+
+    def _search_legal_documents(self, query: str, structure_filter: str = "", n_results: int = 2) -> Dict:
+        label, request = self._legal_search_spec(query, structure_filter, n_results)
+        return self._format_search_response(label, self.db_manager.search_batch([request])[0])
 
     def _search_manual_documents(self, query: str, n_results: int = 2) -> Dict:
-        results = self.db_manager.search_manual(query, n_results)
-        if not results: return {"message": "관련 매뉴얼 정보를 찾을 수 없습니다.", "results": []}
-        return {"message": f"{len(results)}개의 매뉴얼 정보를 찾았습니다.", "results": self._format_search_results(results)}
+        label, request = self._manual_search_spec(query, n_results)
+        return self._format_search_response(label, self.db_manager.search_batch([request])[0])
+
+    def _lookup_legal_article(self, law: str = "", article: str = "", paragraph: str = "", chapter: str = "",
+                              as_of: str = "", query: str = "", n_results: int = 8) -> Dict:
+        return self._lookup(law, article, paragraph, chapter, as_of, query, n_results)[0]
+
+    def _lookup(self, law: str = "", article: str = "", paragraph: str = "", chapter: str = "",
+                as_of: str = "", query: str = "", n_results: int = 8) -> Tuple[Dict, Optional[float]]:
+        """
+        조문 색인으로 직접 조회하고 (결과, 검색 거리)를 반환. 직접 조회 결과의 거리는 0이며,
+        색인에 없는 조문이면 query(없으면 조회 조건으로 만든 문장)로 법률 벡터 검색을 대신 실행
+        """
+        article, paragraph, chapter = (normalize_structure_number(v) for v in (article, paragraph, chapter))
+        reference = " ".join(part for part in (
+            law, f"제{article}조" if article else "", f"제{paragraph}항" if article and paragraph else "",
+            f"제{chapter}장" if chapter and not article else "",
+        ) if part)
+        if article or chapter:
+            versions, results = self.db_manager.lookup_legal(law, article, paragraph, chapter, parse_date(as_of), int(n_results))
+            if results:
+                found_in = ", ".join(f"{v.source_file}(시행 {format_date(v.effective_date)})"
+                                     for v in versions if any(r.metadata.get("source_file") == v.source_file for r in results))
+                return {"message": f"{reference} 조문 {len(results)}개를 찾았습니다. 출처: {found_in}",
+                        "results": self._format_search_results(results)}, 0.0
+
+        label, request = self._legal_search_spec(query or reference, n_results=min(int(n_results), 3))
+        results = self.db_manager.search_batch([request])[0]
+        response = self._format_search_response(label, results)
+        response["message"] = f"조문 색인에서 '{reference}'을(를) 찾지 못해 검색 결과로 대신합니다. " + response["message"]
+        distances = [r.distance for r in results if r.distance is not None]
+        return response, (min(distances) if distances else None)
 
 class HarborAgent:
     """항만 규정안내 및 상황대응 Agent"""
-    def __init__(self, api_key: str, db_path: str = "./chroma_db"):
-        self.gemini = GeminiClient(api_key)
-        self.db_manager = ChromaDBManager(db_path)
-        self.tools = HarborAgentTools(self.db_manager)
-        self.conversation_history = []
+    def __init__(self, api_key: str, db_path: str = "./chroma_db",
+                 max_llm_concurrency: int = 8, max_search_workers: int = 4,
+                 embedding_cache_size: int = 2048, result_cache_size: int = 1024,
+                 tool_call_timeout: float = 10.0,
+                 conversation_store: Optional[ConversationStore] = None,
+                 answer_cache: Optional[AnswerCache] = None, index_check_interval: float = 60.0,
+                 gemini_client: Optional[GeminiClient] = None,
+                 fast_path: bool = False, fast_path_max_distance: float = 0.4,
+                 embedding_function: Any = None, embedding_model: Optional[str] = None,
+                 hybrid_search: bool = True, hybrid_candidates: int = 20, reranker: Any = None,
+                 context_budgeter: Optional[ContextBudgeter] = None, structured_lookup: bool = True,
+                 context_expander: Optional[ContextExpander] = None, vector_backend: str = "chroma",
+                 compact_index_path: str = "./compact_index", compact_nprobe: int = 8):
+        self.gemini = gemini_client or GeminiClient(api_key, max_concurrency=max_llm_concurrency)
+        self.db_manager = ChromaDBManager(db_path, max_workers=max_search_workers,
+                                          embedding_cache_size=embedding_cache_size, result_cache_size=result_cache_size,
+                                          embedding_function=embedding_function, embedding_model=embedding_model,
+                                          hybrid_search=hybrid_search, hybrid_candidates=hybrid_candidates, reranker=reranker,
+                                          structured_lookup=structured_lookup, context_expander=context_expander,
+                                          vector_backend=vector_backend, compact_index_path=compact_index_path,
+                                          compact_nprobe=compact_nprobe)
+        self.tools = HarborAgentTools(self.db_manager, call_timeout=tool_call_timeout)
+        # 세션별 대화 내역 (전역 단일 내역 대신 세션 단위로 상한 적용)
+        self.conversations = conversation_store or ConversationStore()
+        # 반복 질문에 대한 답변 캐시 (None이면 사용하지 않음)
+        self.answer_cache = answer_cache
+        # 도구 결과를 프롬프트에 넣기 전 요청당 토큰 예산으로 압축 (None이면 원문 그대로 사용)
+        self.context_budgeter = context_budgeter
+        # 검색 우선 경로: 로컬 라우터로 먼저 검색하고, 결과가 충분히 가까우면 도구 선택 LLM 호출 없이 한 번에 답변
+        self.fast_path = fast_path
+        self.fast_path_max_distance = fast_path_max_distance
+        self.router = QueryRouter()
+        self.fast_path_stats = {"attempts": 0, "answered": 0, "fallbacks": 0}
+        self.index_check_interval = index_check_interval
+        self._index_checked_at = 0.0
+        self._index_fingerprint: Optional[str] = None
+
+    def close(self):
+        self.db_manager.close()
+        self.gemini.close()
 
     def _create_system_prompt(self) -> str:
         return """당신은 대한민국 항만 관련 전문 AI Assistant입니다. 당신의 임무는 사용자의 질문을 이해하고, '사용 가능한 도구'를 사용하여 정보를 찾은 뒤, 그 결과를 종합하여 완전한 답변을 제공하는 것입니다.
@@ -195,14 +924,116 @@ class HarborAgent:
 
     항상 정해진 JSON 형식으로만 응답해야 합니다."""
     
-    def process_query(self, query: str) -> Dict:
+    @staticmethod
+    def _new_usage() -> Dict[str, int]:
+        return {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    @staticmethod
+    def _add_usage(usage: Dict[str, int], response: Dict):
+        """Gemini 응답 하나의 토큰 사용량을 요청 단위 집계에 합산"""
+        usage["llm_calls"] += 1
+        for key, value in response.get("usage", {}).items():
+            usage[key] += value
+
+    async def _check_index_version(self):
+        """ChromaDB 컬렉션이 바뀌면(식별자/문서 수/색인 리비전 변경) 검색·답변 캐시를 모두 무효화"""
+        now = time.time()
+        if now - self._index_checked_at <= self.index_check_interval:
+            return
+        self._index_checked_at = now
+        fingerprint = await self.db_manager.run_in_executor(self.db_manager.index_fingerprint)
+        if self._index_fingerprint is not None and fingerprint != self._index_fingerprint:
+            logger.info("벡터 인덱스 변경 감지 - 검색/답변 캐시를 초기화합니다.")
+            self.db_manager.clear_caches()
+            if self.db_manager.vector_backend == "compact":
+                await self.db_manager.run_in_executor(self.db_manager.reload_collections)
+            await self.db_manager.run_in_executor(self.db_manager.refresh_indexes)
+        if self.answer_cache is not None and fingerprint != self._index_fingerprint:
+            # 첫 확인에서도 지문을 맞춰, 재시작 전에 재구축된 인덱스로 만든 공유 캐시 답변을 버림
+            await self._offload(self.answer_cache, self.answer_cache.set_index_version, fingerprint)
+        self._index_fingerprint = fingerprint
+
+    @staticmethod
+    async def _offload(store, func, *args):
+        """SQLite 파일을 쓰는 저장소(답변 캐시, 대화 기록) 호출은 이벤트 루프를 막지 않도록 스레드에서 실행"""
+        if store.db_path:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def _lookup_answer_cache(self, query: str) -> Tuple[Optional[Dict], Optional[List[float]]]:
+        """정확 일치 → 유사 질의 순으로 캐시 조회, 유사도 조회에 쓴 임베딩도 함께 반환"""
+        cached = await self._offload(self.answer_cache, self.answer_cache.get_exact, query)
+        if cached is not None:
+            return cached, None
+
+        embedding = None
+        if self.answer_cache.semantic_enabled:
+            try:
+                embedding = (await self.db_manager.run_in_executor(self.db_manager.embed, [query]))[0]
+                cached = await self._offload(self.answer_cache, self.answer_cache.get_similar, embedding)
+            except Exception as e:
+                logger.warning(f"질의 임베딩 실패, 유사도 캐시 조회 생략: {e}")
+        if cached is None:
+            self.answer_cache.record_miss()
+        return cached, embedding
+
+    async def process_query(self, query: str, session_id: Optional[str] = None,
+                            priority: int = PRIORITY_INTERACTIVE) -> Dict:
+        """
+        다중 Tool Call을 실행하며, 최대 반복 횟수 도달 시 강제로 최종 답변을 생성하는 버전
+        """
+        result = None
+        async for event in self.run_query(query, session_id, stream=False, priority=priority):
+            if event["event"] == "done":
+                result = event["result"]
+        return result
+
+    async def run_query(self, query: str, session_id: Optional[str] = None,
+                        stream: bool = False, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Dict]:
         """
-        다중 Tool Call을 순차적으로 실행하며, 최대 반복 횟수 도달 시 강제로 최종 답변을 생성하는 버전
+        에이전트 루프를 진행하면서 이벤트를 순서대로 내보냄.
+        tool_call_start / tool_call_end / token(stream=True일 때 답변 조각) 이후 마지막에 항상 done 이벤트.
+        priority는 Gemini 스케줄러 대기열 우선순위 (작을수록 먼저 처리)
         """
         try:
-            self.conversation_history.append({"role": "user", "content": query})
-            messages = [{"role": "system", "content": self._create_system_prompt()}] + self.conversation_history
+            await self._check_index_version()
+            history = await self._offload(self.conversations, self.conversations.get_history, session_id)
+
+            # 이전 대화에 의존하지 않는 단독 질문만 답변 캐시 사용
+            use_cache = self.answer_cache is not None and not history
+            query_embedding = None
+            if use_cache:
+                cached, query_embedding = await self._lookup_answer_cache(query)
+                if cached is not None:
+                    logger.info("답변 캐시 적중 - LLM 호출 생략")
+                    await self._offload(self.conversations, self.conversations.append_turn, session_id, query, cached["answer"])
+                    if stream:
+                        yield {"event": "token", "text": cached["answer"]}
+                    yield {"event": "done", "result": {**cached, "cached": True, "usage": self._new_usage()}}
+                    return
+
+            messages = [{"role": "system", "content": self._create_system_prompt()}] + history
+            messages.append({"role": "user", "content": query})
             tools = HarborAgentTools.get_tool_definitions()
+            usage = self._new_usage()
+            budget = self.context_budgeter.start(query) if self.context_budgeter is not None else None
+
+            if self.fast_path:
+                fast_done = None
+                async for event in self._run_fast_path(query, messages, stream, priority, usage, budget):
+                    if event["event"] == "done":
+                        fast_done = event
+                    else:
+                        yield event
+                if fast_done is not None:
+                    result = fast_done["result"]
+                    if fast_done["answered"]:
+                        await self._offload(self.conversations, self.conversations.append_turn, session_id, query, result["answer"])
+                        if use_cache:
+                            await self._offload(self.answer_cache, self.answer_cache.put, query,
+                                                {k: v for k, v in result.items() if k != "usage"}, query_embedding)
+                    yield {"event": "done", "result": result}
+                    return
             
             # API 요청 횟수를 2회로 제한 (최초 1회 + 추가 정보 요청 1회)
             max_iterations = 2 
@@ -212,31 +1043,47 @@ class HarborAgent:
             while iteration < max_iterations:
                 iteration += 1
                 logger.info(f"--- [Agent 반복 {iteration}/{max_iterations}] ---")
-                response = self.gemini.generate_response(messages, tools)
+                response = None
+                async for item in self._generate(messages, tools, stream, priority):
+                    if item["type"] == "delta":
+                        yield {"event": "token", "text": item["content"]}
+                    else:
+                        response = item
+                self._add_usage(usage, response)
 
                 if response["type"] == "tool_call_list":
-                    # 모델이 도구 사용을 요청한 경우
+                    # 모델이 도구 사용을 요청한 경우 - 모든 호출을 동시에 실행하되 결과는 요청 순서대로 추가
                     for tool_call in response["calls"]:
+                        logger.info(f"도구 호출: {tool_call['function_name']} with {tool_call.get('arguments', {})}")
+                        yield {"event": "tool_call_start", "tool": tool_call["function_name"], "arguments": tool_call.get("arguments", {})}
+                    tool_results = await self.tools.execute_tools_async(response["calls"])
+                    prompt_results = self._compact_tool_results(budget, tool_results)
+
+                    for tool_call, tool_result, prompt_result in zip(response["calls"], tool_results, prompt_results):
                         function_name, arguments = tool_call["function_name"], tool_call.get("arguments", {})
-                        logger.info(f"도구 호출: {function_name} with {arguments}")
-                        
-                        # 도구 실행
-                        tool_result = self.tools.execute_tool(function_name, arguments)
                         tool_results_log.append({"tool": function_name, "arguments": arguments, "result": tool_result})
+                        yield {"event": "tool_call_end", "tool": function_name,
+                               "source_file": HarborAgentTools.primary_source_file(tool_result),
+                               "source_files": HarborAgentTools.source_files(tool_result)}
                         
                         # 도구 실행 결과를 대화 내역에 추가
-                        messages.append({"role": "tool", "content": f"도구 '{function_name}' 실행 결과: {json.dumps(tool_result, ensure_ascii=False)}"})
+                        messages.append({"role": "tool", "content": f"도구 '{function_name}' 실행 결과: {json.dumps(prompt_result, ensure_ascii=False)}"})
                     
                     # 다음 반복을 위해 계속 진행
                     continue
 
                 elif response["type"] == "text":
                     # 모델이 도구 없이 바로 답변을 생성한 경우
-                    self.conversation_history.append({"role": "assistant", "content": response["content"]})
-                    return {"answer": response["content"], "tool_calls": tool_results_log, "iterations": iteration}
+                    await self._offload(self.conversations, self.conversations.append_turn, session_id, query, response["content"])
+                    result = {"answer": response["content"], "tool_calls": tool_results_log, "iterations": iteration}
+                    if use_cache:
+                        await self._offload(self.answer_cache, self.answer_cache.put, query, result, query_embedding)
+                    yield {"event": "done", "result": {**result, "usage": usage}}
+                    return
 
                 else: # "error"
-                    return {"answer": response.get("content", "오류가 발생했습니다."), "tool_calls": tool_results_log, "iterations": iteration}
+                    yield {"event": "done", "result": {"answer": response.get("content", "오류가 발생했습니다."), "tool_calls": tool_results_log, "iterations": iteration, "usage": usage}}
+                    return
 
             # 최대 반복 횟수에 도달한 경우, 강제로 답변 생성
             logger.info(f"최대 반복 횟수({max_iterations}회)에 도달했습니다. 현재까지 수집된 정보로 최종 답변을 생성합니다.")
@@ -246,17 +1093,99 @@ class HarborAgent:
             messages.append({"role": "user", "content": final_instruction})
             
             # 더 이상 도구를 사용하지 못하도록 하고 API 호출
-            final_response = self.gemini.generate_response(messages, tools=None)
+            final_response = None
+            async for item in self._generate(messages, None, stream, priority):
+                if item["type"] == "delta":
+                    yield {"event": "token", "text": item["content"]}
+                else:
+                    final_response = item
+            self._add_usage(usage, final_response)
             
             if final_response["type"] == "text":
                 final_answer = final_response["content"]
+                if use_cache:
+                    await self._offload(self.answer_cache, self.answer_cache.put, query,
+                                        {"answer": final_answer, "tool_calls": tool_results_log, "iterations": iteration}, query_embedding)
             else:
                 # 마지막 호출에서도 오류가 발생하거나 텍스트 답변이 없는 경우
                 final_answer = "최종 답변을 생성하는 데 실패했습니다. 수집된 정보는 다음과 같습니다."
 
-            self.conversation_history.append({"role": "assistant", "content": final_answer})
-            return {"answer": final_answer, "tool_calls": tool_results_log, "iterations": iteration}
+            await self._offload(self.conversations, self.conversations.append_turn, session_id, query, final_answer)
+            yield {"event": "done", "result": {"answer": final_answer, "tool_calls": tool_results_log, "iterations": iteration, "usage": usage}}
 
         except Exception as e:
             logger.error(f"process_query 처리 중 심각한 오류 발생: {e}", exc_info=True)
-            return {"answer": "시스템 오류가 발생했습니다.", "tool_calls": [], "iterations": 0}
+            yield {"event": "done", "result": {"answer": "시스템 오류가 발생했습니다.", "tool_calls": [], "iterations": 0}}
+
+    async def _run_fast_path(self, query: str, messages: List[Dict], stream: bool, priority: int,
+                             usage: Dict[str, int], budget: Optional[ContextBudget]) -> AsyncIterator[Dict]:
+        """
+        라우터가 고른 컬렉션을 먼저 검색해 결과를 프롬프트에 넣고 도구 없이 한 번만 생성.
+        검색이 실패하거나 검색 거리가 임계값보다 멀면 done 없이 끝나 기존 도구 호출 루프로 넘어감.
+        budget은 요청 전체가 함께 쓰는 토큰 예산 (도구 호출 루프로 넘어가도 이어서 사용)
+        """
+        self.fast_path_stats["attempts"] += 1
+        tool_calls = self.router.route(query)
+        try:
+            tool_results, best_distance = await self.tools.execute_searches_scored(tool_calls)
+        except Exception as e:
+            logger.warning(f"검색 우선 경로 검색 실패 - 기존 도구 호출 루프로 진행: {e}")
+            self.fast_path_stats["fallbacks"] += 1
+            return
+        if best_distance is None or best_distance > self.fast_path_max_distance:
+            logger.info(f"검색 우선 경로 신뢰도 부족(거리 {'없음' if best_distance is None else f'{best_distance:.3f}'}) - 기존 도구 호출 루프로 진행")
+            self.fast_path_stats["fallbacks"] += 1
+            return
+
+        logger.info(f"검색 우선 경로 사용(거리 {best_distance:.3f}): {[c['function_name'] for c in tool_calls]}")
+        fast_messages = list(messages)
+        tool_results_log = []
+        prompt_results = self._compact_tool_results(budget, tool_results)
+        for tool_call, tool_result, prompt_result in zip(tool_calls, tool_results, prompt_results):
+            function_name, arguments = tool_call["function_name"], tool_call["arguments"]
+            yield {"event": "tool_call_start", "tool": function_name, "arguments": arguments}
+            tool_results_log.append({"tool": function_name, "arguments": arguments, "result": tool_result})
+            yield {"event": "tool_call_end", "tool": function_name,
+                   "source_file": HarborAgentTools.primary_source_file(tool_result),
+                   "source_files": HarborAgentTools.source_files(tool_result)}
+            fast_messages.append({"role": "tool", "content": f"도구 '{function_name}' 실행 결과: {json.dumps(prompt_result, ensure_ascii=False)}"})
+        fast_messages.append({"role": "user", "content": "위 검색 결과를 바탕으로 사용자의 질문에 대한 답변을 'content' 필드에 담아 JSON 형식으로 작성해주세요."})
+
+        response = None
+        async for item in self._generate(fast_messages, None, stream, priority):
+            if item["type"] == "delta":
+                yield {"event": "token", "text": item["content"]}
+            else:
+                response = item
+        self._add_usage(usage, response)
+        if response["type"] == "tool_call_list":
+            # 예산에 이미 넣은 검색 결과는 루프에서 중복으로 빠지므로 대화 내역에도 남겨 둠
+            messages.extend(fast_messages[len(messages):-1])
+            self.fast_path_stats["fallbacks"] += 1
+            return
+        answered = response["type"] == "text"
+        if answered:
+            self.fast_path_stats["answered"] += 1
+        yield {"event": "done", "answered": answered,
+               "result": {"answer": response.get("content", "오류가 발생했습니다."), "tool_calls": tool_results_log, "iterations": 1, "usage": usage}}
+
+    @staticmethod
+    def _compact_tool_results(budget: Optional[ContextBudget], tool_results: List[Dict]) -> List[Dict]:
+        """프롬프트에 넣을 도구 결과 (응답의 tool_calls에는 압축 전 원본을 그대로 남김)"""
+        if budget is None:
+            return tool_results
+        with span("context_budget"):
+            return budget.compact(tool_results)
+
+    async def _generate(self, messages: List[Dict], tools: Optional[List[Dict]], stream: bool,
+                        priority: int) -> AsyncIterator[Dict]:
+        """스트리밍 여부에 따라 Gemini 응답을 생성. 스트리밍 시 delta 조각들 뒤에 최종 파싱 결과가 옴"""
+        if stream:
+            async for item in self.gemini.stream_response(messages, tools, priority=priority):
+                if item["type"] != "delta":
+                    ITERATIONS.inc(kind=item["type"])
+                yield item
+        else:
+            response = await self.gemini.generate_response(messages, tools, priority=priority)
+            ITERATIONS.inc(kind=response["type"])
+            yield response
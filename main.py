@@ -1,44 +1,260 @@
+import asyncio
 import json
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
+import time
+import uuid
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 # 로컬 import (같은 디렉토리의 다른 파일들)
-from models import QueryRequest, QueryResponse, HealthResponse, ToolCall
-from harbor_agent import HarborAgent
+from models import QueryRequest, QueryResponse, HealthResponse, ToolCall, TokenUsage
+from harbor_agent import HarborAgent, HarborAgentTools, GeminiClient
+from scheduler import GeminiScheduler
+from batch import parse_batch_lines, run_batch
+from metrics import REGISTRY, REQUEST_SECONDS, end_trace, span, start_trace
+from reranker import CrossEncoderReranker
+from embeddings import DEFAULT_EMBEDDING_MODEL, embedding_model_name, load_embedding_function, warm_up_embedding_function
+from context_budget import ContextBudgeter
+from context_expansion import ContextExpander
+from conversation_store import ConversationStore
+from answer_cache import AnswerCache
+from readiness import READINESS_STAGES, STAGE_FAILED, STAGE_READY, ReadinessState
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 전역 agent 변수
+# 전역 agent 변수 (백그라운드 초기화가 끝나면 설정)
 agent = None
+# 초기화 단계별 준비 상태 (/livez, /readyz, /health)
+readiness = ReadinessState()
+# 프로세스에서 한 번만 로드하는 모델 (gunicorn preload 시 마스터에서 로드해 워커들이 fork로 공유)
+_shared_models: Optional[Dict[str, Any]] = None
+
+def preload_shared_models() -> Dict[str, Any]:
+    """
+    임베딩 모델과 (설정된 경우) 재정렬 모델을 로드. 이미 로드했으면 그대로 반환.
+    워밍업(첫 추론)은 스레드 풀을 만들므로 fork 이후 각 워커의 lifespan에서 수행.
+    Chroma 클라이언트와 BM25/조문/청크 관계 색인은 여기서 만들지 않고 워커마다 _build_agent에서 만듦
+    """
+    global _shared_models
+    if _shared_models is not None:
+        return _shared_models
+
+    # 인덱스를 만든 것과 같은 임베딩 모델을 한 번만 로드
+    embedding_backend = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+    embedding_model = embedding_model_name(os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL), embedding_backend)
+    embedding_function = load_embedding_function(
+        embedding_model,
+        backend=embedding_backend,
+        device=os.getenv("EMBEDDING_DEVICE", "cpu"),
+        onnx_file=os.getenv("EMBEDDING_ONNX_FILE") or None,
+    )
+
+    # 법률 검색 결과 재정렬용 크로스 인코더 (RERANKER_MODEL을 지정한 경우에만 사용)
+    reranker = None
+    if os.getenv("RERANKER_MODEL"):
+        reranker = CrossEncoderReranker(
+            os.getenv("RERANKER_MODEL"),
+            device=os.getenv("EMBEDDING_DEVICE", "cpu"),
+            max_candidates=int(os.getenv("RERANKER_MAX_CANDIDATES", 10)),
+        )
+
+    _shared_models = {
+        "embedding_backend": embedding_backend,
+        "embedding_model": embedding_model,
+        "embedding_function": embedding_function,
+        "reranker": reranker,
+    }
+    return _shared_models
+
+def _build_agent(api_key: str, embedding_function: Any, embedding_model: str, reranker: Any) -> HarborAgent:
+    """환경 변수 설정으로 HarborAgent 생성 (컬렉션 열기/색인 생성이 있는 블로킹 작업이므로 스레드에서 실행)"""
+    # 여러 워커 프로세스로 실행할 때 요청 한도/답변 캐시/세션을 공유할 SQLite 파일 (개별 설정이 우선)
+    shared_state_db = os.getenv("SHARED_STATE_DB_PATH") or None
+
+    answer_cache = None
+    if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+        answer_cache = AnswerCache(
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000)),
+            ttl_seconds=int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 86400)),
+            similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.92)),
+            db_path=os.getenv("ANSWER_CACHE_DB_PATH") or shared_state_db,
+        )
+
+    # 도구 결과를 프롬프트에 넣기 전 압축할 요청당 토큰 예산 (0이면 원문 그대로 사용)
+    context_budgeter = None
+    if int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000)) > 0:
+        context_budgeter = ContextBudgeter(
+            max_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000)),
+            max_chunk_tokens=int(os.getenv("CONTEXT_MAX_CHUNK_TOKENS", 400)),
+        )
+    # 검색된 하위 청크를 부모 조문(parent)/같은 조문 전체(article)/앞뒤 청크(neighbors)로 확장 (none이면 사용 안 함)
+    context_expander = ContextExpander(
+        mode=os.getenv("CONTEXT_EXPANSION", "parent").lower(),
+        window=int(os.getenv("CONTEXT_EXPANSION_WINDOW", 1)),
+        max_chars=int(os.getenv("CONTEXT_EXPANSION_MAX_CHARS", 3000)),
+        cache_size=int(os.getenv("CONTEXT_EXPANSION_CACHE_SIZE", 512)),
+    )
+
+    gemini_client = GeminiClient(
+        api_key,
+        scheduler=GeminiScheduler(
+            rpm=int(os.getenv("GEMINI_RPM", 15)),
+            tpm=int(os.getenv("GEMINI_TPM", 250000)),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 3)),
+            state_db_path=os.getenv("RATE_LIMIT_DB_PATH") or shared_state_db,
+        ),
+        queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", 30)),
+        token_accounting=os.getenv("TOKEN_ACCOUNTING", "usage").lower(),
+        verbose=os.getenv("VERBOSE_API_CALLS", "false").lower() == "true",
+        prompt_log_sample_rate=float(os.getenv("PROMPT_LOG_SAMPLE_RATE", 1.0)),
+        json_mode=os.getenv("GEMINI_JSON_MODE", "true").lower() == "true",
+        parse_retries=int(os.getenv("GEMINI_PARSE_RETRIES", 1)),
+    )
+    return HarborAgent(
+        api_key,
+        db_path=os.getenv("CHROMA_DB_PATH", "./chroma_db"),
+        # compact: compact_index.py로 내보낸 양자화·메모리 맵 인덱스로 검색 (저메모리 배포용)
+        vector_backend=os.getenv("VECTOR_BACKEND", "chroma").lower(),
+        compact_index_path=os.getenv("COMPACT_INDEX_PATH", "./compact_index"),
+        compact_nprobe=int(os.getenv("COMPACT_IVF_NPROBE", 8)),
+        gemini_client=gemini_client,
+        embedding_function=embedding_function,
+        embedding_model=embedding_model,
+        hybrid_search=os.getenv("HYBRID_SEARCH", "true").lower() == "true",
+        hybrid_candidates=int(os.getenv("HYBRID_CANDIDATES", 20)),
+        reranker=reranker,
+        structured_lookup=os.getenv("STRUCTURED_LOOKUP", "true").lower() == "true",
+        context_expander=context_expander,
+        max_search_workers=int(os.getenv("CHROMA_MAX_WORKERS", 4)),
+        embedding_cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", 2048)),
+        result_cache_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", 1024)),
+        tool_call_timeout=float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", 10)),
+        conversation_store=ConversationStore(
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", 6)),
+            max_tokens=int(os.getenv("SESSION_MAX_TOKENS", 2000)),
+            ttl_seconds=int(os.getenv("SESSION_TTL_SECONDS", 1800)),
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", 1000)),
+            db_path=os.getenv("SESSION_DB_PATH") or shared_state_db,
+        ),
+        answer_cache=answer_cache,
+        context_budgeter=context_budgeter,
+        fast_path=os.getenv("AGENT_FAST_PATH", "false").lower() == "true",
+        fast_path_max_distance=float(os.getenv("FAST_PATH_MAX_DISTANCE", 0.4)),
+    )
+
+async def _check_collections() -> bool:
+    """컬렉션이 모두 열렸고 비어 있지 않은지 확인 (빈 인덱스로 "찾을 수 없습니다" 답변만 하는 상태를 막음)"""
+    counts = await agent.db_manager.run_in_executor(agent.db_manager.collection_counts)
+    if all(counts.values()):
+        readiness.mark("collections", STAGE_READY, counts)
+        return True
+    readiness.mark("collections", STAGE_FAILED, counts)
+    return False
+
+async def _check_llm() -> bool:
+    """Gemini API 연결 확인 (모델 정보 조회)"""
+    try:
+        model_name = await asyncio.wait_for(asyncio.to_thread(agent.gemini.check_reachable),
+                                            timeout=float(os.getenv("READINESS_LLM_TIMEOUT_SECONDS", 10)))
+        readiness.mark("llm", STAGE_READY, model_name)
+        return True
+    except Exception as e:
+        readiness.mark("llm", STAGE_FAILED, f"{type(e).__name__}: {e}")
+        return False
+
+async def _initialize_agent(api_key: str):
+    """임베딩 모델 로드/워밍업 → HarborAgent 생성(컬렉션 열기, 색인) → 컬렉션/LLM 확인 순으로 준비 상태를 기록"""
+    global agent
+    try:
+        # 모델은 프로세스당 한 번만 로드하고, 첫 요청이 로드 비용을 치르지 않도록 워밍업
+        models = await asyncio.to_thread(preload_shared_models)
+        embedding_model = models["embedding_model"]
+        reranker = models["reranker"]
+        warmup_seconds = await asyncio.to_thread(warm_up_embedding_function, models["embedding_function"])
+        logger.info(f"임베딩 모델 준비 완료: {embedding_model} ({models['embedding_backend']}, 워밍업 {warmup_seconds:.2f}초)")
+        if reranker is not None:
+            await asyncio.to_thread(reranker.warm_up)
+            logger.info(f"재정렬 모델 준비 완료: {reranker.model_name}")
+        readiness.mark("embedding", STAGE_READY, {"model": embedding_model, "warmup_seconds": round(warmup_seconds, 2)})
+    except Exception as e:
+        readiness.mark("embedding", STAGE_FAILED, f"{type(e).__name__}: {e}")
+        readiness.fail(f"임베딩 모델 준비 실패: {e}")
+        return
+
+    try:
+        agent = await asyncio.to_thread(_build_agent, api_key, models["embedding_function"], embedding_model, reranker)
+        REGISTRY.register_collector(_collect_agent_metrics)
+        logger.info(f"HarborAgent 초기화 완료 (pid {os.getpid()})")
+    except Exception as e:
+        # 임베딩 모델 불일치 등 설정 오류는 다시 시도해도 같으므로 재시작이 필요한 실패로 기록
+        readiness.mark("collections", STAGE_FAILED, f"{type(e).__name__}: {e}")
+        readiness.fail(f"HarborAgent 초기화 실패: {e}")
+        return
+    await asyncio.gather(_check_collections(), _check_llm())
+
+async def _retry_pending_stages(interval: float):
+    """실패한 단계를 interval초마다 다시 확인 (컬렉션은 다시 열고 색인을 새로 만듦)"""
+    while readiness.fatal_error is None and agent is not None and not readiness.ready:
+        await asyncio.sleep(interval)
+        if readiness.stage_status("collections") != STAGE_READY:
+            try:
+                await agent.db_manager.run_in_executor(agent.db_manager.reload_collections)
+                if await _check_collections():
+                    await agent.db_manager.run_in_executor(agent.db_manager.refresh_indexes)
+                    agent.db_manager.clear_caches()
+            except Exception as e:
+                # 다시 연 컬렉션의 임베딩 모델이 다르거나(EmbeddingModelMismatchError) 색인 생성에 실패해도 재시도는 계속함
+                logger.error(f"컬렉션 다시 열기 실패: {e}")
+                readiness.mark("collections", STAGE_FAILED, f"{type(e).__name__}: {e}")
+        if readiness.stage_status("llm") != STAGE_READY:
+            await _check_llm()
+
+async def _start_agent(api_key: str):
+    await _initialize_agent(api_key)
+    await _retry_pending_stages(float(os.getenv("READINESS_RETRY_SECONDS", 10)))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """앱 시작/종료 시 실행되는 함수"""
-    global agent
+    global agent, readiness
     
     # 시작 시 - Agent 초기화
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
         logger.error("GEMINI_API_KEY 환경변수가 설정되지 않았습니다.")
         raise RuntimeError("GEMINI_API_KEY is required")
-    
-    try:
-        agent = HarborAgent(api_key)
-        logger.info("HarborAgent 초기화 완료")
-    except Exception as e:
-        logger.error(f"HarborAgent 초기화 실패: {e}")
-        raise
+
+    # LLM 연결을 필수 단계에서 빼면 Gemini 장애 중에도 복제본이 준비 상태를 유지 (검색 결과만으로는 답변하지 못함)
+    required = [stage for stage in READINESS_STAGES
+                if stage != "llm" or os.getenv("READINESS_REQUIRE_LLM", "true").lower() == "true"]
+    readiness = ReadinessState(required=required)
+
+    # 백그라운드 초기화: 모델 로드/컬렉션 열기 전에 요청을 받기 시작하고, 준비되기 전의 질의는 503으로 응답
+    if os.getenv("BACKGROUND_INIT", "true").lower() == "true":
+        init_task = asyncio.create_task(_start_agent(api_key))
+    else:
+        await _initialize_agent(api_key)
+        if readiness.fatal_error is not None:
+            raise RuntimeError(readiness.fatal_error)
+        init_task = asyncio.create_task(_retry_pending_stages(float(os.getenv("READINESS_RETRY_SECONDS", 10))))
     
     yield
     
     # 종료 시 - 정리 작업
+    init_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await init_task
+    REGISTRY.clear_collectors()
+    if agent is not None:
+        agent.close()
     logger.info("서버 종료")
 
 # FastAPI 앱 생성
@@ -58,6 +274,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """요청 처리 시간을 기록하고, X-Debug-Timing 헤더가 있으면 단계별 소요 시간을 Server-Timing 헤더로 반환"""
+    started = time.perf_counter()
+    trace, token = start_trace()
+    try:
+        response = await call_next(request)
+    finally:
+        end_trace(token)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                            path=route.path if route is not None else "unmatched", status=str(response.status_code))
+    if request.headers.get("x-debug-timing") and trace.spans:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+def _collect_agent_metrics():
+    """캐시/세션/Gemini 통계를 조회 시점에 지표로 변환"""
+    if agent is None:
+        return []
+    collected = []
+    if agent.answer_cache is not None:
+        answer_stats = agent.answer_cache.stats()
+        collected.append(("harbor_answer_cache_hits_total", "counter", "답변 캐시 적중 수",
+                          [({"kind": "exact"}, answer_stats["exact_hits"]), ({"kind": "semantic"}, answer_stats["semantic_hits"])]))
+        collected.append(("harbor_answer_cache_misses_total", "counter", "답변 캐시 미적중 수", [({}, answer_stats["misses"])]))
+    cache_stats = agent.db_manager.get_cache_stats()
+    collected.append(("harbor_retrieval_cache_hits_total", "counter", "검색 캐시 적중 수",
+                      [({"cache": "embedding"}, cache_stats["embedding_hits"]), ({"cache": "result"}, cache_stats["result_hits"])]))
+    collected.append(("harbor_retrieval_cache_misses_total", "counter", "검색 캐시 미적중 수",
+                      [({"cache": "embedding"}, cache_stats["embedding_misses"]), ({"cache": "result"}, cache_stats["result_misses"])]))
+    llm_stats = agent.gemini.get_stats()
+    scheduler_stats = llm_stats["scheduler"]
+    collected.append(("harbor_gemini_rate_limited_total", "counter", "Gemini 429 응답 수 (재시도 포함)", [({}, scheduler_stats["rate_limited"])]))
+    collected.append(("harbor_gemini_tokens_total", "counter", "Gemini 토큰 사용량",
+                      [({"kind": "prompt"}, llm_stats["prompt_tokens"]), ({"kind": "completion"}, llm_stats["completion_tokens"])]))
+    collected.append(("harbor_gemini_parse_total", "counter", "Gemini 응답 JSON 파싱 결과 수",
+                      [({"outcome": k}, llm_stats[f"parse_{k}"]) for k in ("ok", "repaired", "failed", "retries")]))
+    collected.append(("harbor_gemini_coalesced_total", "counter", "진행 중인 동일 요청과 공유된 Gemini 호출 수", [({}, scheduler_stats["coalesced"])]))
+    collected.append(("harbor_gemini_queue_depth", "gauge", "Gemini 호출 대기열 길이", [({}, scheduler_stats["queue_depth"])]))
+    collected.append(("harbor_gemini_in_flight", "gauge", "진행 중인 Gemini 호출 수", [({}, scheduler_stats["in_flight"])]))
+    if agent.context_budgeter is not None:
+        budget_stats = agent.context_budgeter.stats()
+        collected.append(("harbor_context_tokens_total", "counter", "프롬프트에 넣은 도구 결과 토큰 수 (압축 전/후 추정치)",
+                          [({"stage": "in"}, budget_stats["tokens_in"]), ({"stage": "out"}, budget_stats["tokens_out"])]))
+        collected.append(("harbor_context_hits_total", "counter", "예산 압축 중 처리된 검색 결과 수",
+                          [({"outcome": k}, budget_stats[k]) for k in ("deduplicated", "trimmed", "dropped")]))
+    collected.append(("harbor_ready", "gauge", "질의를 받을 준비가 되었는지 여부 (1/0)", [({}, int(readiness.ready))]))
+    collected.append(("harbor_active_sessions", "gauge", "메모리에 있는 대화 세션 수", [({}, agent.conversations.stats()["active_sessions"])]))
+    return collected
+
 @app.get("/", response_model=Dict[str, str])
 async def root():
     """루트 엔드포인트"""
@@ -67,28 +334,56 @@ async def root():
         "docs": "/docs"
     }
 
+# 준비되지 않은 복제본이 503과 함께 보내는 재시도 권장 시간(초)
+_RETRY_AFTER_SECONDS = "5"
+# 준비 상태(ready/initializing/not_ready/failed) → /health의 서버 상태
+_HEALTH_STATUS = {"ready": "healthy", "initializing": "starting", "not_ready": "unhealthy", "failed": "unhealthy"}
+
+def _not_ready_detail() -> str:
+    snapshot = readiness.snapshot()
+    pending = [stage for stage in snapshot["required"] if snapshot["stages"][stage]["status"] != STAGE_READY]
+    if snapshot["error"]:
+        return f"Agent 초기화에 실패했습니다: {snapshot['error']}"
+    return f"Agent가 아직 준비되지 않았습니다. (대기 중인 단계: {', '.join(pending)})"
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """헬스 체크 엔드포인트"""
-    global agent
-    
-    agent_status = "ready" if agent is not None else "not_initialized"
+    """헬스 체크 엔드포인트 (준비 단계별 상태 포함, 오케스트레이터 프로브는 /livez, /readyz 사용)"""
+    snapshot = readiness.snapshot()
     
     return HealthResponse(
-        status="healthy",
-        agent_status=agent_status,
-        api_version="1.0.0"
+        status=_HEALTH_STATUS[snapshot["status"]],
+        agent_status=snapshot["status"],
+        api_version="1.0.0",
+        stages={name: stage["status"] for name, stage in snapshot["stages"].items()},
+        error=snapshot["error"]
     )
 
+@app.get("/livez")
+async def liveness():
+    """활성 프로브: 이벤트 루프가 응답하면 200, 재시도로 복구할 수 없는 초기화 실패면 503 (재시작 필요)"""
+    if readiness.fatal_error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": readiness.fatal_error})
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness_probe():
+    """준비 프로브: 임베딩 모델 워밍업, 컬렉션 로드(청크 수), LLM 연결이 모두 확인되면 200, 아니면 503"""
+    snapshot = readiness.snapshot()
+    if not snapshot["ready"]:
+        return JSONResponse(status_code=503, content=snapshot, headers={"Retry-After": _RETRY_AFTER_SECONDS})
+    return snapshot
+
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """쿼리 처리 엔드포인트"""
     global agent
     
-    if agent is None:
+    if agent is None or not readiness.ready:
         raise HTTPException(
             status_code=503, 
-            detail="Agent가 초기화되지 않았습니다."
+            detail=_not_ready_detail(),
+            headers={"Retry-After": _RETRY_AFTER_SECONDS}
         )
     
     if not request.query.strip():
@@ -97,51 +392,17 @@ async def process_query(request: QueryRequest):
             detail="쿼리가 비어있습니다."
         )
     
+    # session_id를 보내지 않은 요청은 대화 내역을 읽거나 저장하지 않음 (응답의 새 ID로 다음 요청부터 세션 시작)
+    session_id = request.session_id or uuid.uuid4().hex
+
     try:
         logger.info(f"쿼리 처리 시작: {request.query[:50]}...")
         
         # Agent로 쿼리 처리
-        result = agent.process_query(request.query)
-        logger.info(f"에이전트 원본 결과: {result}")
-
-        # 1. tool_calls 데이터 가공
-        simplified_tool_calls = []
-        original_tool_calls = result.get('tool_calls', [])
-        for call in original_tool_calls:
-            source_file = None
-            if call.get('result') and call['result'].get('results'):
-                results_list = call['result']['results']
-                if results_list and results_list[0].get('source_file'):
-                    source_file = results_list[0].get('source_file')
-            
-            # Pydantic 모델 객체로 만들어서 추가
-            simplified_tool_calls.append(ToolCall(
-                tool=call.get('tool'),
-                source_file=source_file
-            ))
-
-        # 2. 'answer' 필드 가공 (깨짐 문제 해결)
-        final_answer = result.get('answer', '')
-
-        # 'answer'가 JSON 문자열일 경우, 내용물만 추출
-        try:
-            answer_data = json.loads(final_answer)
-            if 'content' in answer_data:
-                final_answer = answer_data['content']
-        except (json.JSONDecodeError, TypeError):
-            # 파싱 실패 시 원본 텍스트 사용
-            pass
-
-        # 최종적으로 가공된 데이터로 응답 모델 생성
-        response = QueryResponse(
-            answer=final_answer, # 깨끗해진 answer 사용
-            query=request.query,
-            tool_calls=simplified_tool_calls,
-            iterations=result.get('iterations', 1),
-            success=True
-        )
+        result = await agent.process_query(request.query, request.session_id)
+        response = _build_query_response(request.query, session_id, result)
         
-        logger.info(f"쿼리 처리 완료: {response.iterations}회 반복")
+        logger.info(f"쿼리 처리 완료: {response.iterations}회 반복, 토큰 {response.usage.total_tokens if response.usage else 0}개")
         return response
         
     except Exception as e:
@@ -151,6 +412,137 @@ async def process_query(request: QueryRequest):
             detail=f"쿼리 처리 중 오류가 발생했습니다: {str(e)}"
         )
 
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """쿼리 처리 스트리밍 엔드포인트 (Server-Sent Events)"""
+    global agent
+
+    if agent is None or not readiness.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=_not_ready_detail(),
+            headers={"Retry-After": _RETRY_AFTER_SECONDS}
+        )
+
+    if not request.query.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="쿼리가 비어있습니다."
+        )
+
+    # session_id를 보내지 않은 요청은 대화 내역을 읽거나 저장하지 않음 (응답의 새 ID로 다음 요청부터 세션 시작)
+    session_id = request.session_id or uuid.uuid4().hex
+
+    async def event_stream():
+        logger.info(f"스트리밍 쿼리 처리 시작: {request.query[:50]}...")
+        try:
+            async for event in agent.run_query(request.query, request.session_id, stream=True):
+                name = event.pop("event")
+                if name == "done":
+                    response = _build_query_response(request.query, session_id, event["result"])
+                    logger.info(f"스트리밍 쿼리 처리 완료: {response.iterations}회 반복")
+                    yield _sse_frame("done", response.model_dump())
+                else:
+                    yield _sse_frame(name, event)
+        except Exception as e:
+            logger.error(f"스트리밍 쿼리 처리 오류: {e}")
+            yield _sse_frame("error", {"detail": f"쿼리 처리 중 오류가 발생했습니다: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def process_query_batch(request: Request, concurrency: Optional[int] = Query(None, ge=1)):
+    """
+    일괄 쿼리 처리 엔드포인트.
+    JSONL 본문({"id": ..., "query": "..."} 한 줄에 하나)을 받아 끝나는 순서대로 결과를 JSONL로 스트리밍하고,
+    마지막 줄에 요약({"summary": {...}})을 보냄
+    """
+    global agent
+
+    if agent is None or not readiness.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=_not_ready_detail(),
+            headers={"Retry-After": _RETRY_AFTER_SECONDS}
+        )
+
+    body = (await request.body()).decode("utf-8")
+    items, errors = parse_batch_lines(body.splitlines())
+    if not items and not errors:
+        raise HTTPException(
+            status_code=400,
+            detail="처리할 쿼리가 없습니다."
+        )
+    concurrency = concurrency or max(1, int(os.getenv("BATCH_CONCURRENCY", 8)))
+
+    async def result_stream():
+        started = time.perf_counter()
+        summary = {"total": len(items) + len(errors), "succeeded": 0, "failed": len(errors), "duplicates": 0, "cached": 0,
+                   "llm_calls": 0, "total_tokens": 0}
+        for error in errors:
+            yield json.dumps(error, ensure_ascii=False) + "\n"
+        async for item, result, duplicate in run_batch(agent, items, concurrency=concurrency):
+            try:
+                response = _build_query_response(item.query, None, result)
+                line = {"index": item.index, "id": item.id, "duplicate": duplicate, **response.model_dump()}
+                summary["succeeded"] += 1
+                summary["duplicates"] += int(duplicate)
+                summary["cached"] += int(response.cached)
+                if response.usage and not duplicate:
+                    summary["llm_calls"] += response.usage.llm_calls
+                    summary["total_tokens"] += response.usage.total_tokens
+            except Exception as e:
+                logger.error(f"일괄 쿼리 결과 처리 오류: {e}")
+                line = {"index": item.index, "id": item.id, "query": item.query, "success": False, "error": str(e)}
+                summary["failed"] += 1
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        summary["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+        logger.info(f"일괄 처리 완료: {summary}")
+        yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+def _sse_frame(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _build_query_response(query: str, session_id: str, result: Dict[str, Any]) -> QueryResponse:
+    """에이전트 결과를 API 응답 모델로 가공"""
+    with span("postprocess"):
+        return _shape_query_response(query, session_id, result)
+
+def _shape_query_response(query: str, session_id: str, result: Dict[str, Any]) -> QueryResponse:
+    logger.debug(f"에이전트 원본 결과: {str(result)[:500]}")
+
+    # 1. tool_calls 데이터 가공
+    simplified_tool_calls = [
+        ToolCall(tool=call.get('tool'), source_file=HarborAgentTools.primary_source_file(call.get('result')))
+        for call in result.get('tool_calls', [])
+    ]
+
+    # 2. 'answer'는 GeminiClient가 응답 JSON에서 이미 content만 추출한 텍스트
+    final_answer = result.get('answer', '')
+
+    # 최종적으로 가공된 데이터로 응답 모델 생성
+    return QueryResponse(
+        answer=final_answer,
+        query=query,
+        tool_calls=simplified_tool_calls,
+        iterations=result.get('iterations', 1),
+        success=True,
+        session_id=session_id,
+        cached=result.get('cached', False),
+        usage=TokenUsage(**result['usage']) if result.get('usage') else None
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 텍스트 형식 지표"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/status")
 async def get_status():
     """서버 상태 정보"""
@@ -158,12 +550,30 @@ async def get_status():
     
     return {
         "server": "running",
+        "worker_pid": os.getpid(),
         "agent_initialized": agent is not None,
+        "readiness": readiness.snapshot(),
+        "sessions": agent.conversations.stats() if agent is not None else None,
+        "answer_cache": agent.answer_cache.stats() if agent is not None and agent.answer_cache else None,
+        "embedding_model": agent.db_manager.embedding_model if agent is not None else None,
+        "retrieval_cache": agent.db_manager.get_cache_stats() if agent is not None else None,
+        "retrieval_timings": agent.db_manager.get_timings() if agent is not None else None,
+        "vector_backend": agent.db_manager.vector_backend if agent is not None else None,
+        "structured_index": agent.db_manager.structured_index.stats() if agent is not None and agent.db_manager.structured_index else None,
+        "llm": agent.gemini.get_stats() if agent is not None else None,
+        "fast_path": {"enabled": agent.fast_path, **agent.fast_path_stats} if agent is not None else None,
+        "context_budget": agent.context_budgeter.stats() if agent is not None and agent.context_budgeter else None,
+        "context_expansion": agent.db_manager.context_expander.cache_stats() if agent is not None and agent.db_manager.context_expander else None,
         "endpoints": [
             {"path": "/", "method": "GET", "description": "루트"},
             {"path": "/health", "method": "GET", "description": "헬스 체크"},
+            {"path": "/livez", "method": "GET", "description": "활성 프로브"},
+            {"path": "/readyz", "method": "GET", "description": "준비 프로브 (단계별 상태)"},
             {"path": "/query", "method": "POST", "description": "쿼리 처리"},
+            {"path": "/query/stream", "method": "POST", "description": "쿼리 처리 (SSE 스트리밍)"},
+            {"path": "/query/batch", "method": "POST", "description": "일괄 쿼리 처리 (JSONL 입력/출력)"},
             {"path": "/status", "method": "GET", "description": "상태 정보"},
+            {"path": "/metrics", "method": "GET", "description": "Prometheus 지표"},
             {"path": "/docs", "method": "GET", "description": "API 문서"}
         ]
     }
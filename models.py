@@ -4,11 +4,13 @@ from typing import Optional, List, Dict, Any
 class QueryRequest(BaseModel):
     """쿼리 요청 모델"""
     query: str = Field(..., description="처리할 쿼리", min_length=1)
+    session_id: Optional[str] = Field(None, description="대화 세션 ID (생략 시 대화 내역 없이 처리하고, 이어서 쓸 새 세션 ID를 응답에 포함)", max_length=128)
     
     class Config:
         json_schema_extra = {
             "example": {
-                "query": "컨테이너 하역 시 안전 규정에 대해 알려주세요"
+                "query": "컨테이너 하역 시 안전 규정에 대해 알려주세요",
+                "session_id": "operator-42"
             }
         }
 
@@ -16,6 +18,13 @@ class ToolCall(BaseModel):
     tool: str
     source_file: Optional[str] = None
 
+class TokenUsage(BaseModel):
+    """요청 한 건의 LLM 호출 수와 토큰 사용량"""
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
 # 최종 응답을 위한 모델
 class QueryResponse(BaseModel):
     answer: str
@@ -23,6 +32,9 @@ class QueryResponse(BaseModel):
     tool_calls: List[ToolCall]
     iterations: int
     success: bool
+    session_id: Optional[str] = None
+    cached: bool = False
+    usage: Optional[TokenUsage] = None
     
 # class ToolCall(BaseModel):
 #     """도구 호출 정보 모델"""
@@ -66,13 +78,17 @@ class HealthResponse(BaseModel):
     status: str = Field(..., description="서버 상태")
     agent_status: str = Field(..., description="Agent 상태")
     api_version: str = Field(..., description="API 버전")
+    stages: Optional[Dict[str, str]] = Field(None, description="초기화 단계별 상태 (embedding, collections, llm)")
+    error: Optional[str] = Field(None, description="재시작이 필요한 초기화 실패 내용")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "status": "healthy",
                 "agent_status": "ready",
-                "api_version": "1.0.0"
+                "api_version": "1.0.0",
+                "stages": {"embedding": "ready", "collections": "ready", "llm": "ready"},
+                "error": None
             }
         }
 
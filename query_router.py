@@ -0,0 +1,44 @@
+import re
+from typing import Dict, List
+
+from structured_index import parse_article_reference
+
+# 질문 유형 판별용 키워드 (법률 조문 질의 vs 업무 절차/매뉴얼 질의)
+_LEGAL_KEYWORDS = (
+    "법", "법률", "법령", "시행령", "시행규칙", "조문", "규정", "규칙", "고시", "조항",
+    "위반", "벌칙", "과태료", "처벌", "허가", "승인", "신고", "의무", "정의", "기준",
+)
+_MANUAL_KEYWORDS = (
+    "절차", "방법", "매뉴얼", "지침", "가이드", "순서", "대응", "조치", "점검", "작업",
+    "안전수칙", "어떻게", "요령", "대처", "실무", "사고", "비상", "훈련",
+)
+# "제12조", "제3항" 같은 조문 번호 표기는 법률 질의로 강하게 판단
+_ARTICLE_PATTERN = re.compile(r'제\s*\d+\s*(조|항|호|장|절)')
+
+
+class QueryRouter:
+    """LLM 호출 없이 질문을 검색할 컬렉션으로 분류하는 키워드 라우터"""
+
+    def __init__(self, n_results: int = 2):
+        self.n_results = n_results
+
+    def route(self, query: str) -> List[Dict]:
+        """
+        질문에 맞는 검색 도구 호출 목록 반환 (판단이 어려우면 두 컬렉션 모두 검색).
+        "항만법 제23조"처럼 조 번호가 있는 법률 질의는 벡터 검색 대신 조문 직접 조회
+        """
+        legal_score = sum(1 for k in _LEGAL_KEYWORDS if k in query) + 2 * len(_ARTICLE_PATTERN.findall(query))
+        manual_score = sum(1 for k in _MANUAL_KEYWORDS if k in query)
+
+        tool_names = []
+        if legal_score >= manual_score:
+            tool_names.append("search_legal_documents")
+        if manual_score >= legal_score:
+            tool_names.append("search_manual_documents")
+        calls = [{"function_name": name, "arguments": {"query": query, "n_results": self.n_results}} for name in tool_names]
+        reference = parse_article_reference(query) if "search_legal_documents" in tool_names else None
+        if reference is not None:
+            calls[0] = {"function_name": "lookup_legal_article",
+                        "arguments": {"law": reference.law, "article": reference.article, "paragraph": reference.paragraph,
+                                      "query": query}}
+        return calls
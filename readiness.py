@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# embedding: 임베딩 모델 로드/워밍업, collections: 컬렉션 열기와 청크 수 확인, llm: Gemini API 연결 확인
+READINESS_STAGES = ("embedding", "collections", "llm")
+STAGE_PENDING = "pending"
+STAGE_READY = "ready"
+STAGE_FAILED = "failed"
+
+
+class ReadinessState:
+    """
+    백그라운드 초기화의 단계별 상태. 필수 단계가 모두 ready여야 /readyz가 200을 반환하고 질의를 받음.
+    실패한 단계는 다시 시도하고, 설정 오류처럼 다시 시도해도 소용없는 실패는 fatal_error로 기록함
+    """
+
+    def __init__(self, required: Iterable[str] = READINESS_STAGES):
+        self.required = tuple(required)
+        self.started_at = time.time()
+        self.fatal_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stages = {name: {"status": STAGE_PENDING, "detail": None, "attempts": 0, "seconds": None}
+                        for name in READINESS_STAGES}
+
+    def mark(self, stage: str, status: str, detail=None):
+        """단계 결과 기록 (seconds: 서버 시작부터 마지막 기록까지 걸린 시간)"""
+        with self._lock:
+            entry = self._stages[stage]
+            changed = entry["status"] != status
+            entry.update(status=status, detail=detail, attempts=entry["attempts"] + 1,
+                         seconds=round(time.time() - self.started_at, 2))
+        if status == STAGE_READY:
+            logger.info(f"준비 단계 완료: {stage} ({detail})")
+        elif changed:
+            logger.warning(f"준비 단계 {status}: {stage} ({detail})")
+
+    def fail(self, error: str):
+        with self._lock:
+            self.fatal_error = error
+        logger.error(f"초기화 실패 - 재시작이 필요합니다: {error}")
+
+    def stage_status(self, stage: str) -> str:
+        with self._lock:
+            return self._stages[stage]["status"]
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self.fatal_error is None and all(self._stages[s]["status"] == STAGE_READY for s in self.required)
+
+    def status(self) -> str:
+        """ready / initializing(아직 확인 전인 단계가 있음) / not_ready(실패한 단계를 다시 시도 중) / failed"""
+        with self._lock:
+            if self.fatal_error is not None:
+                return "failed"
+            statuses = [self._stages[s]["status"] for s in self.required]
+        if all(s == STAGE_READY for s in statuses):
+            return "ready"
+        return "not_ready" if STAGE_FAILED in statuses else "initializing"
+
+    def snapshot(self) -> Dict:
+        status = self.status()
+        with self._lock:
+            return {
+                "ready": status == "ready",
+                "status": status,
+                "uptime_seconds": round(time.time() - self.started_at, 2),
+                "required": list(self.required),
+                "stages": {name: dict(entry) for name, entry in self._stages.items()},
+                "error": self.fatal_error,
+            }
@@ -0,0 +1,27 @@
+import logging
+from typing import List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """질의-문서 쌍을 함께 인코딩하는 CPU 크로스 인코더로 상위 후보를 재정렬 (sentence-transformers 필요)"""
+
+    def __init__(self, model_name: str, device: str = "cpu", max_candidates: int = 10, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.model = CrossEncoder(model_name, device=device, max_length=max_length)
+
+    def rerank(self, query: str, results: Sequence) -> List:
+        """상위 max_candidates개 후보만 점수를 매겨 다시 정렬 (나머지는 원래 순서대로 뒤에 둠)"""
+        candidates, rest = list(results[:self.max_candidates]), list(results[self.max_candidates:])
+        if len(candidates) <= 1:
+            return candidates + rest
+        scores = self.model.predict([(query, r.content) for r in candidates])
+        ranked = sorted(zip(candidates, scores), key=lambda item: float(item[1]), reverse=True)
+        return [r for r, _ in ranked] + rest
+
+    def warm_up(self):
+        self.model.predict([("항만 안전 규정", "워밍업 문장")])
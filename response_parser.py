@@ -0,0 +1,225 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+# strict=False: 모델이 문자열 안에 줄바꿈 등 제어 문자를 그대로 넣는 경우 허용
+_DECODER = json.JSONDecoder(strict=False)
+_CLOSERS = {'{': '}', '[': ']'}
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class ContentStreamParser:
+    """
+    스트리밍으로 도착하는 JSON 응답 봉투에서 최상위 "content" 문자열 값만 증분 디코딩하는 파서.
+    응답이 JSON이 아니면(모델이 형식을 무시한 경우) 받은 텍스트를 그대로 내보냄
+    """
+
+    def __init__(self, field: str = "content"):
+        self.field = field
+        self._mode = "prefix"  # prefix → json | plain
+        self._prefix = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape: Optional[str] = None  # 처리 중인 이스케이프 시퀀스 ('\\' 이후 문자들)
+        self._high_surrogate: Optional[str] = None  # 하위 서로게이트(\uDCxx)를 기다리는 상위 서로게이트
+        self._string_chars: List[str] = []
+        self._expect_key = False
+        self._last_key: Optional[str] = None
+        self._value_key: Optional[str] = None  # 지금 읽는 값이 속한 키
+        self._emitting = False
+
+    def feed(self, chunk: str) -> str:
+        """청크를 받아 새로 디코딩된 content 문자열 조각을 반환"""
+        if self._mode == "plain":
+            return chunk
+        if self._mode == "prefix":
+            self._prefix += chunk
+            stripped = self._prefix.lstrip()
+            brace = stripped.find('{')
+            if brace == -1:
+                # 코드 펜스(```json)는 JSON 시작 전까지 기다리고, 그 외 텍스트는 일반 텍스트로 간주
+                if stripped and not stripped.startswith("`"):
+                    self._mode = "plain"
+                    return self._prefix
+                return ""
+            if stripped[:brace].strip() not in ("", "```", "```json"):
+                self._mode = "plain"
+                return self._prefix
+            self._mode = "json"
+            chunk = stripped[brace:]
+
+        out: List[str] = []
+        for ch in chunk:
+            if self._in_string:
+                self._consume_string_char(ch, out)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_chars = []
+                self._emitting = (not self._expect_key and self._depth == 1 and self._value_key == self.field)
+            elif ch == '{':
+                self._depth += 1
+                self._expect_key = True
+            elif ch == '[':
+                self._depth += 1
+                self._expect_key = False
+            elif ch in '}]':
+                self._depth -= 1
+            elif ch == ',':
+                self._expect_key = self._depth >= 1
+                self._value_key = None
+            elif ch == ':':
+                self._expect_key = False
+                self._value_key = self._last_key
+        return "".join(out)
+
+    def _consume_string_char(self, ch: str, out: List[str]):
+        if self._escape is not None:
+            self._escape += ch
+            if self._escape[0] == 'u':
+                if len(self._escape) < 5:
+                    return
+                try:
+                    decoded = chr(int(self._escape[1:], 16))
+                except ValueError:
+                    decoded = self._escape
+            else:
+                decoded = _SIMPLE_ESCAPES.get(self._escape, self._escape)
+            self._escape = None
+            self._append_decoded(decoded, out)
+            return
+        if ch == '\\':
+            self._escape = ""
+        elif ch == '"':
+            self._flush_surrogate(out)
+            self._in_string = False
+            if self._expect_key and self._depth == 1:
+                self._last_key = "".join(self._string_chars)
+            self._emitting = False
+        else:
+            self._append_decoded(ch, out)
+
+    def _append_decoded(self, text: str, out: List[str]):
+        # BMP 밖 문자(이모지 등)는 \uD83D\uDE00처럼 서로게이트 두 개로 오므로 상위 서로게이트를 잡아 두었다가 합쳐서 내보냄.
+        # 짝이 없는 서로게이트는 UTF-8로 인코딩되지 않아 SSE 프레임을 깨므로 U+FFFD로 바꿈
+        if len(text) == 1 and '\udc00' <= text <= '\udfff' and self._high_surrogate is not None:
+            text = (self._high_surrogate + text).encode("utf-16-le", "surrogatepass").decode("utf-16-le")
+            self._high_surrogate = None
+            self._append(text, out)
+            return
+        self._flush_surrogate(out)
+        if len(text) == 1 and '\ud800' <= text <= '\udbff':
+            self._high_surrogate = text
+        elif len(text) == 1 and '\udc00' <= text <= '\udfff':
+            self._append('\ufffd', out)
+        else:
+            self._append(text, out)
+
+    def _flush_surrogate(self, out: List[str]):
+        if self._high_surrogate is not None:
+            self._high_surrogate = None
+            self._append('\ufffd', out)
+
+    def _append(self, text: str, out: List[str]):
+        if self._emitting:
+            out.append(text)
+        elif self._expect_key:
+            self._string_chars.append(text)
+
+
+def parse_json_object(text: str) -> Tuple[Optional[Dict], bool]:
+    """
+    응답 텍스트의 첫 JSON 객체를 한 번의 디코딩으로 파싱 (앞뒤 코드 펜스/설명 문장은 무시).
+    실패하면 잘림/끝 쉼표 등을 로컬에서 고쳐 한 번 더 시도. (객체, 복구 여부)를 반환하고 실패 시 (None, False)
+    """
+    start = text.find('{')
+    if start == -1:
+        return None, False
+    try:
+        parsed, _ = _DECODER.raw_decode(text, start)
+        return (parsed, False) if isinstance(parsed, dict) else (None, False)
+    except json.JSONDecodeError:
+        pass
+    try:
+        parsed, _ = _DECODER.raw_decode(repair_json(text[start:]))
+    except json.JSONDecodeError:
+        return None, False
+    return (parsed, True) if isinstance(parsed, dict) else (None, False)
+
+
+def repair_json(fragment: str) -> str:
+    """
+    '{'로 시작하는 깨진 JSON 조각을 한 번 훑으며 고침.
+    닫는 괄호 앞의 쉼표 제거, 최대 토큰에서 잘린 문자열/괄호 닫기, 값 없이 끝난 키에 null 채우기
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escape = False
+    for ch in fragment:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in '}]':
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        out.append(ch)
+
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    while stack:
+        _strip_trailing_comma(out)
+        if out and out[-1] == ':':
+            out.append('null')
+        out.append(stack.pop())
+    return "".join(out)
+
+
+def _strip_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+def build_response_schema(tools: Optional[List[Dict]] = None) -> Dict:
+    """
+    Gemini JSON 모드용 응답 스키마. 도구가 있으면 tool_calls(도구 이름 enum, 모든 도구 매개변수의 합집합)를 허용하고,
+    없으면 최종 답변(content)만 허용
+    """
+    properties: Dict[str, Dict] = {"reasoning": {"type": "string"}, "content": {"type": "string"}}
+    if not tools:
+        return {"type": "object", "properties": properties, "required": ["content"]}
+    arguments: Dict[str, Dict] = {}
+    for tool in tools:
+        for name, info in tool["function"].get("parameters", {}).get("properties", {}).items():
+            arguments.setdefault(name, {"type": info.get("type", "string"), "description": info.get("description", "")})
+    properties["tool_calls"] = {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "function_name": {"type": "string", "format": "enum",
+                                  "enum": [tool["function"]["name"] for tool in tools]},
+                "arguments": {"type": "object", "properties": arguments},
+            },
+            "required": ["function_name", "arguments"],
+        },
+    }
+    return {"type": "object", "properties": properties, "required": ["reasoning"]}
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import importlib.util
 import os
 import sys
 from pathlib import Path
@@ -26,13 +27,26 @@ def main():
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", 8000))
     log_level = os.getenv("LOG_LEVEL", "info").lower()
+    workers = int(os.getenv("WORKERS", 1))
     
     print(f"🚀 Harbor Agent API 서버 시작")
     print(f"📍 주소: http://{host}:{port}")
     print(f"📚 API 문서: http://{host}:{port}/docs")
     print(f"🔍 헬스체크: http://{host}:{port}/health")
+    print(f"🩺 준비 상태: http://{host}:{port}/readyz")
+    if workers > 1:
+        print(f"👷 워커 수: {workers}")
     print("=" * 50)
     
+    if workers > 1:
+        # 여러 워커가 요청 한도/답변 캐시/세션을 공유하도록 공유 상태 파일 지정
+        os.environ.setdefault("SHARED_STATE_DB_PATH", "./harbor_state.db")
+        if os.name != "nt" and importlib.util.find_spec("gunicorn") is not None:
+            # gunicorn이 모델을 마스터에서 한 번 로드한 뒤 워커를 fork (gunicorn.conf.py 참고)
+            config_path = str(Path(__file__).resolve().parent / "gunicorn.conf.py")
+            os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", config_path, "main:app"])
+        print("⚠️ gunicorn을 사용할 수 없어 uvicorn 다중 워커로 실행합니다. (워커마다 모델을 따로 로드)")
+    
     # 서버 실행
     try:
         uvicorn.run(
@@ -40,7 +54,8 @@ def main():
             host=host,
             port=port,
             reload=False,
-            log_level=log_level
+            log_level=log_level,
+            workers=workers if workers > 1 else None
         )
     except KeyboardInterrupt:
         print("\n👋 서버를 종료합니다.")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from dotenv import load_dotenv
+
+def main():
+    """JSONL 질문 파일을 실행 중인 서버의 /query/batch로 보내고 결과를 JSONL로 저장"""
+    load_dotenv()
+
+    default_server = f"http://{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', 8000)}"
+    parser = argparse.ArgumentParser(description="Harbor Agent 일괄 질의 실행")
+    parser.add_argument("input", help='입력 JSONL 파일 (한 줄에 {"id": ..., "query": "..."})')
+    parser.add_argument("-o", "--output", help="결과 JSONL 파일 (기본값: <입력 파일>.results.jsonl)")
+    parser.add_argument("--server", default=default_server, help=f"API 서버 주소 (기본값: {default_server})")
+    parser.add_argument("--concurrency", type=int, help="서버에서 동시에 처리할 질의 수 (기본값: 서버의 BATCH_CONCURRENCY)")
+    args = parser.parse_args()
+
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    with open(args.input, "rb") as f:
+        payload = f.read()
+
+    url = f"{args.server.rstrip('/')}/query/batch"
+    if args.concurrency:
+        url += f"?concurrency={args.concurrency}"
+    request = urllib.request.Request(url, data=payload, method="POST",
+                                     headers={"Content-Type": "application/x-ndjson"})
+
+    total = sum(1 for line in payload.splitlines() if line.strip())
+    print(f"🚀 일괄 질의 시작: {total}건 → {url}")
+    print(f"💾 결과 파일: {output_path}")
+    print("=" * 50)
+
+    started = time.time()
+    done = 0
+    summary = None
+    try:
+        with urllib.request.urlopen(request, timeout=None) as response, open(output_path, "w", encoding="utf-8") as out:
+            for raw_line in response:
+                line = raw_line.decode("utf-8").strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if "summary" in record:
+                    summary = record["summary"]
+                    continue
+                out.write(line + "\n")
+                done += 1
+                if done % 50 == 0 or done == total:
+                    print(f"⏳ {done}/{total} 완료 ({time.time() - started:.0f}초)")
+    except urllib.error.HTTPError as e:
+        print(f"❌ 서버 오류 {e.code}: {e.read().decode('utf-8', errors='replace')}")
+        sys.exit(1)
+    except urllib.error.URLError as e:
+        print(f"❌ 서버에 연결할 수 없습니다: {e.reason}")
+        print("📝 run.py로 서버를 먼저 실행하세요.")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print(f"\n👋 중단했습니다. ({done}/{total}건 저장됨)")
+        sys.exit(1)
+
+    print("=" * 50)
+    if summary:
+        print(f"✅ 완료: 성공 {summary['succeeded']}건, 실패 {summary['failed']}건, "
+              f"중복 {summary['duplicates']}건, 캐시 {summary['cached']}건")
+        print(f"📊 LLM 호출 {summary['llm_calls']}회, 토큰 {summary['total_tokens']}개, {summary['elapsed_seconds']}초")
+    else:
+        print(f"⚠️ 요약 없이 종료되었습니다. ({done}/{total}건 저장됨)")
+
+if __name__ == "__main__":
+    main()
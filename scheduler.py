@@ -0,0 +1,461 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, closing
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 숫자가 작을수록 먼저 처리 (대화형 요청이 일괄 처리 요청보다 우선)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class SchedulerDeadlineExceeded(Exception):
+    """대기열에서 기한 안에 실행 슬롯을 받지 못한 경우"""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """업스트림의 429(ResourceExhausted) 오류 여부"""
+    return "429" in str(error) or type(error).__name__ == "ResourceExhausted"
+
+
+class TokenBucket:
+    """분당 한도를 초당 보충 속도로 환산한 토큰 버킷 (한도가 0 이하이면 제한 없음)"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount만큼 꺼내려면 기다려야 하는 시간(초)"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # 버킷 용량보다 큰 요청은 가득 찼을 때 통과시켜 영원히 막히지 않게 함
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def consume(self, amount: float, now: float):
+        """토큰 차감. 실제 사용량 보정 시에는 음수(빚)가 될 수 있음"""
+        if self.unlimited:
+            return
+        self._refill(now)
+        self.tokens -= amount
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class LocalRateLimiter:
+    """한 프로세스 안에서만 유지되는 RPM/TPM 버킷과 429 냉각 시각"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._cooldown_until = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """요청 1건과 tokens개를 예약. 예약했으면 0, 아니면 다시 시도할 때까지의 대기 시간(초)"""
+        now = time.monotonic()
+        delay = max(self._cooldown_until - now,
+                    self._requests.wait_time(1, now),
+                    self._tokens.wait_time(tokens, now))
+        if delay > 0:
+            return delay
+        self._requests.consume(1, now)
+        self._tokens.consume(tokens, now)
+        return 0.0
+
+    def adjust_tokens(self, delta: int):
+        self._tokens.consume(delta, time.monotonic())
+
+    def release(self, tokens: int):
+        """예약했지만 보내지 않은 요청 1건과 tokens개를 되돌림"""
+        now = time.monotonic()
+        self._requests.consume(-1, now)
+        self._tokens.consume(-tokens, now)
+
+    def pause(self, seconds: float):
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def cooling_down(self) -> bool:
+        return self._cooldown_until > time.monotonic()
+
+    def close(self):
+        pass
+
+
+class SQLiteRateLimiter:
+    """
+    여러 워커 프로세스가 같은 API 키 한도를 나눠 쓰도록 SQLite 파일에 둔 RPM/TPM 버킷과 429 냉각 시각.
+    프로세스 간에 시각을 맞추려고 벽시계(time.time)를 쓰고, 예약은 BEGIN IMMEDIATE 트랜잭션으로 원자적으로 처리.
+    연결은 작업마다 새로 열어 닫으므로 어느 스레드에서 만들고 호출해도 됨 (sqlite3 연결은 만든 스레드에서만 사용 가능).
+    파일 잠금을 최대 5초까지 기다릴 수 있어 GeminiScheduler는 이벤트 루프가 아닌 전용 스레드에서 호출함
+    """
+
+    def __init__(self, db_path: str, rpm: int, tpm: int):
+        self.db_path = db_path
+        # 버킷 이름 -> 분당 한도 (0 이하이면 제한 없음)
+        self._limits = {"requests": rpm, "tokens": tpm}
+        # 마지막으로 확인한 공유 냉각 종료 시각 (상태 조회에서 파일을 읽지 않도록 보관)
+        self._cooldown_until = 0.0
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limit_state (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+
+    def reserve(self, tokens: int) -> float:
+        with _ImmediateTransaction(self._connect()) as (conn, state):
+            now = time.time()
+            amounts = {"requests": 1, "tokens": tokens}
+            levels = {name: self._level(state, name, now) for name in self._limits}
+            self._cooldown_until = state.get("cooldown", (0.0, now))[0]
+            delay = self._cooldown_until - now
+            for name, per_minute in self._limits.items():
+                if per_minute > 0:
+                    # 버킷 용량보다 큰 요청은 가득 찼을 때 통과시켜 영원히 막히지 않게 함
+                    needed = min(amounts[name], per_minute) - levels[name]
+                    delay = max(delay, needed * 60.0 / per_minute)
+            if delay > 0:
+                return delay
+            for name, per_minute in self._limits.items():
+                if per_minute > 0:
+                    self._write(conn, name, levels[name] - amounts[name], now)
+            return 0.0
+
+    def adjust_tokens(self, delta: int):
+        if self._limits["tokens"] <= 0:
+            return
+        try:
+            with _ImmediateTransaction(self._connect()) as (conn, state):
+                now = time.time()
+                self._write(conn, "tokens", self._level(state, "tokens", now) - delta, now)
+        except sqlite3.Error as e:
+            logger.warning(f"공유 TPM 보정 실패: {e}")
+
+    def release(self, tokens: int):
+        """예약했지만 보내지 않은 요청 1건과 tokens개를 되돌림 (버킷 용량은 넘지 않음)"""
+        try:
+            with _ImmediateTransaction(self._connect()) as (conn, state):
+                now = time.time()
+                amounts = {"requests": 1, "tokens": tokens}
+                for name, per_minute in self._limits.items():
+                    if per_minute > 0:
+                        self._write(conn, name, min(per_minute, self._level(state, name, now) + amounts[name]), now)
+        except sqlite3.Error as e:
+            logger.warning(f"공유 요청 한도 반납 실패: {e}")
+
+    def pause(self, seconds: float):
+        self._cooldown_until = max(self._cooldown_until, time.time() + seconds)
+        try:
+            with _ImmediateTransaction(self._connect()) as (conn, state):
+                now = time.time()
+                self._cooldown_until = max(state.get("cooldown", (0.0, now))[0], self._cooldown_until)
+                self._write(conn, "cooldown", self._cooldown_until, now)
+        except sqlite3.Error as e:
+            logger.warning(f"공유 429 냉각 시각 기록 실패: {e}")
+
+    def cooling_down(self) -> bool:
+        return self._cooldown_until > time.time()
+
+    def close(self):
+        pass
+
+    def _level(self, state: Dict[str, Tuple[float, float]], name: str, now: float) -> float:
+        """저장된 잔량에 마지막 갱신 이후 보충량을 더한 현재 잔량 (기록이 없으면 가득 찬 상태)"""
+        per_minute = self._limits[name]
+        value, updated = state.get(name, (per_minute, now))
+        return min(per_minute, value + (now - updated) * per_minute / 60.0)
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, name: str, value: float, now: float):
+        conn.execute("INSERT OR REPLACE INTO rate_limit_state (name, value, updated) VALUES (?, ?, ?)",
+                           (name, value, now))
+
+
+class _ImmediateTransaction:
+    """쓰기 잠금을 먼저 잡은 뒤 (연결, 현재 상태)를 넘겨 주는 트랜잭션 (예외 시 롤백, 끝나면 연결을 닫음)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self) -> Tuple[sqlite3.Connection, Dict[str, Tuple[float, float]]]:
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute("SELECT name, value, updated FROM rate_limit_state").fetchall()
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+        return self._conn, {name: (value, updated) for name, value, updated in rows}
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._conn.close()
+        return False
+
+
+@dataclass
+class _SharedCall:
+    """같은 키의 요청들이 함께 기다리는 업스트림 호출 하나와 기다리는 요청 수"""
+    task: asyncio.Task
+    waiters: int = 0
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    deadline: Optional[float] = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class GeminiScheduler:
+    """
+    Gemini 호출 앞단의 스케줄러.
+    RPM/TPM 토큰 버킷과 동시 실행 수를 기준으로 우선순위 대기열에서 실행 슬롯을 배분하고,
+    429 응답 시 지터가 섞인 지수 백오프 동안 전체 발송을 멈춘 뒤 재시도함.
+    같은 키로 동시에 들어온 요청은 업스트림 호출 하나를 공유함
+    """
+
+    def __init__(self, rpm: int = 15, tpm: int = 250000, max_concurrency: int = 8,
+                 max_retries: int = 3, base_backoff: float = 1.0, max_backoff: float = 30.0,
+                 state_db_path: Optional[str] = None):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # state_db_path가 있으면 같은 파일을 쓰는 모든 워커 프로세스가 한도와 429 냉각을 공유
+        self._limiter = SQLiteRateLimiter(state_db_path, rpm, tpm) if state_db_path else LocalRateLimiter(rpm, tpm)
+        # 공유 상태 파일 접근은 스레드 하나에서 순서대로 실행 (429 냉각 기록이 다음 예약보다 먼저 반영되도록)
+        self._limiter_executor = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit-state")
+                                  if state_db_path else None)
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._shared: Dict[Hashable, _SharedCall] = {}
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self.stats_counters = {"dispatched": 0, "coalesced": 0, "retries": 0, "rate_limited": 0,
+                               "expired": 0, "max_queue_depth": 0}
+
+    async def run(self, call: Callable[[], Awaitable[Any]], *, key: Optional[Hashable] = None,
+                  priority: int = PRIORITY_INTERACTIVE, estimated_tokens: int = 0,
+                  timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        슬롯을 받아 call을 실행하고 (결과, 공유 여부)를 반환.
+        key가 같은 요청이 이미 진행 중이면 새로 호출하지 않고 그 결과를 함께 받음.
+        공유 호출은 별도 태스크로 실행하므로 처음 요청한 쪽이 취소되어도 기다리는 요청이 남아 있으면 끝까지 실행하고,
+        기다리는 요청이 모두 취소된 경우에만 취소함
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        if key is None:
+            return await self._execute(call, priority, estimated_tokens, deadline), False
+
+        shared = self._shared.get(key)
+        coalesced = shared is not None
+        if coalesced:
+            self.stats_counters["coalesced"] += 1
+        else:
+            shared = _SharedCall(asyncio.get_running_loop().create_task(
+                self._execute(call, priority, estimated_tokens, deadline)))
+            self._shared[key] = shared
+            shared.task.add_done_callback(lambda task: self._finish_shared(key, shared))
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task), coalesced
+        except asyncio.CancelledError:
+            shared.waiters -= 1
+            if shared.waiters == 0:
+                shared.task.cancel()
+            raise
+
+    async def _execute(self, call: Callable[[], Awaitable[Any]], priority: int, estimated_tokens: int,
+                       deadline: Optional[float]) -> Any:
+        """슬롯을 받아 call을 실행하고, 429이면 백오프 후 재시도"""
+        attempt = 0
+        while True:
+            async with self.slot(priority, estimated_tokens, deadline):
+                try:
+                    return await call()
+                except Exception as e:
+                    if not self.should_retry(e, attempt):
+                        raise
+            attempt += 1
+
+    def _finish_shared(self, key: Hashable, shared: "_SharedCall"):
+        if self._shared.get(key) is shared:
+            del self._shared[key]
+        # 기다리는 쪽이 없을 때 예외 미회수 경고가 나지 않도록 처리
+        if not shared.task.cancelled():
+            shared.task.exception()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE, estimated_tokens: int = 0,
+                   deadline: Optional[float] = None):
+        """대기열에서 실행 슬롯 하나를 받아 블록이 끝날 때까지 점유 (재시도 없음, 스트리밍용)"""
+        await self._acquire(priority, estimated_tokens, deadline)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """429이고 재시도 횟수가 남았으면 전체 발송을 잠시 멈추고 True 반환"""
+        if not is_rate_limit_error(error):
+            return False
+        self.stats_counters["rate_limited"] += 1
+        if attempt >= self.max_retries:
+            return False
+        backoff = min(self.max_backoff, self.base_backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        self._limiter_submit(self._limiter.pause, backoff)
+        self.stats_counters["retries"] += 1
+        logger.warning(f"Gemini 요청 한도 초과 - {backoff:.1f}초 후 재시도 ({attempt + 1}/{self.max_retries})")
+        return True
+
+    def reconcile_tokens(self, estimated: int, actual: int):
+        """실제 사용 토큰과 발송 시 추정치의 차이를 TPM 버킷에 반영"""
+        if actual != estimated:
+            self._limiter_submit(self._limiter.adjust_tokens, actual - estimated)
+
+    def stats(self) -> Dict:
+        waits = sorted(self._waits)
+        return {
+            **self.stats_counters,
+            "queue_depth": len(self._queue),
+            "in_flight": self._in_flight,
+            "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            "max_wait_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "cooling_down": self._limiter.cooling_down(),
+            "shared_state": isinstance(self._limiter, SQLiteRateLimiter),
+        }
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        if self._limiter_executor is not None:
+            self._limiter_executor.shutdown(wait=False)
+        self._limiter.close()
+
+    async def _limiter_call(self, func: Callable, *args) -> Any:
+        """한도 확인을 실행하고 결과를 기다림 (공유 상태 파일이면 전용 스레드에서)"""
+        if self._limiter_executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._limiter_executor, func, *args)
+
+    def _limiter_submit(self, func: Callable, *args):
+        """결과를 기다릴 필요가 없는 한도 기록 (429 냉각, TPM 보정, 예약 반납)"""
+        if self._limiter_executor is None:
+            func(*args)
+        else:
+            self._limiter_executor.submit(func, *args)
+
+    async def _acquire(self, priority: int, estimated_tokens: int, deadline: Optional[float]):
+        self._ensure_dispatcher()
+        now = time.monotonic()
+        ticket = _Ticket(priority, next(self._seq), estimated_tokens, deadline, now,
+                         asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, ticket)
+        self.stats_counters["max_queue_depth"] = max(self.stats_counters["max_queue_depth"], len(self._queue))
+        self._wakeup.set()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            # 슬롯을 받은 직후 취소되었으면 반납
+            if ticket.future.done() and not ticket.future.cancelled() and ticket.future.exception() is None:
+                self._in_flight -= 1
+                self._wakeup.set()
+            ticket.future.cancel()
+            raise
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            delay = await self._dispatch_ready()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_ready(self) -> Optional[float]:
+        """보낼 수 있는 만큼 슬롯을 배분하고, 다음에 다시 확인할 때까지의 대기 시간을 반환"""
+        next_deadline = self._expire(time.monotonic())
+        delay = None
+        while self._queue and self._in_flight < self.max_concurrency:
+            ticket = self._queue[0]
+            if ticket.future.done():
+                heapq.heappop(self._queue)
+                continue
+            try:
+                delay = await self._limiter_call(self._limiter.reserve, ticket.tokens)
+            except sqlite3.Error as e:
+                # 공유 상태 파일이 잠겨 있으면 발송 루프를 멈추지 않고 잠시 뒤 다시 시도
+                logger.warning(f"공유 요청 한도 상태 조회 실패 - 잠시 후 재시도: {e}")
+                delay = 0.5
+            if delay > 0:
+                break
+            delay = None
+            # 예약을 기다리는 사이 더 급한 요청이 들어왔을 수 있으므로 맨 앞이 아니라 예약한 요청을 꺼냄
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            if ticket.future.done():
+                # 예약을 기다리는 사이 취소된 요청은 건너뛰고, 다른 요청(다른 워커 포함)이 쓰도록 예약분을 반납
+                self._limiter_submit(self._limiter.release, ticket.tokens)
+                continue
+            now = time.monotonic()
+            self._in_flight += 1
+            self.stats_counters["dispatched"] += 1
+            self._waits.append(now - ticket.enqueued_at)
+            ticket.future.set_result(None)
+        if next_deadline is not None:
+            now = time.monotonic()
+            delay = min(delay, next_deadline - now) if delay is not None else next_deadline - now
+        return delay
+
+    def _expire(self, now: float) -> Optional[float]:
+        """기한이 지난 대기 요청을 실패 처리하고, 남은 요청 중 가장 이른 기한을 반환"""
+        expired = [t for t in self._queue if t.deadline is not None and t.deadline <= now]
+        if expired:
+            self._queue = [t for t in self._queue if t.deadline is None or t.deadline > now]
+            heapq.heapify(self._queue)
+            for ticket in expired:
+                if not ticket.future.done():
+                    self.stats_counters["expired"] += 1
+                    ticket.future.set_exception(SchedulerDeadlineExceeded("대기 시간 초과"))
+        deadlines = [t.deadline for t in self._queue if t.deadline is not None]
+        return min(deadlines) if deadlines else None
@@ -0,0 +1,221 @@
+import json
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# "항만법 제23조의2 제1항" 같은 조문 참조 (장/조/항 번호는 파서가 메타데이터에 기록한 형식과 같게 정규화)
+_ARTICLE_REF_PATTERN = re.compile(r'제\s*(\d+)\s*조(?:\s*의\s*(\d+))?(?:\s*제?\s*(\d+)\s*항)?')
+# 파일명의 "(법률)(제20123호)(20250422)", "_20250422" 같은 부가 정보
+_FILE_SUFFIX_PATTERN = re.compile(r'\s*(?:[(\[].*|_\d{6,}.*)$')
+_LAW_HINT_STRIP = "「」『』\"'“”‘’"
+_LAW_HINT_PARTICLES = ("에서의", "에서", "상의", "의", "상")
+_LAW_NAME_SUFFIXES = ("시행령", "시행규칙")
+
+
+@dataclass
+class ArticleReference:
+    """질문에서 찾은 조문 참조 (law는 조문 번호 앞 단어로 추정한 법령 이름)"""
+    law: str
+    article: str
+    paragraph: str = ""
+
+
+@dataclass
+class LawVersion:
+    """법령 파일 하나 (같은 법령의 개정본은 시행일로 구분)"""
+    source_file: str
+    law_name: str
+    effective_date: int
+    publication_date: int
+
+
+def _number(main: str, sub: Optional[str]) -> str:
+    return f"{int(main)}의{int(sub)}" if sub else str(int(main))
+
+
+def normalize_structure_number(value) -> str:
+    """'23', '제23조', '23조의2', 23 → 파서 메타데이터 형식('23', '23의2')"""
+    match = re.search(r'(\d+)\s*(?:조|장|항)?(?:\s*의\s*(\d+))?', str(value or ""))
+    return _number(match.group(1), match.group(2)) if match else ""
+
+
+def normalize_law_name(name: str) -> str:
+    return re.sub(r'\s+', '', name or "").strip(_LAW_HINT_STRIP)
+
+
+def law_tier(name: str) -> str:
+    """법령 이름의 단계 ('시행령', '시행규칙', 법률이면 빈 문자열)"""
+    return next((suffix for suffix in _LAW_NAME_SUFFIXES if name.endswith(suffix)), "")
+
+
+def law_name_from_source(source_file: str) -> str:
+    """'항만법(법률)(제20123호)(20250422).pdf', '항만법_20250422.pdf' → '항만법'"""
+    stem = source_file.rsplit(".", 1)[0] if "." in source_file else source_file
+    return _FILE_SUFFIX_PATTERN.sub("", stem).strip() or stem
+
+
+def parse_date(value: Optional[str]) -> Optional[int]:
+    """'2025-04-22', '2025.4.22', '20250422' → 타임스탬프 (비었거나 형식이 다르면 None)"""
+    digits = re.findall(r'\d+', value or "")
+    if len(digits) == 1 and len(digits[0]) == 8:
+        digits = [digits[0][:4], digits[0][4:6], digits[0][6:]]
+    if len(digits) < 3:
+        return None
+    try:
+        return int(datetime(int(digits[0]), int(digits[1]), int(digits[2])).timestamp())
+    except ValueError:
+        return None
+
+
+def format_date(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d") if timestamp else "미상"
+
+
+def parse_article_reference(text: str) -> Optional[ArticleReference]:
+    """
+    질문의 첫 번째 '제N조' 참조와 그 앞 단어(법령 이름 후보)를 추출.
+    법령 이름이 없으면 같은 번호의 조문이 모든 법령에 있어 어느 법령인지 알 수 없으므로 None
+    """
+    match = _ARTICLE_REF_PATTERN.search(text or "")
+    if not match:
+        return None
+    words = text[:match.start()].split()
+    law_words = words[-1:]
+    # "항만법 시행령 제5조"처럼 시행령/시행규칙은 앞 단어까지 법령 이름으로 봄
+    if len(words) >= 2 and words[-1].strip(_LAW_HINT_STRIP) in _LAW_NAME_SUFFIXES:
+        law_words = words[-2:]
+    law = " ".join(law_words).strip(_LAW_HINT_STRIP)
+    for particle in _LAW_HINT_PARTICLES:
+        if law.endswith(particle) and len(law) > len(particle) + 1:
+            law = law[:-len(particle)].strip(_LAW_HINT_STRIP)
+            break
+    if not law:
+        return None
+    return ArticleReference(law=law, article=_number(match.group(1), match.group(2)),
+                            paragraph=str(int(match.group(3))) if match.group(3) else "")
+
+
+class StructuredIndex:
+    """
+    법률 청크 메타데이터(hierarchy_path, effective_date)로 만든 조문 직접 조회 색인.
+    (파일, 조) / (파일, 조, 항) / (파일, 장) → 청크 번호 목록을 딕셔너리로 들고 있어
+    "항만법 제23조" 같은 질문을 임베딩/벡터 검색 없이 찾고, 같은 법령의 여러 개정본 중 기준일에 시행 중인 파일을 고름
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self._articles: Dict[Tuple[str, str], List[int]] = {}
+        self._paragraphs: Dict[Tuple[str, str, str], List[int]] = {}
+        self._chapters: Dict[Tuple[str, str], List[int]] = {}
+        versions: Dict[str, LawVersion] = {}
+
+        for doc_index, metadata in enumerate(metadatas):
+            source_file = metadata.get("source_file")
+            if not source_file:
+                continue
+            if source_file not in versions:
+                versions[source_file] = LawVersion(
+                    source_file=source_file,
+                    law_name=law_name_from_source(source_file),
+                    effective_date=int(metadata.get("effective_date") or 0),
+                    publication_date=int(metadata.get("publication_date") or 0),
+                )
+            try:
+                path = json.loads(metadata.get("hierarchy_path") or "[]")
+            except (TypeError, ValueError):
+                continue
+            levels = dict(part.split(":", 1) for part in path if isinstance(part, str) and ":" in part)
+            # 부칙의 "제1조(시행일)"가 본문 제1조와 섞이지 않도록 부칙/별표 아래 청크는 제외
+            if "appendix" in levels or "attachment" in levels:
+                continue
+            if "chapter" in levels:
+                self._chapters.setdefault((source_file, levels["chapter"]), []).append(doc_index)
+            if "article" in levels:
+                self._articles.setdefault((source_file, levels["article"]), []).append(doc_index)
+                if "paragraph" in levels:
+                    self._paragraphs.setdefault((source_file, levels["article"], levels["paragraph"]), []).append(doc_index)
+
+        # 조문 안의 청크는 문서 순서대로
+        order = lambda i: int(self.metadatas[i].get("chunk_index") or 0)
+        for table in (self._articles, self._paragraphs, self._chapters):
+            for indices in table.values():
+                indices.sort(key=order)
+
+        # 정규화한 법령 이름 → 개정본 목록 (시행일, 공포일 순)
+        self._laws: Dict[str, List[LawVersion]] = {}
+        for version in versions.values():
+            self._laws.setdefault(normalize_law_name(version.law_name), []).append(version)
+        for law_versions in self._laws.values():
+            law_versions.sort(key=lambda v: (v.effective_date, v.publication_date, v.source_file))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000) -> "StructuredIndex":
+        """Chroma 컬렉션의 문서/메타데이터를 페이지 단위로 읽어 색인 생성"""
+        ids, documents, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            offset += len(page["ids"])
+        return cls(ids, documents, metadatas)
+
+    def stats(self) -> Dict:
+        return {"chunks": len(self.ids), "laws": len(self._laws),
+                "files": sum(len(v) for v in self._laws.values()), "articles": len(self._articles)}
+
+    def resolve_law(self, law: str) -> List[str]:
+        """
+        법령 이름(일부)에 해당하는 정규화 이름 목록.
+        정확히 같은 이름 → 입력에 포함된 가장 긴 이름 → 입력을 포함하는 이름 순으로 찾음.
+        시행령/시행규칙을 지정했으면 같은 단계의 법령만 찾음 (색인에 없는 시행령을 법률 본문으로 대신하지 않음)
+        """
+        key = normalize_law_name(law)
+        if not key:
+            return []
+        if key in self._laws:
+            return [key]
+        tier = law_tier(key)
+        candidates = [name for name in self._laws if law_tier(name) == tier] if tier else list(self._laws)
+        contained = [name for name in candidates if name in key]
+        if contained:
+            longest = max(len(name) for name in contained)
+            return [name for name in contained if len(name) == longest]
+        return sorted(name for name in candidates if key in name)
+
+    def select_version(self, law_key: str, as_of: Optional[int] = None) -> Optional[LawVersion]:
+        """기준일(기본값: 현재)에 시행 중인 개정본. 모두 시행 전이면 가장 먼저 시행되는 개정본"""
+        law_versions = self._laws.get(law_key)
+        if not law_versions:
+            return None
+        as_of = int(time.time()) if as_of is None else as_of
+        effective = [v for v in law_versions if v.effective_date <= as_of]
+        return effective[-1] if effective else law_versions[0]
+
+    def lookup(self, law: str = "", article: str = "", paragraph: str = "", chapter: str = "",
+               as_of: Optional[int] = None) -> Tuple[List[LawVersion], List[int]]:
+        """
+        조문/항/장 번호로 청크 번호를 찾아 (조회한 개정본 목록, 청크 번호 목록)을 반환.
+        법령을 지정하지 않았거나 찾지 못하면 빈 목록 (모든 법령의 같은 번호 조문을 섞어 반환하지 않음)
+        """
+        law_keys = self.resolve_law(law)
+        selected = [v for v in (self.select_version(k, as_of) for k in law_keys) if v is not None]
+        found: List[int] = []
+        for version in selected:
+            if article and paragraph:
+                found.extend(self._paragraphs.get((version.source_file, article, paragraph), []))
+            elif article:
+                found.extend(self._articles.get((version.source_file, article), []))
+            elif chapter:
+                found.extend(self._chapters.get((version.source_file, chapter), []))
+        return selected, found
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 픽스처 생성과 서버가 같은 Chroma 설정으로 같은 경로를 열도록 텔레메트리 설정을 먼저 고정
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+import pytest  # noqa: E402
+
+from benchmarks.fixtures import HASH_EMBEDDING_MODEL, HashEmbeddingFunction, build_synthetic_db  # noqa: E402
+from benchmarks.stub_gemini import StubSettings, install  # noqa: E402
+
+
+class AgentFactory:
+    """합성 ChromaDB와 Gemini 스텁으로 lifespan과 같은 방식(main._build_agent)으로 에이전트를 만듦"""
+
+    def __init__(self, tmp_path, monkeypatch):
+        self.tmp_path = tmp_path
+        self.db_path = str(tmp_path / "chroma_db")
+        self._monkeypatch = monkeypatch
+        build_synthetic_db(self.db_path, legal_size=60, manual_size=20)
+        install(StubSettings(latency_ms=1, jitter_ms=0))
+        # 테스트마다 지정하지 않으면 공유 상태 파일 없이 프로세스 안에서만 상태를 유지
+        self.configure(CHROMA_DB_PATH=self.db_path, SHARED_STATE_DB_PATH="", ANSWER_CACHE_DB_PATH="",
+                       RATE_LIMIT_DB_PATH="", SESSION_DB_PATH="", GEMINI_QUEUE_TIMEOUT_SECONDS="5")
+
+    def configure(self, **env: str):
+        for key, value in env.items():
+            self._monkeypatch.setenv(key, value)
+
+    def build(self):
+        import main
+        return main._build_agent("test-key", HashEmbeddingFunction(), HASH_EMBEDDING_MODEL, None)
+
+
+@pytest.fixture
+def agent_factory(tmp_path, monkeypatch) -> AgentFactory:
+    return AgentFactory(tmp_path, monkeypatch)
@@ -0,0 +1,33 @@
+import sqlite3
+
+from answer_cache import AnswerCache
+
+
+def test_shared_answers_from_rebuilt_index_are_dropped_after_restart(tmp_path):
+    """재시작 전에 인덱스가 재구축되었으면 이전 인덱스로 만든 공유 캐시 답변을 쓰지 않음"""
+    db_path = str(tmp_path / "answers.db")
+    before = AnswerCache(db_path=db_path)
+    before.set_index_version("legal_docs:a:10")
+    before.put("항만시설 사용료 감면 기준은?", {"answer": "이전 답변"})
+
+    same_index = AnswerCache(db_path=db_path)
+    same_index.set_index_version("legal_docs:a:10")
+    assert same_index.get_exact("항만시설 사용료 감면 기준은?") == {"answer": "이전 답변"}
+
+    rebuilt = AnswerCache(db_path=db_path)
+    rebuilt.set_index_version("legal_docs:b:12")
+    assert rebuilt.get_exact("항만시설 사용료 감면 기준은?") is None
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0] == 0
+
+
+def test_existing_cache_table_gains_index_version_column(tmp_path):
+    db_path = str(tmp_path / "answers.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE answer_cache (row_id INTEGER PRIMARY KEY AUTOINCREMENT, query_key TEXT NOT NULL UNIQUE, "
+                     "result TEXT NOT NULL, embedding BLOB, created_at REAL NOT NULL)")
+        conn.execute("INSERT INTO answer_cache (query_key, result, created_at) VALUES ('질문', '{}', 0)")
+    cache = AnswerCache(db_path=db_path)
+    cache.set_index_version("legal_docs:a:10")
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0] == 0
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+from embeddings import EmbeddingModelMismatchError
+from readiness import ReadinessState
+
+
+def test_agent_built_on_worker_thread_can_call_llm(agent_factory):
+    """lifespan처럼 스레드에서 만든 에이전트가 이벤트 루프에서 공유 요청 한도를 거쳐 LLM을 호출"""
+    agent_factory.configure(SHARED_STATE_DB_PATH=str(agent_factory.tmp_path / "harbor_state.db"))
+
+    async def scenario():
+        agent = await asyncio.to_thread(agent_factory.build)
+        try:
+            assert agent.gemini.get_stats()["scheduler"]["shared_state"]
+            result = await asyncio.wait_for(agent.process_query("항만시설 사용료 감면 기준은?"), timeout=10)
+            assert result["answer"]
+            assert result["usage"]["llm_calls"] >= 1
+        finally:
+            agent.close()
+
+    asyncio.run(scenario())
+
+
+class _ReloadingDBManager:
+    """첫 번째 다시 열기에서 임베딩 모델 불일치로 실패하는 검색 관리자"""
+
+    def __init__(self):
+        self.reloads = 0
+
+    def reload_collections(self):
+        self.reloads += 1
+        if self.reloads == 1:
+            raise EmbeddingModelMismatchError("컬렉션 모델 불일치")
+
+    def collection_counts(self):
+        return {"legal_docs": 10, "legal_manuals": 5}
+
+    def refresh_indexes(self):
+        pass
+
+    def clear_caches(self):
+        pass
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+
+def test_retry_keeps_running_after_collection_reload_error(monkeypatch):
+    """컬렉션을 다시 열다 실패해도 재시도 작업이 멈추지 않고 단계를 failed로 기록"""
+    import main
+
+    db_manager = _ReloadingDBManager()
+    state = ReadinessState(required=["collections"])
+    monkeypatch.setattr(main, "agent", SimpleNamespace(db_manager=db_manager))
+    monkeypatch.setattr(main, "readiness", state)
+
+    asyncio.run(asyncio.wait_for(main._retry_pending_stages(0.01), timeout=5))
+    assert db_manager.reloads == 2
+    assert state.ready
+    assert state.snapshot()["stages"]["collections"]["attempts"] == 2
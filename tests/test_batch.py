@@ -0,0 +1,58 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from batch import BatchItem, run_batch
+
+
+class _FakeDBManager:
+    """임베딩 LRU 캐시만 흉내 낸 검색 관리자"""
+
+    def __init__(self, embedding_cache_size: int):
+        self.embedding_cache_size = embedding_cache_size
+        self.cache: "OrderedDict[str, bool]" = OrderedDict()
+
+    def embed(self, texts):
+        for text in texts:
+            self.cache[text] = True
+            self.cache.move_to_end(text)
+            while len(self.cache) > self.embedding_cache_size:
+                self.cache.popitem(last=False)
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+
+class _FakeAgent:
+    def __init__(self, embedding_cache_size: int):
+        self.db_manager = _FakeDBManager(embedding_cache_size)
+        self.embedding_misses = 0
+
+    async def process_query(self, query, session_id=None, priority=None):
+        # 실제 에이전트처럼 처리를 시작할 때 질의 임베딩을 사용 (답변 캐시 유사도 조회)
+        if query not in self.db_manager.cache:
+            self.embedding_misses += 1
+        await asyncio.sleep(0.001)
+        return {"answer": query}
+
+
+def test_prefetched_embeddings_stay_cached_until_used():
+    """캐시보다 많은 질의를 처리해도 미리 계산한 임베딩이 쓰이기 전에 밀려나지 않음"""
+    async def scenario():
+        agent = _FakeAgent(embedding_cache_size=16)
+        items = [BatchItem(index=i, id=i, query=f"질의 {i}") for i in range(200)]
+        results = [result async for _, result, _ in run_batch(agent, items, concurrency=4)]
+        assert sorted(r["answer"] for r in results) == sorted(item.query for item in items)
+        assert agent.embedding_misses == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejects_non_positive_concurrency():
+    async def scenario():
+        async for _ in run_batch(_FakeAgent(16), [BatchItem(index=0, id=0, query="질의")], concurrency=0):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
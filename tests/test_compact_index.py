@@ -0,0 +1,46 @@
+import pytest
+
+import compact_index
+from benchmarks.fixtures import HASH_EMBEDDING_MODEL, HashEmbeddingFunction, build_synthetic_db
+from harbor_agent import ChromaDBManager
+
+_COLLECTIONS = [ChromaDBManager.LEGAL_COLLECTION, ChromaDBManager.MANUAL_COLLECTION]
+
+
+@pytest.fixture
+def exported_index(tmp_path):
+    db_path, index_path = str(tmp_path / "chroma_db"), str(tmp_path / "compact_index")
+    build_synthetic_db(db_path, legal_size=60, manual_size=20)
+    compact_index.export_index(db_path, index_path, _COLLECTIONS)
+    return db_path, index_path
+
+
+def _manager(db_path, index_path, **kwargs):
+    return ChromaDBManager(db_path, embedding_function=HashEmbeddingFunction(), embedding_model=HASH_EMBEDDING_MODEL,
+                           vector_backend="compact", compact_index_path=index_path, **kwargs)
+
+
+def test_fingerprint_poll_keeps_serving_until_reload(exported_index):
+    """재내보내기를 감지해도 reload_collections 전까지는 기존 컬렉션으로 계속 검색하고, 교체 후에 이전 파일을 닫음"""
+    db_path, index_path = exported_index
+    manager = _manager(db_path, index_path, hybrid_search=False, structured_lookup=False)
+    try:
+        before = manager.index_fingerprint()
+        old_collection = manager.legal_collection
+        compact_index.export_index(db_path, index_path, _COLLECTIONS, dtype="float16")
+
+        assert manager.index_fingerprint() != before
+        assert manager.legal_collection is old_collection
+        assert manager.search_legal("항만시설 사용료")
+
+        manager.reload_collections()
+        assert manager.legal_collection is not old_collection
+        assert old_collection._records_file.closed
+        assert manager.search_legal("항만시설 사용료")
+    finally:
+        manager.close()
+
+
+def test_heap_indexes_are_refused_with_compact_backend(exported_index):
+    with pytest.raises(ValueError, match="HYBRID_SEARCH"):
+        _manager(*exported_index)
@@ -0,0 +1,75 @@
+from context_budget import ELLIPSIS, ContextBudgeter
+from utils import estimate_tokens
+
+
+def _tool_result(*contents, source_file="항만법.pdf"):
+    return {"message": f"{len(contents)}개의 법률 정보를 찾았습니다.",
+            "results": [{"content": c, "source_file": source_file} for c in contents]}
+
+
+def test_hits_are_interleaved_by_rank_and_lowest_ranks_dropped():
+    """모든 도구의 1순위 결과가 2순위보다 먼저 예산을 받고, 예산을 넘으면 낮은 순위부터 빠짐"""
+    contents = [[f"tool{tool} rank{rank} berth schedule notice" for rank in range(3)] for tool in range(2)]
+    per_hit = estimate_tokens(contents[0][0])
+    budgeter = ContextBudgeter(max_tokens=3 * per_hit + 2, max_chunk_tokens=400)
+    budget = budgeter.start("berth schedule")
+
+    compacted = budget.compact([_tool_result(*contents[0], source_file="a.pdf"),
+                                _tool_result(*contents[1], source_file="b.pdf")])
+
+    assert [hit["content"] for hit in compacted[0]["results"]] == contents[0][:2]
+    assert [hit["content"] for hit in compacted[1]["results"]] == contents[1][:1]
+    assert (compacted[0]["omitted_results"], compacted[1]["omitted_results"]) == (1, 2)
+    assert budget.remaining == 2
+    stats = budgeter.stats()
+    assert (stats["requests"], stats["hits_in"], stats["dropped"]) == (1, 6, 3)
+
+
+def test_long_chunk_keeps_first_and_query_sentences():
+    """한 청크가 청크당 한도를 넘으면 첫 문장과 질의어가 겹치는 문장만 원래 순서로 남김"""
+    content = ("Article 5 berth allocation. The weather was sunny today. "
+               "Vessels must request berth allocation in advance. Unrelated trailing remark here.")
+    budgeter = ContextBudgeter(max_tokens=2000, max_chunk_tokens=20)
+    [result] = budgeter.start("request berth allocation").compact([_tool_result(content)])
+
+    assert result["results"][0]["content"] == (
+        "Article 5 berth allocation." + ELLIPSIS + "Vessels must request berth allocation in advance.")
+    assert "omitted_results" not in result
+    assert budgeter.stats()["trimmed"] == 1
+
+
+def test_one_budget_is_shared_across_parallel_results_and_iterations():
+    """같은 반복의 여러 도구 결과와 다음 반복의 결과가 하나의 예산과 중복 기준을 함께 씀"""
+    budgeter = ContextBudgeter(max_tokens=60, max_chunk_tokens=400)
+    budget = budgeter.start("pilotage")
+    shared = "Pilotage is compulsory for vessels over 500 tons."
+
+    legal, manual, error = budget.compact([
+        _tool_result(shared + " Exemptions are listed in the annex."),
+        _tool_result(shared, shared + " Contact the pilot station by radio."),
+        {"error": "도구 실행 시간이 초과되었습니다."},
+    ])
+    # 다른 도구 결과에 이미 들어간 문장은 빼고, 남는 문장이 없는 청크는 결과에서 제외
+    assert [hit["content"] for hit in legal["results"]] == [shared + " Exemptions are listed in the annex."]
+    assert [hit["content"] for hit in manual["results"]] == ["Contact the pilot station by radio."]
+    assert manual["omitted_results"] == 1
+    assert error == {"error": "도구 실행 시간이 초과되었습니다."}
+    used = estimate_tokens(legal["results"][0]["content"]) + estimate_tokens(manual["results"][0]["content"])
+    assert budget.remaining == 60 - used
+
+    # 다음 반복: 이미 넣은 문장은 다시 넣지 않고, 문장부호 없는 긴 청크는 남은 예산만큼만 앞부분을 넣음
+    left = budget.remaining
+    [again] = budget.compact([_tool_result(shared, "Harbour dues " * 40)])
+    [fragment] = again["results"]
+    assert fragment["content"].startswith("Harbour dues") and fragment["content"].endswith("…")
+    assert 0 <= budget.remaining < left and estimate_tokens(fragment["content"]) == left - budget.remaining
+    # 예산을 다 쓰면 이후 결과는 빠짐
+    [exhausted] = budget.compact([_tool_result("Anchorage is assigned by the harbour master.")])
+    assert exhausted["results"] == [] and exhausted["omitted_results"] == 1
+
+    # 새 요청은 새 예산으로 시작
+    fresh = budgeter.start("pilotage")
+    assert fresh.remaining == 60
+    assert [hit["content"] for hit in fresh.compact([_tool_result(shared)])[0]["results"]] == [shared]
+    stats = budgeter.stats()
+    assert (stats["requests"], stats["deduplicated"], stats["dropped"]) == (2, 2, 1)
@@ -0,0 +1,107 @@
+import json
+
+from context_expansion import ChunkGraph, ContextExpander
+from harbor_agent import SearchResult
+
+_FILE = "항만법_20250101.pdf"
+_SHARED_SENTENCE = "2. 선석이란 선박을 대는 곳을 말한다."
+# 제2조는 두 하위 청크(앞 청크의 마지막 문장이 겹침)와 같은 조문의 다른 항 청크로 나뉨
+_CHUNKS = [
+    ("c0", "제1조(목적) 이 법은 항만의 개발을 목적으로 한다.", {"article": "1"}),
+    ("c1a", f"[제2조(정의) (부분)]\n1. 항만이란 선박이 드나드는 곳을 말한다.\n{_SHARED_SENTENCE}",
+     {"article": "2", "is_sub_chunk": True, "parent_chunk_id": "p2", "sub_index": 0}),
+    ("c1b", f"[제2조(정의) (부분)]\n{_SHARED_SENTENCE}\n3. 항로란 선박이 다니는 길을 말한다.",
+     {"article": "2", "is_sub_chunk": True, "parent_chunk_id": "p2", "sub_index": 1}),
+    ("c3", "제2조 ② 항만시설의 범위는 대통령령으로 정한다.", {"article": "2"}),
+    ("c4", "제3조(적용 범위) 이 법은 모든 무역항에 적용한다.", {"article": "3"}),
+]
+_TEXTS = {chunk_id: text for chunk_id, text, _ in _CHUNKS}
+_MERGED_ARTICLE_2 = ("[제2조(정의)]\n1. 항만이란 선박이 드나드는 곳을 말한다.\n"
+                     f"{_SHARED_SENTENCE}\n3. 항로란 선박이 다니는 길을 말한다.")
+
+
+def _metadata(position: int, extra: dict) -> dict:
+    metadata = {"source_file": _FILE, "chunk_index": position,
+                "hierarchy_path": json.dumps([f"article:{extra['article']}"])}
+    metadata.update({k: v for k, v in extra.items() if k != "article"})
+    return metadata
+
+
+_METADATAS = {chunk_id: _metadata(i, extra) for i, (chunk_id, _, extra) in enumerate(_CHUNKS)}
+
+
+class _Fetcher:
+    """확장에 필요한 청크 본문 일괄 조회 대역 (요청받은 ID를 기록)"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(list(ids))
+        return {chunk_id: _TEXTS[chunk_id] for chunk_id in ids}
+
+
+def _expander(mode: str, **kwargs) -> ContextExpander:
+    expander = ContextExpander(mode=mode, **kwargs)
+    expander.graphs["legal"] = ChunkGraph(list(_METADATAS), list(_METADATAS.values()))
+    return expander
+
+
+def _hit(chunk_id: str, distance: float = 0.1) -> SearchResult:
+    return SearchResult(content=_TEXTS[chunk_id], metadata=_METADATAS[chunk_id], distance=distance, id=chunk_id)
+
+
+def test_parent_mode_merges_sibling_hits_and_restores_article():
+    """같은 부모의 하위 청크 결과는 순위가 높은 하나로 합치고, 겹친 문장과 머리글을 한 번만 남겨 원래 조문으로 복원"""
+    expander = _expander("parent")
+    collapsed = expander.collapse("legal", [_hit("c1b"), _hit("c1a", 0.2), _hit("c4", 0.3)], limit=2)
+    assert [hit.id for hit in collapsed] == ["c1b", "c4"]
+    assert expander.stats["merged"] == 1
+
+    fetch = _Fetcher()
+    [expanded] = expander.expand("legal", [collapsed], fetch)
+    assert expanded[0].content == _MERGED_ARTICLE_2
+    assert (expanded[0].id, expanded[0].distance) == ("c1b", 0.1)
+    # 하위 청크가 아닌 결과는 그대로
+    assert expanded[1].content == _TEXTS["c4"]
+    # 검색 결과로 이미 가진 본문(c1b)은 다시 가져오지 않음
+    assert fetch.calls == [["c1a"]]
+
+
+def test_article_mode_joins_every_chunk_of_the_article():
+    """article 방식은 같은 조문의 모든 청크(하위 청크 + 다른 항)를 문서 순서대로 이어 붙임"""
+    expander = _expander("article")
+    fetch = _Fetcher()
+    [[expanded]] = expander.expand("legal", [[_hit("c3")]], fetch)
+    assert expanded.content == f"{_MERGED_ARTICLE_2}\n{_TEXTS['c3']}"
+    assert fetch.calls == [["c1a", "c1b"]]
+
+    # 같은 조문의 결과는 하나로 합쳐지고, 다른 조문은 남음
+    collapsed = expander.collapse("legal", [_hit("c3"), _hit("c1a"), _hit("c0")])
+    assert [hit.id for hit in collapsed] == ["c3", "c0"]
+
+
+def test_neighbors_mode_reuses_hits_already_in_results():
+    """neighbors 방식은 파일 안 앞뒤 window개를 붙이고, 다른 검색 결과에 이미 있는 청크는 가져오지 않음"""
+    expander = _expander("neighbors", window=1)
+    fetch = _Fetcher()
+    [first, second] = expander.expand("legal", [[_hit("c3")], [_hit("c4")]], fetch)
+    assert fetch.calls == [["c1b"]]
+    c1b_body = _TEXTS["c1b"].split("\n", 1)[1]
+    assert first[0].content == f"[제2조(정의)]\n{c1b_body}\n{_TEXTS['c3']}\n{_TEXTS['c4']}"
+    # 마지막 청크는 앞쪽 이웃만 붙음
+    assert second[0].content == f"{_TEXTS['c3']}\n{_TEXTS['c4']}"
+
+    # 완성된 확장 본문은 캐시에서 다시 사용 (추가 조회 없음)
+    [[cached]] = expander.expand("legal", [[_hit("c3")]], fetch)
+    assert cached.content == first[0].content
+    assert fetch.calls == [["c1b"]]
+    assert expander.stats["cache_hits"] == 1
+
+
+def test_max_chars_keeps_chunks_closest_to_the_hit():
+    """max_chars를 넘으면 검색된 청크에서 가까운 이웃부터 포함"""
+    limit = len(_TEXTS["c3"]) + len(_TEXTS["c4"])
+    expander = _expander("neighbors", window=2, max_chars=limit)
+    [[expanded]] = expander.expand("legal", [[_hit("c3")]], _Fetcher())
+    assert expanded.content == f"{_TEXTS['c3']}\n{_TEXTS['c4']}"
@@ -0,0 +1,18 @@
+import asyncio
+
+
+def test_fast_path_starts_context_budget_once(agent_factory):
+    """검색 우선 경로로 답한 질의도 요청당 토큰 예산을 한 번만 시작"""
+    agent_factory.configure(ANSWER_CACHE_ENABLED="false", AGENT_FAST_PATH="true", FAST_PATH_MAX_DISTANCE="10")
+
+    async def scenario():
+        agent = agent_factory.build()
+        try:
+            result = await asyncio.wait_for(agent.process_query("항만시설 사용료 감면 기준은?"), timeout=10)
+            assert result["answer"]
+            assert agent.fast_path_stats["answered"] == 1
+            assert agent.context_budgeter.stats()["requests"] == 1
+        finally:
+            agent.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from bm25 import BM25Index, reciprocal_rank_fusion
+from harbor_agent import ChromaDBManager, SearchResult
+from utils import StageTimings
+
+_CHUNKS = {
+    "law-1": ("항만법 제23조 정박지 지정", "article"),
+    "law-2": ("선박의 입항 신고 절차", "article"),
+    "law-3": ("위험물 하역 안전 기준", "chapter"),
+    "law-4": ("정박지 사용 허가 신청", "chapter"),
+}
+
+
+def _ranker(candidates: int = 10):
+    """_hybrid_rank가 쓰는 속성만 가진 검색 관리자 대역 (BM25 색인은 실제 구현)"""
+    ids = list(_CHUNKS)
+    index = BM25Index(ids, [text for text, _ in _CHUNKS.values()],
+                      [{"structure_type": kind} for _, kind in _CHUNKS.values()])
+    return SimpleNamespace(lexical_index=index, hybrid_candidates=candidates, reranker=None, timings=StageTimings())
+
+
+def _vector_hit(doc_id: str, distance: float) -> SearchResult:
+    text, kind = _CHUNKS[doc_id]
+    return SearchResult(content=text, metadata={"structure_type": kind}, distance=distance, id=doc_id)
+
+
+def test_bm25_matches_article_numbers_regardless_of_spacing():
+    """'제 23 조'와 '제23조'는 같은 조문 토큰으로 색인되고, 겹치는 단어가 없는 청크는 후보에 없음"""
+    index = _ranker().lexical_index
+    found = [index.ids[i] for i, _ in index.search("제 23 조", 10)]
+    assert found == ["law-1"]
+    assert [index.ids[i] for i, _ in index.search("정박지 지정", 10)] == ["law-1", "law-4"]
+
+
+def test_reciprocal_rank_fusion_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60))
+    assert fused == {"a": 1 / 61, "b": 1 / 62 + 1 / 61, "c": 1 / 62}
+
+
+def test_hybrid_rank_fuses_vector_and_bm25_hits():
+    """벡터로만 찾은 청크, BM25로만 찾은 청크가 모두 남고 양쪽에서 찾은 청크가 가장 앞에 옴"""
+    vector_hits = [_vector_hit("law-2", 0.2), _vector_hit("law-1", 0.3)]
+    ranked = ChromaDBManager._hybrid_rank(_ranker(), "정박지 지정", vector_hits, None)
+
+    # law-1: 1/62 + 1/61 (양쪽), law-2: 1/61 (벡터 1위), law-4: 1/62 (BM25 2위)
+    assert [hit.id for hit in ranked] == ["law-1", "law-2", "law-4"]
+    assert ranked[1].distance == 0.2
+    # BM25로만 찾은 청크는 색인의 본문/메타데이터로 채우고 벡터 거리는 없음
+    assert (ranked[2].content, ranked[2].metadata, ranked[2].distance) == (
+        "정박지 사용 허가 신청", {"structure_type": "chapter"}, None)
+
+
+def test_hybrid_rank_applies_where_filter_to_bm25_hits():
+    """where 필터에 맞지 않는 청크는 BM25 후보에서도 빠짐 (벡터 후보는 Chroma가 이미 필터링)"""
+    vector_hits = [_vector_hit("law-2", 0.2)]
+    ranked = ChromaDBManager._hybrid_rank(_ranker(), "정박지 지정", vector_hits, {"structure_type": "article"})
+    assert sorted(hit.id for hit in ranked) == ["law-1", "law-2"]
+    assert all(hit.metadata["structure_type"] == "article" for hit in ranked)
+
+    # 후보 수 제한은 필터 적용 뒤의 BM25 결과에 적용
+    ranked = ChromaDBManager._hybrid_rank(_ranker(candidates=1), "정박지 지정", [], {"structure_type": "chapter"})
+    assert [hit.id for hit in ranked] == ["law-4"]
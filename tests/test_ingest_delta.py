@@ -0,0 +1,40 @@
+import asyncio
+
+from benchmarks.fixtures import HASH_EMBEDDING_MODEL, HashEmbeddingFunction
+from data_preprocessing.harbor_ingest.config import IngestConfig
+from data_preprocessing.harbor_ingest.vector_store import ChunkDelta, VectorStoreWriter
+
+
+def test_same_count_delta_invalidates_answer_cache(agent_factory):
+    """청크 하나를 교체해 청크 수가 그대로인 증분 반영도 서버가 감지해 답변 캐시를 비움"""
+    agent_factory.configure(ANSWER_CACHE_ENABLED="true")
+    query = "항만시설 사용료 감면 기준은?"
+
+    async def scenario():
+        agent = agent_factory.build()
+        agent.index_check_interval = 0
+        try:
+            await agent.process_query(query)
+            assert agent.answer_cache.get_exact(query) is not None
+            count_before = agent.db_manager.collection_counts()
+
+            writer = VectorStoreWriter(IngestConfig(db_path=agent_factory.db_path, collection_name="legal_manuals",
+                                                    embedding_backend="sentence-transformers",
+                                                    embedding_model=HASH_EMBEDDING_MODEL),
+                                       HashEmbeddingFunction())
+            old_id = writer.collection.get(limit=1)["ids"][0]
+            chunk = {"chunk_id": "replaced_chunk", "content": "갱신된 선박 입항 절차", "chunk_hash": "replaced"}
+            writer.apply_delta(
+                ChunkDelta(file_name="갱신.pptx", chunk_ids=["replaced_chunk"], added=[chunk], removed_ids=[old_id],
+                           metadatas={"replaced_chunk": {"source_file": "갱신.pptx", "chunk_id": "replaced_chunk"}}),
+                {"replaced": HashEmbeddingFunction()([chunk["content"]])[0]},
+            )
+            assert agent.db_manager.collection_counts() == count_before
+
+            result = await agent.process_query(query)
+            assert not result.get("cached")
+            assert agent.answer_cache.stats()["invalidations"] == 1
+        finally:
+            agent.close()
+
+    asyncio.run(scenario())
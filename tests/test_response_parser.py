@@ -0,0 +1,141 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from benchmarks.stub_gemini import StubSettings, install
+from harbor_agent import GeminiClient
+from response_parser import ContentStreamParser, build_response_schema, parse_json_object, repair_json
+
+_TOOLS = [
+    {"type": "function", "function": {"name": "search_legal_documents", "parameters": {"type": "object", "properties": {
+        "query": {"type": "string"}, "n_results": {"type": "integer"}}}}},
+    {"type": "function", "function": {"name": "lookup_legal_article", "parameters": {"type": "object", "properties": {
+        "law": {"type": "string"}, "article": {"type": "string"}}}}},
+]
+
+
+def _stream(chunks):
+    parser = ContentStreamParser()
+    return "".join(parser.feed(chunk) for chunk in chunks)
+
+
+def test_surrogate_pair_escape_is_combined_across_chunks():
+    """\\uD83D\\uDE00처럼 나뉘어 온 서로게이트 쌍은 한 글자로 합쳐져 UTF-8로 인코딩 가능해야 함"""
+    raw = '{"content": "안녕 \\uD83D\\uDE00!", "tool_calls": []}'
+    for split in range(1, len(raw)):
+        text = _stream([raw[:split], raw[split:]])
+        assert text == "안녕 \U0001F600!"
+        text.encode("utf-8")
+
+
+def test_lone_surrogate_escape_becomes_replacement_char():
+    """짝이 없는 서로게이트는 SSE 프레임을 깨지 않도록 U+FFFD로 바뀜"""
+    text = _stream(['{"content": "a\\uD83Db \\uDE00 \\uD83D"}'])
+    assert text == "a\ufffdb \ufffd \ufffd"
+    text.encode("utf-8")
+
+
+def test_repair_json_closes_truncated_response():
+    """최대 토큰에서 잘린 응답은 문자열/괄호를 닫고, 값 없이 끝난 키에는 null을 채움"""
+    parsed, repaired = parse_json_object('{"reasoning": "근거", "content": "항만법 제23조는')
+    assert repaired and parsed == {"reasoning": "근거", "content": "항만법 제23조는"}
+
+    parsed, repaired = parse_json_object('{"reasoning": "근거", "tool_calls": [{"function_name": "a", "arguments": {"query":')
+    assert repaired
+    assert parsed["tool_calls"] == [{"function_name": "a", "arguments": {"query": None}}]
+
+    assert repair_json('{"content": "a\\') == '{"content": "a"}'
+
+
+def test_repair_json_handles_fences_and_trailing_commas():
+    """코드 펜스와 뒤따르는 설명 문장은 무시하고, 닫는 괄호 앞의 쉼표는 제거함"""
+    fenced = '```json\n{"reasoning": "r", "content": "답변 {괄호}"}\n```\n추가 설명'
+    assert parse_json_object(fenced) == ({"reasoning": "r", "content": "답변 {괄호}"}, False)
+
+    parsed, repaired = parse_json_object('```json\n{"content": "답변", "tool_calls": [],}\n```')
+    assert repaired and parsed == {"content": "답변", "tool_calls": []}
+
+    assert parse_json_object("JSON이 아닌 답변") == (None, False)
+
+
+def test_build_response_schema_per_tool_set():
+    """도구가 없으면 content만, 있으면 도구 이름 enum과 매개변수 합집합으로 tool_calls를 허용"""
+    assert build_response_schema(None)["required"] == ["content"]
+    assert "tool_calls" not in build_response_schema(None)["properties"]
+
+    schema = build_response_schema(_TOOLS)
+    call = schema["properties"]["tool_calls"]["items"]["properties"]
+    assert call["function_name"]["enum"] == ["search_legal_documents", "lookup_legal_article"]
+    assert set(call["arguments"]["properties"]) == {"query", "n_results", "law", "article"}
+    assert schema["required"] == ["reasoning"]
+
+
+def test_normalize_tool_calls_filters_unknown_tools_and_arguments():
+    """알 수 없는 도구와 형식이 틀린 호출은 버리고, 인자는 정의된 매개변수 중 값이 있는 것만 남김"""
+    calls = [
+        {"function_name": "search_legal_documents", "arguments": {"query": "정박", "n_results": 2, "extra": 1}},
+        {"function_name": "lookup_legal_article", "arguments": {"law": "항만법", "article": ""}},
+        {"function_name": "delete_everything", "arguments": {}},
+        {"function_name": "search_legal_documents", "arguments": "query=정박"},
+        {"arguments": {"query": "이름 없음"}},
+        "search_legal_documents",
+    ]
+    assert GeminiClient._normalize_tool_calls(calls, _TOOLS) == [
+        {"function_name": "search_legal_documents", "arguments": {"query": "정박", "n_results": 2}},
+        {"function_name": "lookup_legal_article", "arguments": {"law": "항만법"}},
+        {"function_name": "search_legal_documents", "arguments": {}},
+    ]
+    assert GeminiClient._normalize_tool_calls({"function_name": "x"}, _TOOLS) == []
+    # 도구 없이 호출한 경우(최종 답변 단계)에는 이름/인자를 걸러내지 않음
+    assert GeminiClient._normalize_tool_calls([{"function_name": "x", "arguments": {"a": None}}], None) == [
+        {"function_name": "x", "arguments": {"a": None}}]
+
+
+class _ScriptedModel:
+    """정해진 응답 텍스트를 차례로 돌려주고 받은 생성 설정을 기록하는 GenerativeModel 대역"""
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.configs = []
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self.configs.append(generation_config)
+        return SimpleNamespace(text=self.texts.pop(0), usage_metadata=None)
+
+
+def _client(*texts):
+    install(StubSettings(latency_ms=0, jitter_ms=0))
+    client = GeminiClient("test-key", json_mode=True, parse_retries=1)
+    client.model = _ScriptedModel(*texts)
+    return client
+
+
+def test_json_mode_sends_schema_and_reformats_broken_response():
+    """JSON 모드는 도구 조합별 스키마를 보내고, 복구할 수 없는 응답은 형식 재작성 요청 한 번으로 다시 받음"""
+    client = _client("도구를 호출하겠습니다", json.dumps({"reasoning": "r", "tool_calls": [
+        {"function_name": "search_legal_documents", "arguments": {"query": "정박"}}]}))
+    try:
+        response = asyncio.run(client.generate_response([{"role": "user", "content": "정박 규정"}], _TOOLS))
+    finally:
+        client.close()
+    assert response["type"] == "tool_call_list"
+    assert response["calls"] == [{"function_name": "search_legal_documents", "arguments": {"query": "정박"}}]
+    first, retry = client.model.configs
+    assert first.response_mime_type == "application/json"
+    assert first.response_schema == build_response_schema(_TOOLS)
+    assert retry is first
+    assert client.stats["parse_failed"] == 1 and client.stats["parse_retries"] == 1 and client.stats["parse_ok"] == 1
+
+
+def test_unparseable_response_falls_back_to_raw_text():
+    """재작성 요청까지 파싱하지 못하면 원문을 답변으로 사용하고, 잘린 응답은 재작성 없이 로컬에서 복구함"""
+    client = _client("형식 없는 답변", "여전히 형식 없는 답변", '{"reasoning": "r", "content": "잘린 답')
+    try:
+        fallback = asyncio.run(client.generate_response([{"role": "user", "content": "질문"}]))
+        repaired = asyncio.run(client.generate_response([{"role": "user", "content": "질문"}]))
+    finally:
+        client.close()
+    assert (fallback["type"], fallback["content"]) == ("text", "형식 없는 답변")
+    assert (repaired["type"], repaired["content"]) == ("text", "잘린 답")
+    assert client.stats["parse_retries"] == 1 and client.stats["parse_repaired"] == 1
+    assert client.model.configs[0].response_schema == build_response_schema(None)
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import GeminiScheduler
+
+
+def test_coalesced_waiter_survives_owner_cancellation():
+    """공유 호출을 시작한 요청이 취소되어도 같은 키로 기다리는 요청은 결과를 받음"""
+    async def scenario():
+        scheduler = GeminiScheduler(rpm=0, tpm=0)
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        owner = asyncio.create_task(scheduler.run(call, key="same"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.run(call, key="same"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        assert await waiter == ("answer", True)
+        assert calls == 1
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_shared_call_cancelled_when_all_waiters_cancelled():
+    async def scenario():
+        scheduler = GeminiScheduler(rpm=0, tpm=0)
+        finished = asyncio.Event()
+
+        async def call():
+            await asyncio.sleep(1)
+            finished.set()
+
+        waiters = [asyncio.create_task(scheduler.run(call, key="same")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert not finished.is_set()
+        assert scheduler.stats()["in_flight"] == 0
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_shared_state_reservation_runs_off_event_loop(tmp_path):
+    """공유 상태 파일이 잠겨 있어도 이벤트 루프는 계속 다른 작업을 처리함"""
+    async def scenario():
+        scheduler = GeminiScheduler(rpm=0, tpm=0, state_db_path=str(tmp_path / "state.sqlite3"))
+        reserve = scheduler._limiter.reserve
+        reserve_threads = []
+
+        def slow_reserve(tokens):
+            reserve_threads.append(threading.current_thread())
+            time.sleep(0.2)
+            return reserve(tokens)
+
+        scheduler._limiter.reserve = slow_reserve
+
+        async def call():
+            return "answer"
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        assert await scheduler.run(call) == ("answer", False)
+        ticking.cancel()
+        assert reserve_threads and reserve_threads[0] is not threading.main_thread()
+        assert ticks >= 5
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_tokens_reserved_for_cancelled_ticket_are_released(tmp_path):
+    """예약을 기다리는 사이 취소된 요청의 TPM 예약분은 다음 요청이 바로 쓸 수 있게 반납"""
+    async def scenario():
+        scheduler = GeminiScheduler(rpm=0, tpm=1000, state_db_path=str(tmp_path / "state.sqlite3"))
+        reserve = scheduler._limiter.reserve
+        reserving = threading.Event()
+
+        def slow_reserve(tokens):
+            reserving.set()
+            time.sleep(0.2)
+            return reserve(tokens)
+
+        scheduler._limiter.reserve = slow_reserve
+
+        async def call():
+            return "answer"
+
+        cancelled = asyncio.create_task(scheduler.run(call, estimated_tokens=600))
+        await asyncio.to_thread(reserving.wait, 1)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.sleep(0.3)
+
+        scheduler._limiter.reserve = reserve
+        # 반납하지 않으면 남은 400개로 600개를 예약하려고 약 12초를 기다림
+        assert await asyncio.wait_for(scheduler.run(call, estimated_tokens=600), timeout=2) == ("answer", False)
+        scheduler.close()
+
+    asyncio.run(scenario())
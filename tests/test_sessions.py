@@ -0,0 +1,31 @@
+import asyncio
+
+from models import QueryRequest
+from readiness import READINESS_STAGES, STAGE_READY, ReadinessState
+
+
+def test_anonymous_query_does_not_persist_a_session(agent_factory, monkeypatch):
+    """session_id 없이 보낸 질문은 세션을 만들지 않고, 다음 요청에 쓸 새 ID만 돌려줌"""
+    import main
+
+    agent_factory.configure(SESSION_DB_PATH=str(agent_factory.tmp_path / "sessions.db"))
+    readiness = ReadinessState()
+    for stage in READINESS_STAGES:
+        readiness.mark(stage, STAGE_READY)
+    monkeypatch.setattr(main, "readiness", readiness)
+
+    async def scenario():
+        agent = agent_factory.build()
+        monkeypatch.setattr(main, "agent", agent)
+        try:
+            response = await main.process_query(QueryRequest(query="항만시설 사용료 감면 기준은?"))
+            assert response.session_id
+            assert agent.conversations.stats()["active_sessions"] == 0
+            assert agent.conversations.get_history(response.session_id) == []
+
+            await main.process_query(QueryRequest(query="선박 입항 신고 절차는?", session_id="operator-42"))
+            assert len(agent.conversations.get_history("operator-42")) == 2
+        finally:
+            agent.close()
+
+    asyncio.run(scenario())
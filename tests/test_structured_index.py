@@ -0,0 +1,31 @@
+import json
+
+from structured_index import StructuredIndex, parse_article_reference
+
+
+def _index(*source_files):
+    ids, documents, metadatas = [], [], []
+    for source_file in source_files:
+        ids.append(f"{source_file}-5")
+        documents.append(f"{source_file} 제5조 본문")
+        metadatas.append({"source_file": source_file, "hierarchy_path": json.dumps(["article:5"]), "chunk_index": 0})
+    return StructuredIndex(ids, documents, metadatas)
+
+
+def test_decree_reference_does_not_fall_back_to_act():
+    """색인에 없는 시행령을 물으면 같은 번호의 법률 조문으로 대신 답하지 않음"""
+    index = _index("항만법_20250101.pdf", "선박입출항법_20250101.pdf")
+    reference = parse_article_reference("항만법 시행령 제5조의 내용은?")
+    assert reference.law == "항만법 시행령"
+    assert index.lookup(reference.law, reference.article) == ([], [])
+
+    with_decree = _index("항만법_20250101.pdf", "항만법 시행령_20250101.pdf")
+    versions, found = with_decree.lookup(reference.law, reference.article)
+    assert [v.source_file for v in versions] == ["항만법 시행령_20250101.pdf"]
+    assert [with_decree.ids[i] for i in found] == ["항만법 시행령_20250101.pdf-5"]
+
+
+def test_article_reference_requires_law_name():
+    """법령 이름 없이 조문 번호만 있으면 모든 법령의 같은 조문을 찾지 않음"""
+    assert parse_article_reference("제5조는 무엇을 규정하나요?") is None
+    assert _index("항만법_20250101.pdf", "선박입출항법_20250101.pdf").lookup("", "5") == ([], [])
@@ -0,0 +1,52 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from metrics import record_span
+
+# 한글 음절 범위 (Gemini 토크나이저 기준 대략 1.5자당 1토큰)
+_HANGUL_PATTERN = re.compile(r'[가-힣]')
+
+
+def estimate_tokens(text: str) -> int:
+    """API 호출 없이 로컬에서 토큰 수를 근사 계산"""
+    if not text:
+        return 0
+    hangul = len(_HANGUL_PATTERN.findall(text))
+    others = len(text) - hangul
+    return int(hangul / 1.5 + others / 4) + 1
+
+
+class StageTimings:
+    """단계별 소요 시간 누적 집계 (호출 수, 합계/최대 ms). span_prefix가 있으면 단계 히스토그램에도 기록"""
+
+    def __init__(self, span_prefix: Optional[str] = None):
+        self.span_prefix = span_prefix
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - started) * 1000)
+
+    def record(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        if self.span_prefix is not None:
+            record_span(f"{self.span_prefix}{stage}", elapsed_ms / 1000)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {"count": e["count"], "avg_ms": round(e["total_ms"] / e["count"], 2), "max_ms": round(e["max_ms"], 2)}
+                for stage, e in self._stages.items()
+            }